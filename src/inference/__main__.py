@@ -0,0 +1,481 @@
+"""
+Punto de entrada de línea de comandos: python -m inference <comando>
+
+Comandos
+--------
+score-file : calcula las features de un CSV/Parquet por bloques y las escribe en Parquet.
+score-json : calcula las features de una solicitud (objeto JSON) o de una lista de solicitudes.
+bench      : mide el rendimiento del pipeline (o de un servidor con --url) sobre las primeras filas de un fichero.
+serve      : arranca el servidor HTTP de scoring (--score-cache activa la caché de resultados,
+             --enable-bad-emails-api el endpoint POST /bad-emails).
+profile-report    : resume los perfiles capturados con --profile-dir (funciones y memoria).
+build-attempts-db : crea la base SQLite de intentos previos (backend ATTEMPTS_BACKEND=sqlite).
+bench-attempts    : compara latencia y memoria de los backends de intentos previos.
+bench-geonames    : mide el tiempo y el pico de memoria de la carga de geonames.
+bench-ip-enrich   : compara enrich_ips con las consultas get_* fila a fila.
+build-ip-table    : precalcula la tabla de rangos de IP -> shrinkage de ASN y ciudad.
+build-ua-table    : precalcula la tabla de firmas de User Agent a partir de un fichero histórico.
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from inference.artifacts import (
+    _data_artifacts_dir, attempts_bloom_path, attempts_stamp, get_previous_attempts,
+    ip_flag_table_path, ip_flag_table_stamp,
+)
+from inference.attempts_sqlite import SQLiteAttemptsStore, build_attempts_db
+from inference.attempts_store import AttemptsStore, PrefilteredAttempts, build_identity_filter
+from inference.feature_transformers import ip_asn_org_flag_shrinkage, ip_city_name_flag_shrinkage
+from inference.geo_consistency_score import load_orig_city
+from inference.ip_flag_table import build_ip_flag_table
+from inference.ip_info import enrich_ips, get_asn_org, get_city, get_info_geoip, get_lat, get_lon
+from inference.pipeline import applications_frame, merge_timings, score_caches, transform_batch
+from inference.profiling import DEFAULT_SAMPLE_RATE, ScoringProfiler, profile_report
+from inference.score_cache import DEFAULT_MAX_ENTRIES, DEFAULT_TTL_S
+from inference.server import DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS, serve
+from inference.ua_signature import UaSignatureTable, ua_signatures_path
+from inference.streaming import DEFAULT_CHUNKSIZE, iter_chunks, iter_scored, load_checkpoint, score_file
+
+
+def _print_report(rows, elapsed, timings, file=sys.stderr):
+    """Imprime filas/segundo y el tiempo por etapa del pipeline."""
+    rate = rows / elapsed if elapsed > 0 else float("inf")
+    print(f"{rows} filas en {elapsed:.2f} s ({rate:,.1f} filas/s)", file=file)
+
+    total = sum(timings.values())
+    if not total:
+        return
+    print("Tiempo por etapa (suma de todos los workers):", file=file)
+    for name, seconds in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+        print(f"  {name:<18} {seconds:>9.3f} s  {100 * seconds / total:5.1f}%", file=file)
+
+
+def _read_payload(payload):
+    """Lee el JSON de un fichero, de stdin ('-') o directamente del argumento."""
+    if payload == "-":
+        return json.load(sys.stdin)
+    if payload.lstrip().startswith(("{", "[")):
+        return json.loads(payload)
+    with open(payload, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _cmd_score_file(args):
+    # Si se reanuda, solo se reportan las filas procesadas en esta ejecución
+    checkpoint = None if args.no_resume else load_checkpoint(args.output)
+    start_offset = int(checkpoint["offset"]) if checkpoint else 0
+
+    timings = {}
+    start = time.perf_counter()
+    rows = score_file(
+        args.input,
+        args.output,
+        chunksize=args.chunksize,
+        resume=not args.no_resume,
+        id_cols=args.id_cols,
+        workers=args.workers,
+        timings=timings,
+    )
+    print(f"{rows} filas escritas en {args.output}")
+    _print_report(rows - start_offset, time.perf_counter() - start, timings)
+
+
+def _cmd_score_json(args):
+    payload = _read_payload(args.payload)
+    single = isinstance(payload, dict)
+    df = applications_frame([payload] if single else payload)
+
+    timings = {}
+    start = time.perf_counter()
+    features = transform_batch(df, timings=timings)
+    elapsed = time.perf_counter() - start
+
+    records = json.loads(features.to_json(orient="records"))
+    print(json.dumps(records[0] if single else records, indent=2, ensure_ascii=False))
+    _print_report(len(df), elapsed, timings)
+
+
+def _post_json(url, body):
+    request = urllib.request.Request(
+        url, data=json.dumps(body).encode("utf-8"), headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+def _bench_url(df, args):
+    """Prueba de carga: envía cada fila como solicitud individual con `workers` clientes concurrentes."""
+    base_url = args.url.rstrip("/")
+    urllib.request.urlopen(base_url + "/health").read()
+
+    applications = json.loads(df.to_json(orient="records")) * args.repeat
+    latencies = []
+
+    def post(application):
+        start = time.perf_counter()
+        _post_json(base_url + "/score", application)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(post, applications))
+    _print_report(len(applications), time.perf_counter() - start, {}, file=sys.stdout)
+
+    latencies.sort()
+    for q in (0.5, 0.95, 0.99):
+        print(f"  p{int(q * 100):<3} {1000 * latencies[int(q * (len(latencies) - 1))]:8.2f} ms")
+
+
+def _cmd_bench(args):
+    chunks = iter_chunks(args.input, args.chunksize)
+    df = pd.concat(list(islice(chunks, -(-args.rows // args.chunksize))), ignore_index=True).head(args.rows)
+
+    if args.url:
+        _bench_url(df, args)
+        return
+
+    if args.score_cache or args.profile_dir:
+        _bench_in_process(df, args)
+        return
+
+    # Dividimos las filas leídas en bloques para poder repartirlos entre workers
+    tasks = (
+        (df.iloc[start:start + args.chunksize], start, [])
+        for _ in range(args.repeat)
+        for start in range(0, len(df), args.chunksize)
+    )
+
+    timings = {}
+    rows = 0
+    start = time.perf_counter()
+    for _, result, chunk_timings in iter_scored(tasks, args.workers):
+        rows += len(result)
+        merge_timings(timings, chunk_timings)
+    _print_report(rows, time.perf_counter() - start, timings, file=sys.stdout)
+
+
+def _print_cache_stats(stats, file=sys.stdout):
+    """Imprime aciertos y memoria de cada caché de ScoreCaches.stats()."""
+    print("Caché de resultados:", file=file)
+    for name, cache in stats.items():
+        print(
+            f"  {name:<18} {cache['hit_ratio']:6.1%} aciertos  {cache['entries']:>8} entradas  "
+            f"{cache['bytes'] / 2 ** 20:8.2f} MiB",
+            file=file,
+        )
+
+
+def _bench_in_process(df, args):
+    """
+    Bench en proceso con la caché de resultados (las repeticiones aciertan en la
+    caché) y/o con profiling de una fracción de los bloques.
+    """
+    if args.workers > 1:
+        sys.exit("--score-cache y --profile-dir solo se pueden usar con --workers 1")
+
+    caches = score_caches(args.cache_max_entries, args.cache_ttl_s) if args.score_cache else None
+    profiler = ScoringProfiler(args.profile_dir, args.profile_rate) if args.profile_dir else None
+    transform = profiler.wrap(transform_batch) if profiler is not None else transform_batch
+
+    timings = {}
+    rows = 0
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for chunk_start in range(0, len(df), args.chunksize):
+            rows += len(transform(df.iloc[chunk_start:chunk_start + args.chunksize], timings, caches=caches))
+    _print_report(rows, time.perf_counter() - start, timings, file=sys.stdout)
+    if caches is not None:
+        _print_cache_stats(caches.stats())
+    if profiler is not None:
+        print(f"{profiler.samples} bloques perfilados en {args.profile_dir}")
+
+
+def _cmd_build_attempts_db(args):
+    df_attempts = get_previous_attempts()
+    if df_attempts is None:
+        sys.exit("No se ha encontrado df_attempts.csv")
+
+    start = time.perf_counter()
+    stamp = attempts_stamp()
+    path = build_attempts_db(df_attempts, args.output, source_stamp=stamp)
+    bloom = build_identity_filter(AttemptsStore.from_frame(df_attempts), source_stamp=stamp)
+    bloom.save(attempts_bloom_path(path))
+    print(f"{len(df_attempts)} intentos -> {path} (+ Bloom filter de {len(bloom)} identidades) "
+          f"en {time.perf_counter() - start:.2f} s")
+
+
+def _attempt_lookups(df_attempts, n, miss_rate, seed=0):
+    """
+    Consultas de prueba: identidades del historial en fechas alrededor de sus
+    intentos y, en una fracción `miss_rate`, identidades nuevas sin intentos.
+    """
+    rng = np.random.default_rng(seed)
+    sample = df_attempts.sample(n, replace=len(df_attempts) < n, random_state=seed).reset_index(drop=True)
+    offsets = pd.to_timedelta(rng.integers(-30 * 24 * 60, 30 * 24 * 60, size=n), unit="m")
+    created_at = pd.to_datetime(sample["created_at"]) + offsets
+
+    lookups = []
+    for i, row in enumerate(sample.itertuples(index=False)):
+        if rng.random() < miss_rate:
+            lookups.append((f"{i:08d}N", f"new{i}@example.com", f"7{i:08d}", f"10.{i % 256}.0.1", created_at[i]))
+        else:
+            lookups.append((row.dni, row.email, str(row.cell_phone), row.ip_address, created_at[i]))
+    return lookups
+
+
+def _time_lookups(backend, lookups):
+    latencies = []
+    results = []
+    for lookup in lookups:
+        start = time.perf_counter()
+        results.append(backend.transform(*lookup))
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies), results
+
+
+def _cmd_bench_attempts(args):
+    df_attempts = get_previous_attempts()
+    if df_attempts is None:
+        sys.exit("No se ha encontrado df_attempts.csv")
+    lookups = _attempt_lookups(df_attempts, args.lookups, args.miss_rate)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        memory = AttemptsStore.from_frame(df_attempts)
+        memory_build = time.perf_counter() - start
+
+        db_path = args.db
+        start = time.perf_counter()
+        if db_path is None:
+            db_path = build_attempts_db(df_attempts, os.path.join(tmp, "attempts.sqlite"))
+        sqlite = SQLiteAttemptsStore(db_path)
+        sqlite_build = time.perf_counter() - start
+
+        print(f"{len(df_attempts)} intentos, {len(lookups)} consultas")
+        print(f"  DataFrame       {df_attempts.memory_usage(deep=True).sum() / 2**20:8.1f} MiB")
+        print(f"  memory  build {memory_build:6.2f} s  {memory.nbytes / 2**20:8.1f} MiB en memoria")
+        print(f"  sqlite  build {sqlite_build:6.2f} s  {os.path.getsize(db_path) / 2**20:8.1f} MiB en disco")
+
+        bloom = build_identity_filter(memory)
+        print(f"  bloom           {bloom.bits.nbytes / 2**20:8.1f} MiB ({bloom.n_hashes} hashes)")
+
+        outputs = {}
+        for name, backend in (
+            ("memory", memory),
+            ("sqlite", sqlite),
+            ("memory+bloom", PrefilteredAttempts(memory, bloom)),
+            ("sqlite+bloom", PrefilteredAttempts(sqlite, bloom)),
+        ):
+            latencies, outputs[name] = _time_lookups(backend, lookups)
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1e6
+            print(f"  {name:<13} media {latencies.mean() * 1e6:8.1f} us  p50 {p50:8.1f} us  p99 {p99:8.1f} us")
+        sqlite.close()
+
+    for name in ("sqlite", "memory+bloom", "sqlite+bloom"):
+        mismatches = sum(
+            not all(a[k] == b[k] or (pd.isna(a[k]) and pd.isna(b[k])) for k in a)
+            for a, b in zip(outputs["memory"], outputs[name])
+        )
+        print(f"  consultas con resultados distintos entre memory y {name}: {mismatches}")
+
+
+def _peak_rss_bytes() -> int:
+    """Pico de memoria residente del proceso (ru_maxrss está en KiB en Linux y en bytes en macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _cmd_bench_geonames(args):
+    # tracemalloc ve el asignador de Python y los buffers que NumPy le registra,
+    # pero no los malloc directos de extensiones en C (el parser de CSV de pandas,
+    # pyarrow). El pico de RSS del proceso (ru_maxrss) sí los incluye, aunque
+    # abarca toda la vida del proceso: se muestra también el de antes de la carga.
+    rss_before = _peak_rss_bytes()
+    tracemalloc.start()
+    start = time.perf_counter()
+    info = load_orig_city()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = _peak_rss_bytes()
+
+    print(f"{len(info.df_geonames)} ciudades cargadas en {elapsed:.2f} s")
+    print(f"  pico de RSS         {rss_after / 2**20:8.1f} MiB  (antes de la carga {rss_before / 2**20:.1f} MiB)")
+    print(f"  pico tracemalloc    {peak / 2**20:8.1f} MiB")
+    print(f"  retenida tracemalloc {current / 2**20:7.1f} MiB")
+    print(f"  DataFrame           {info.df_geonames.memory_usage(deep=True).sum() / 2**20:8.1f} MiB")
+
+
+def _per_row_ip_info(ips):
+    """Las columnas de enrich_ips calculadas fila a fila con get_asn_org, get_city, get_lat y get_lon."""
+    return pd.DataFrame({
+        'asn_org': [get_asn_org(ip) for ip in ips],
+        'subdivision': [get_city(ip) for ip in ips],
+        'lat': [get_lat(ip) for ip in ips],
+        'lon': [get_lon(ip) for ip in ips],
+    })
+
+
+def _cmd_bench_ip_enrich(args):
+    if args.input:
+        ips = pd.concat(chunk[args.column] for chunk in iter_chunks(args.input, DEFAULT_CHUNKSIZE))
+        ips = ips.astype(object).where(ips.notna(), None).tolist()
+    else:
+        # IPs sintéticas: `distinct` IPv4 aleatorias repetidas hasta `n`
+        rng = np.random.default_rng(0)
+        pool = [".".join(str(b) for b in rng.integers(1, 255, size=4)) for _ in range(args.distinct)]
+        ips = [pool[i] for i in rng.integers(0, len(pool), size=args.n)]
+
+    info = get_info_geoip()
+    timings = {}
+    for name, fn in (("fila a fila", _per_row_ip_info), ("enrich_ips", enrich_ips)):
+        # Cada variante empieza con las cachés por red vacías
+        info.reader_city.clear_cache()
+        info.reader_asn.clear_cache()
+        start = time.perf_counter()
+        result = fn(ips)
+        timings[name] = time.perf_counter() - start
+        if name == "fila a fila":
+            expected = result
+
+    print(f"{len(ips)} IPs ({len(set(ips))} distintas)")
+    for name, seconds in timings.items():
+        print(f"  {name:<12} {seconds:8.3f} s  {seconds / max(1, len(ips)) * 1e6:8.2f} us/IP")
+    print(f"  speedup      {timings['fila a fila'] / timings['enrich_ips']:8.1f}x")
+
+    mismatches = 0
+    for col in expected.columns:
+        a, b = expected[col].astype(object), result[col].astype(object)
+        mismatches += int((~((a == b) | (a.isna() & b.isna()))).sum())
+    print(f"  celdas distintas entre ambas variantes: {mismatches}")
+
+
+def _cmd_build_ip_table(args):
+    start = time.perf_counter()
+    stamp = ip_flag_table_stamp()
+    table = build_ip_flag_table(ip_asn_org_flag_shrinkage, ip_city_name_flag_shrinkage)
+    table.source_stamp = stamp
+    table.save(args.output)
+    print(f"{len(table.starts_v4)} rangos IPv4 y {len(table.starts_v6)} rangos IPv6 -> {args.output} "
+          f"en {time.perf_counter() - start:.2f} s")
+
+
+def _cmd_build_ua_table(args):
+    start = time.perf_counter()
+    user_agents = set()
+    for chunk in iter_chunks(args.input, DEFAULT_CHUNKSIZE):
+        user_agents.update(chunk[args.column].dropna().astype(str).unique())
+
+    table = UaSignatureTable.from_user_agents(sorted(user_agents))
+    table.save(args.output)
+    print(f"{len(table)} User Agents distintos -> {args.output} en {time.perf_counter() - start:.2f} s")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m inference")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("score-file", help="Calcula las features de un CSV/Parquet por bloques")
+    p.add_argument("input", help="Fichero .csv o .parquet de solicitudes")
+    p.add_argument("output", help="Directorio de salida (dataset Parquet)")
+    p.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    p.add_argument("--id-cols", nargs="*", default=None, help="Columnas a copiar en la salida")
+    p.add_argument("--no-resume", action="store_true", help="Ignora el checkpoint existente")
+    p.add_argument("--workers", type=int, default=1, help="Número de procesos")
+    p.set_defaults(func=_cmd_score_file)
+
+    p = subparsers.add_parser("score-json", help="Calcula las features de una o varias solicitudes en JSON")
+    p.add_argument("payload", help="Fichero JSON, '-' para stdin o el propio JSON")
+    p.set_defaults(func=_cmd_score_json)
+
+    p = subparsers.add_parser("bench", help="Mide filas/s y tiempo por etapa sobre un fichero")
+    p.add_argument("input", help="Fichero .csv o .parquet de solicitudes")
+    p.add_argument("--rows", type=int, default=10_000, help="Número de filas a leer del fichero")
+    p.add_argument("--repeat", type=int, default=1, help="Veces que se procesan las filas leídas")
+    p.add_argument("--chunksize", type=int, default=1_000)
+    p.add_argument("--workers", type=int, default=1, help="Número de procesos (o de clientes con --url)")
+    p.add_argument("--url", default=None, help="URL de un servidor de scoring a probar en lugar del pipeline local")
+    p.add_argument("--score-cache", action="store_true", help="Usa la caché de resultados e imprime sus estadísticas")
+    p.add_argument("--cache-max-entries", type=int, default=DEFAULT_MAX_ENTRIES)
+    p.add_argument("--cache-ttl-s", type=float, default=DEFAULT_TTL_S)
+    p.add_argument("--profile-dir", default=None, help="Perfila una fracción de los bloques y guarda los perfiles aquí")
+    p.add_argument("--profile-rate", type=float, default=DEFAULT_SAMPLE_RATE, help="Fracción de bloques perfilados")
+    p.set_defaults(func=_cmd_bench)
+
+    p = subparsers.add_parser("serve", help="Arranca el servidor HTTP de scoring")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8000)
+    p.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    p.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS)
+    p.add_argument("--score-cache", action="store_true", help="Activa la caché de resultados (ver GET /metrics)")
+    p.add_argument("--cache-max-entries", type=int, default=DEFAULT_MAX_ENTRIES)
+    p.add_argument("--cache-ttl-s", type=float, default=DEFAULT_TTL_S)
+    p.add_argument("--profile-dir", default=None, help="Activa el profiling y guarda los perfiles aquí")
+    p.add_argument("--profile-rate", type=float, default=DEFAULT_SAMPLE_RATE, help="Fracción de llamadas perfiladas")
+    p.add_argument("--enable-bad-emails-api", action="store_true",
+                   help="Atiende POST /bad-emails (escritura sin autenticación: solo en redes de confianza)")
+    p.set_defaults(func=lambda args: serve(
+        args.host, args.port, args.max_batch_size, args.max_wait_ms,
+        args.score_cache, args.cache_max_entries, args.cache_ttl_s,
+        args.profile_dir, args.profile_rate, args.enable_bad_emails_api,
+    ))
+
+    p = subparsers.add_parser("build-attempts-db", help="Crea la base SQLite de intentos previos")
+    p.add_argument("--output", default=str(_data_artifacts_dir() / "df_attempts.sqlite"))
+    p.set_defaults(func=_cmd_build_attempts_db)
+
+    p = subparsers.add_parser("bench-attempts", help="Compara los backends de intentos previos")
+    p.add_argument("--lookups", type=int, default=5_000, help="Número de consultas")
+    p.add_argument("--miss-rate", type=float, default=0.8, help="Fracción de consultas sin intentos previos")
+    p.add_argument("--db", default=None, help="Base SQLite existente (por defecto se crea una temporal)")
+    p.set_defaults(func=_cmd_bench_attempts)
+
+    p = subparsers.add_parser("bench-geonames", help="Mide la carga de geonames (tiempo y pico de memoria)")
+    p.set_defaults(func=_cmd_bench_geonames)
+
+    p = subparsers.add_parser("bench-ip-enrich", help="Compara enrich_ips con las consultas get_* fila a fila")
+    p.add_argument("--input", default=None, help="Fichero .csv o .parquet con las IPs (por defecto IPs sintéticas)")
+    p.add_argument("--column", default="ip_address", help="Columna con la IP")
+    p.add_argument("-n", type=int, default=200_000, help="Número de IPs sintéticas")
+    p.add_argument("--distinct", type=int, default=20_000, help="IPs sintéticas distintas")
+    p.set_defaults(func=_cmd_bench_ip_enrich)
+
+    p = subparsers.add_parser("build-ip-table", help="Precalcula la tabla de rangos de IP de las features de ASN y ciudad")
+    p.add_argument("--output", default=str(ip_flag_table_path()))
+    p.set_defaults(func=_cmd_build_ip_table)
+
+    p = subparsers.add_parser("build-ua-table", help="Precalcula la tabla de firmas de User Agent")
+    p.add_argument("input", help="Fichero .csv o .parquet de solicitudes históricas")
+    p.add_argument("--column", default="device_info", help="Columna con el User Agent")
+    p.add_argument("--output", default=str(ua_signatures_path()))
+    p.set_defaults(func=_cmd_build_ua_table)
+
+    p = subparsers.add_parser("profile-report", help="Resume los perfiles capturados con --profile-dir")
+    p.add_argument("directory", help="Directorio de perfiles")
+    p.add_argument("--top", type=int, default=20, help="Número de funciones y líneas a mostrar")
+    p.add_argument("--sort", default="cumulative", help="Orden de las funciones (cumulative, tottime, calls, ...)")
+    p.set_defaults(func=lambda args: profile_report(args.directory, args.top, args.sort))
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
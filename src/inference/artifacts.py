@@ -1,12 +1,21 @@
 from __future__ import annotations
 import csv
+import os
+import warnings
 import joblib
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Optional
+from hashlib import blake2b
+from typing import Dict, Iterable, Optional
 import numpy as np
 import pandas as pd
 
+from inference.attempts_sqlite import SQLiteAttemptsStore, build_attempts_db
+from inference.attempts_store import AttemptsBackend, AttemptsStore, PrefilteredAttempts, build_identity_filter
+from inference.bloom import BloomFilter
+from inference.ip_flag_table import IpFlagTable
+from inference.ip_info import database_paths
+
 CUTS_10 = [
   0.24004863,
   0.31109679,
@@ -19,6 +28,12 @@ CUTS_10 = [
   0.62751055
 ]
 
+# Días de la semana en el orden de Timestamp.dayofweek (tal y como los devuelve day_name())
+DAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+# Variables del último eje de temporal_cube
+TEMPORAL_VARS = ('hour_loan_flag_shrinkage', 'day_week_flag_shrinkage', 'day_hour_loan_flag_shrinkage')
+
 @dataclass(frozen=True)
 class Artifacts:
   # feature_name -> category_value -> shrinkage
@@ -28,15 +43,24 @@ class Artifacts:
   last_attempt_model: Optional[object] = None
   last_attempt_artifacts: Optional[Dict] = None
 
-  # DataFrame con los intentos todos los intentos previos fallidos
-  df_attempts: Optional[pd.DataFrame] = None
+  # Intentos previos fallidos (AttemptsStore en memoria o SQLiteAttemptsStore)
+  attempts_store: Optional[AttemptsBackend] = None
 
   # DataFrame para la similitud entre emails
   df_block_bad_emails: Optional[pd.DataFrame] = None
 
+  # Shrinkage temporales precalculados: [día de la semana, día del mes - 1, hora, variable]
+  temporal_cube: Optional[np.ndarray] = None
+
+  # Rangos de IP -> (ip_asn_flag_shrinkage, ip_city_flag_shrinkage) (solo si se ha construido)
+  ip_flag_table: Optional[IpFlagTable] = None
+
 
 _ARTIFACTS: Optional[Artifacts] = None
 
+# DataFrame con todos los intentos previos fallidos (solo se carga si se pide)
+_DF_ATTEMPTS: Optional[pd.DataFrame] = None
+
 
 def _data_artifacts_dir():
   """Directorio de CSVs de shrinkage"""
@@ -103,10 +127,14 @@ def _load_bad_emails_blocks():
     return None
 
 
+def attempts_csv_path():
+  """Ruta del CSV con el historial de intentos previos fallidos"""
+  return _data_artifacts_dir() / "df_attempts.csv"
+
+
 def _load_dataframe_previous_attemtps():
   """Carga el df con todos los intentos previos fallidos de todos los usuarios new"""
-  previous_path = _data_artifacts_dir()
-  previous_path = previous_path / "df_attempts.csv"
+  previous_path = attempts_csv_path()
 
   # En caso de no existir el archivo csv devolvemos un None
   try:
@@ -117,6 +145,167 @@ def _load_dataframe_previous_attemtps():
     return None
 
 
+def _build_temporal_cube(shrinkage):
+  """
+  Precalcula las shrinkage de TEMPORAL_VARS para cada combinación de día de la
+  semana, día del mes y hora (7 x 31 x 24), con la misma lógica que get_temporal_vars.
+  """
+  def lookup(feature, key, default):
+    return shrinkage.get(feature, {}).get(key, default)
+
+  cube = np.empty((len(DAY_NAMES), 31, 24, len(TEMPORAL_VARS)), dtype=float)
+  for hour in range(24):
+    hour_flag = lookup("hour_loan", str(hour), "NORMAL")
+    cube[:, :, hour, 0] = float(lookup("hour_loan_flag", hour_flag, 1.0))
+
+    for weekday, day_name in enumerate(DAY_NAMES):
+      cube[weekday, :, hour, 1] = float(lookup("day_week_flag", day_name + "_" + hour_flag, 1.0))
+
+    for day in range(1, 32):
+      day_hour_flag = lookup("day_hour_loan", f"{day:02d}_{hour:02d}", "NORMAL")
+      cube[:, day - 1, hour, 2] = float(lookup("day_hour_loan_flag", day_hour_flag, 1.0))
+
+  return cube
+
+
+def attempts_bloom_path(db_path):
+  """Ruta del Bloom filter de identidades que acompaña a una base SQLite de intentos o a df_attempts.csv"""
+  return Path(db_path).with_suffix(".bloom.npz")
+
+
+def _load_identity_filter(path, source_stamp):
+  """Bloom filter guardado en `path` si existe y se construyó con `source_stamp`; si no, None"""
+  path = Path(path)
+  if source_stamp is None or not path.exists():
+    return None
+  bloom = BloomFilter.load(path)
+  return bloom if bloom.source_stamp == source_stamp else None
+
+
+def _load_attempts_db(db_path):
+  """
+  Abre la base SQLite de intentos. Si no existe o se construyó con otro
+  df_attempts.csv (source_stamp distinto), se reconstruye desde el CSV; si el
+  CSV no existe se usa la base tal cual (o None si tampoco hay base).
+  """
+  stamp = attempts_stamp()
+  store = SQLiteAttemptsStore(db_path) if db_path.exists() else None
+  if store is not None and (store.source_stamp == stamp or not attempts_csv_path().exists()):
+    return store
+
+  df_attempts = _load_dataframe_previous_attemtps()
+  if df_attempts is None:
+    return store
+  if store is not None:
+    store.close()
+    warnings.warn(f"{db_path} no corresponde al df_attempts.csv actual; se reconstruye")
+  build_attempts_db(df_attempts, db_path, source_stamp=stamp)
+  return SQLiteAttemptsStore(db_path)
+
+
+def _load_attempts_store():
+  """
+  Crea el backend de intentos previos indicado en ATTEMPTS_BACKEND:
+  'memory' (por defecto, arrays en memoria) o 'sqlite' (fichero ATTEMPTS_DB,
+  que se construye desde df_attempts.csv si no existe o se construyó con otro
+  CSV). Salvo ATTEMPTS_PREFILTER=0, el backend va precedido de un Bloom filter
+  de identidades, guardado junto a la base SQLite o a df_attempts.csv, que se
+  reconstruye si no corresponde a sus datos.
+
+  Los intentos nuevos se añaden con PrefilteredAttempts.add, que actualiza el
+  filtro y el store en memoria a la vez (el backend SQLite es de solo lectura).
+  """
+  backend = os.environ.get("ATTEMPTS_BACKEND", "memory").lower()
+  prefilter = os.environ.get("ATTEMPTS_PREFILTER", "1") != "0"
+
+  if backend == "sqlite":
+    db_path = Path(os.environ.get("ATTEMPTS_DB", _data_artifacts_dir() / "df_attempts.sqlite"))
+    store = _load_attempts_db(db_path)
+    if store is None or not prefilter:
+      return store
+
+    # Un filtro de otra base daría falsos negativos (intentos reales -> num_attempts = 0)
+    bloom_path = attempts_bloom_path(db_path)
+    bloom = _load_identity_filter(bloom_path, store.source_stamp)
+    if bloom is None:
+      bloom = build_identity_filter(store, source_stamp=store.source_stamp)
+      bloom.save(bloom_path)
+    return PrefilteredAttempts(store, bloom)
+
+  if backend != "memory":
+    raise ValueError(f"ATTEMPTS_BACKEND desconocido: {backend} (usar 'memory' o 'sqlite')")
+
+  # El DataFrame solo se usa para construir el store y no se conserva
+  stamp = attempts_stamp()
+  df_attempts = _load_dataframe_previous_attemtps()
+  if df_attempts is None:
+    return None
+  store = AttemptsStore.from_frame(df_attempts)
+  if not prefilter:
+    return store
+
+  # El filtro se guarda junto a df_attempts.csv (df_attempts.bloom.npz) con la huella del CSV
+  bloom_path = attempts_bloom_path(attempts_csv_path())
+  bloom = _load_identity_filter(bloom_path, stamp)
+  if bloom is None:
+    bloom = build_identity_filter(store, source_stamp=stamp)
+    bloom.save(bloom_path)
+  return PrefilteredAttempts(store, bloom)
+
+
+def ip_flag_table_path():
+  """Ruta de la tabla de rangos de IP (IP_FLAG_TABLE o ip_flag_table.npz en el directorio de datos)"""
+  return Path(os.environ.get("IP_FLAG_TABLE", _data_artifacts_dir() / "ip_flag_table.npz"))
+
+
+def files_stamp(paths: Iterable) -> str:
+  """Huella (nombre, tamaño, fecha de modificación) de unos ficheros; los que no existen cuentan como ausentes"""
+  digest = blake2b(digest_size=8)
+  for path in map(Path, paths):
+    if path.exists():
+      stat = path.stat()
+      digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns};".encode('utf-8'))
+    else:
+      digest.update(f"{path.name}:-;".encode('utf-8'))
+  return digest.hexdigest()
+
+
+def attempts_stamp():
+  """Huella del df_attempts.csv del que salen la base SQLite de intentos y su Bloom filter"""
+  return files_stamp([attempts_csv_path()])
+
+
+def ip_flag_table_stamp():
+  """Huella de los ficheros de los que sale la tabla de rangos de IP (bases GeoLite2 y CSVs de flags)"""
+  base = _data_artifacts_dir()
+  return files_stamp([
+      *database_paths(),
+      base / "ip_asn_flag.csv",
+      base / "ip_asn_flag_shrinkage.csv",
+      base / "ip_city_flag.csv",
+      base / "ip_city_flag_shrinkage.csv",
+  ])
+
+
+def _load_ip_flag_table():
+  """
+  Carga la tabla de rangos de IP si se ha construido con build-ip-table; si no
+  existe o se construyó con otras bases GeoLite2 / CSVs de flags, las features
+  de IP se calculan consultando las bases GeoLite2.
+  """
+  path = ip_flag_table_path()
+  if not path.exists():
+    return None
+  table = IpFlagTable.load(path)
+  if table.source_stamp != ip_flag_table_stamp():
+    warnings.warn(
+      f"{path} no corresponde a las bases GeoLite2 y CSVs de flags actuales; se ignora "
+      "(regenerar con python -m inference build-ip-table)"
+    )
+    return None
+  return table
+
+
 def load_artifacts():
   """
   Carga todos los shrinkage maps y modelos una sola vez (cold start) y los cachea.
@@ -160,8 +349,8 @@ def load_artifacts():
       # Cargar modelos ML
       last_attempt_model, last_attempt_artifacts = _load_last_attempt_model()
 
-      # Cargamos todos los intentos previos fallidos de creditos
-      df_attempts = _load_dataframe_previous_attemtps()
+      # Indexamos todos los intentos previos fallidos de creditos
+      attempts_store = _load_attempts_store()
 
       # Cargamos los bad emails para poder hacer la compartiva de similitud
       df_block_bad_emails = _load_bad_emails_blocks()
@@ -170,8 +359,10 @@ def load_artifacts():
           shrinkage=shrinkage,
           last_attempt_model=last_attempt_model,
           last_attempt_artifacts=last_attempt_artifacts,
-          df_attempts = df_attempts,
+          attempts_store = attempts_store,
           df_block_bad_emails = df_block_bad_emails,
+          temporal_cube = _build_temporal_cube(shrinkage),
+          ip_flag_table = _load_ip_flag_table(),
       )
       
     #   print("✅ Todos los artifacts cargados correctamente")
@@ -190,10 +381,30 @@ def get_var_flag(feature, key, default="NORMAL"):
   return art.shrinkage.get(feature, {}).get(key, default)
 
 
+def get_temporal_cube():
+  """Obtenemos el cubo [día de la semana, día del mes - 1, hora] -> shrinkage temporales"""
+  art = load_artifacts()
+  return art.temporal_cube
+
+
+def get_ip_flag_table():
+  """Obtenemos la tabla de rangos de IP -> shrinkage de ASN y ciudad (None si no se ha construido)"""
+  art = load_artifacts()
+  return art.ip_flag_table
+
+
 def get_previous_attempts():
     """ Obtenemos el DataFrame con los inentos anteriores fallidos"""
-    art = load_artifacts()
-    return art.df_attempts
+    global _DF_ATTEMPTS
+    if _DF_ATTEMPTS is None:
+        _DF_ATTEMPTS = _load_dataframe_previous_attemtps()
+    return _DF_ATTEMPTS
+
+
+def get_attempts_store():
+  """Obtenemos el store compacto de intentos anteriores fallidos"""
+  art = load_artifacts()
+  return art.attempts_store
 
 
 def get_bad_emails_blocks():
@@ -0,0 +1,203 @@
+"""
+Attempts SQLite
+Backend de intentos previos fallidos sobre un fichero SQLite compartido: las
+identidades se guardan normalizadas e indexadas junto a created_at, de forma que
+varios workers consultan el mismo fichero sin cargar el historial en memoria.
+"""
+
+import os
+import queue
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from inference.attempts_store import IDENTITY_NORMALIZERS, AttemptsBackend, attempts_result, empty_result
+from inference.hashing import hash64_array
+
+DEFAULT_POOL_SIZE = 4
+
+_SQL_CREATE = """
+CREATE TABLE attempts (
+    id INTEGER PRIMARY KEY,
+    dni TEXT,
+    email TEXT,
+    cell_phone TEXT,
+    ip_address TEXT,
+    created_at INTEGER NOT NULL
+)
+"""
+
+# Metadatos de la base (source_stamp: huella del df_attempts.csv con el que se construyó)
+_SQL_CREATE_META = "CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)"
+
+_SQL_STAMP = "SELECT value FROM meta WHERE key = 'source_stamp'"
+
+# Un índice compuesto (identidad, fecha) por tipo de identidad: cada consulta es un rango del índice
+_SQL_INDEXES = tuple(
+    f"CREATE INDEX idx_attempts_{kind} ON attempts ({kind}, created_at)" for kind in IDENTITY_NORMALIZERS
+)
+
+_SQL_INSERT = "INSERT INTO attempts (dni, email, cell_phone, ip_address, created_at) VALUES (?, ?, ?, ?, ?)"
+
+# UNION elimina duplicados: un intento que coincide por varias identidades cuenta una vez
+_SQL_PREVIOUS = """
+SELECT COUNT(*), MAX(created_at) FROM (
+    SELECT id, created_at FROM attempts WHERE dni = ? AND created_at < ?
+    UNION
+    SELECT id, created_at FROM attempts WHERE email = ? AND created_at < ?
+    UNION
+    SELECT id, created_at FROM attempts WHERE cell_phone = ? AND created_at < ?
+)
+"""
+
+_SQL_REQ_IP = "SELECT COUNT(*) FROM attempts WHERE ip_address = ? AND created_at < ?"
+
+_SQL_COUNT = "SELECT COUNT(*) FROM attempts"
+
+
+def _identity(kind, value):
+    """Identidad normalizada o None (NULL no coincide con nada en SQL)."""
+    return IDENTITY_NORMALIZERS[kind](value) or None
+
+
+def build_attempts_db(df: pd.DataFrame, path, chunksize: int = 100_000, source_stamp: Optional[str] = None) -> Path:
+    """
+    Crea el fichero SQLite de intentos previos a partir de un DataFrame con las
+    columnas de df_attempts.csv. Se escribe en un fichero temporal único del mismo
+    directorio que se renombra al terminar, de forma que los lectores nunca ven
+    una base a medio construir y dos procesos que la construyan a la vez no se
+    pisan (queda la del último rename).
+
+    `source_stamp` (huella del df_attempts.csv de origen, ver
+    artifacts.attempts_stamp) se guarda en la tabla meta para detectar bases
+    construidas con otro historial.
+
+    Returns
+    -------
+    pathlib.Path
+        Ruta del fichero creado.
+    """
+    path = Path(path)
+
+    created_at = pd.to_datetime(df['created_at'], errors="coerce")
+    valid = created_at.notna().to_numpy()
+    df = df.loc[valid]
+    ts = created_at[valid].to_numpy(dtype='datetime64[ns]').astype('int64')
+
+    columns = {
+        kind: df[kind].map(lambda value, kind=kind: _identity(kind, value)).to_numpy(dtype=object)
+        for kind in IDENTITY_NORMALIZERS
+    }
+
+    fd, tmp_name = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp", dir=path.parent)
+    os.close(fd)
+    tmp_path = Path(tmp_name)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute(_SQL_CREATE)
+        conn.execute(_SQL_CREATE_META)
+        conn.execute("INSERT INTO meta (key, value) VALUES ('source_stamp', ?)", (source_stamp or "",))
+        for start in range(0, len(ts), chunksize):
+            end = start + chunksize
+            conn.executemany(_SQL_INSERT, zip(
+                columns['dni'][start:end],
+                columns['email'][start:end],
+                columns['cell_phone'][start:end],
+                columns['ip_address'][start:end],
+                ts[start:end].tolist(),
+            ))
+        # Los índices se crean después de la carga (más rápido que mantenerlos en cada insert)
+        for sql in _SQL_INDEXES:
+            conn.execute(sql)
+        conn.execute("ANALYZE")
+        conn.commit()
+    except BaseException:
+        conn.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+    conn.close()
+
+    tmp_path.replace(path)
+    return path
+
+
+class SQLiteAttemptsStore(AttemptsBackend):
+    """
+    Intentos previos fallidos en un fichero SQLite de solo lectura.
+
+    Mantiene un pool de conexiones (sqlite3 cachea las sentencias preparadas por
+    conexión) para poder usarse desde varios hilos a la vez.
+    """
+
+    def __init__(self, path, pool_size: int = DEFAULT_POOL_SIZE):
+        self.path = Path(path)
+        if not self.path.exists():
+            raise FileNotFoundError(f"No existe la base de intentos: {self.path}")
+
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f"file:{self.path}?mode=ro", uri=True, check_same_thread=False, cached_statements=16,
+        )
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def __len__(self):
+        with self._connection() as conn:
+            return conn.execute(_SQL_COUNT).fetchone()[0]
+
+    @property
+    def source_stamp(self) -> Optional[str]:
+        """Huella del df_attempts.csv con el que se construyó la base (None si no se registró)."""
+        with self._connection() as conn:
+            try:
+                row = conn.execute(_SQL_STAMP).fetchone()
+            except sqlite3.OperationalError:
+                # Bases construidas antes de registrar la huella (sin tabla meta)
+                return None
+        return (row[0] if row else "") or None
+
+    def identity_hashes(self, kind: str) -> np.ndarray:
+        """hash64 de las identidades distintas de tipo `kind` del historial."""
+        with self._connection() as conn:
+            values = conn.execute(f"SELECT DISTINCT {kind} FROM attempts WHERE {kind} IS NOT NULL").fetchall()
+        return np.unique(hash64_array([value for value, in values]))
+
+    def transform(self, dni, email, cell_phone, ip_address, created_at) -> Dict:
+        created_at = pd.Timestamp(created_at)
+        if pd.isna(created_at):
+            return empty_result()
+        t = created_at.value
+
+        with self._connection() as conn:
+            num_attempts, last_ts = conn.execute(_SQL_PREVIOUS, (
+                _identity('dni', dni), t,
+                _identity('email', email), t,
+                _identity('cell_phone', cell_phone), t,
+            )).fetchone()
+            req_ip = conn.execute(_SQL_REQ_IP, (_identity('ip_address', ip_address), t)).fetchone()[0]
+
+        return attempts_result(t, num_attempts, last_ts, req_ip)
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
@@ -0,0 +1,383 @@
+"""
+Attempts store
+Historial de intentos previos fallidos en formato compacto: cada identidad
+normalizada (dni, email, teléfono, IP) se representa por su hash de 64 bits y las
+fechas como int64 (ns), en arrays NumPy ordenados por (identidad, fecha), en
+lugar de columnas object de pandas.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from inference.bloom import BloomFilter
+from inference.hashing import hash64, hash64_array
+from inference.identity_normalizer import normalize_dni, normalize_email, normalize_cell_phone, normalize_ip
+
+# Columna de df_attempts -> normalización aplicada tanto al historial como a la consulta
+IDENTITY_NORMALIZERS = {
+    'dni': normalize_dni,
+    'email': normalize_email,
+    'cell_phone': normalize_cell_phone,
+    'ip_address': normalize_ip,
+}
+
+# Sal por tipo de identidad para el Bloom filter (un mismo texto como dni y como email son entradas distintas)
+_KIND_SALT = {kind: hash64(kind) for kind in IDENTITY_NORMALIZERS}
+
+_NS_PER_DAY = 24 * 3600 * 10**9
+_NS_PER_MINUTE = 60 * 10**9
+# Fecha en ns de NaT (sin intento / fecha nula)
+_NO_TS = np.iinfo(np.int64).min
+
+
+def empty_result() -> Dict:
+    """Variables de intentos previos de una solicitud sin intentos anteriores."""
+    return {'num_attempts': 0, 'diff_days_last_attemtp': np.nan, 'last_attempt': 0, 'req_ip': 0}
+
+
+def attempts_result(t: int, num_attempts: int, last_ts: Optional[int], req_ip: int) -> Dict:
+    """
+    Construye el diccionario de transform a partir de la fecha de la solicitud `t`
+    (ns), el número de intentos previos, la fecha del último (ns) y los intentos con su IP.
+    """
+    result = empty_result()
+    result['num_attempts'] = num_attempts
+    result['req_ip'] = req_ip
+    if num_attempts:
+        diff = t - last_ts
+        result['diff_days_last_attemtp'] = diff // _NS_PER_DAY
+        result['last_attempt'] = diff / _NS_PER_MINUTE
+    return result
+
+
+class AttemptsBackend(ABC):
+    """
+    Interfaz de los backends de intentos previos fallidos (en memoria o SQLite).
+
+    Las identidades se normalizan con IDENTITY_NORMALIZERS tanto al construir el
+    backend como al consultarlo.
+    """
+
+    @abstractmethod
+    def transform(self, dni, email, cell_phone, ip_address, created_at) -> Dict:
+        """
+        Mismas variables que previous_attempts_transformer.transform: num_attempts,
+        diff_days_last_attemtp, last_attempt y req_ip.
+        """
+
+    @abstractmethod
+    def __len__(self):
+        """Número de intentos del historial."""
+
+    def transform_batch(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Variables de transform para cada solicitud de `df` (columnas dni, email,
+        cell_phone, ip_address y created_at), con el índice de `df`.
+
+        Por defecto consulta el backend solicitud a solicitud; los backends que
+        pueden resolver el lote de una vez lo sobrescriben.
+        """
+        columns = df[['dni', 'email', 'cell_phone', 'ip_address', 'created_at']]
+        return _result_frame([self.transform(*row) for row in columns.itertuples(index=False)], df.index)
+
+    def add(self, dni, email, cell_phone, ip_address, created_at):
+        """
+        Añade un nuevo intento al historial. Por defecto los backends son de solo
+        lectura (el historial se reconstruye desde df_attempts.csv).
+        """
+        raise NotImplementedError(f"{type(self).__name__} es de solo lectura")
+
+    def close(self):
+        """Libera los recursos del backend (conexiones, ficheros)."""
+
+
+def _result_frame(results, index) -> pd.DataFrame:
+    """DataFrame con las variables de transform a partir de una lista de sus diccionarios."""
+    return pd.DataFrame(results, columns=list(empty_result()), index=index).astype({
+        'num_attempts': np.int64, 'diff_days_last_attemtp': float, 'last_attempt': float, 'req_ip': np.int64,
+    })
+
+
+# Combinaciones de identidades para el conteo por inclusión-exclusión: (columnas, signo)
+_ATTEMPT_KEY_SETS = (
+    (('dni',), 1),
+    (('email',), 1),
+    (('cell_phone',), 1),
+    (('dni', 'email'), -1),
+    (('dni', 'cell_phone'), -1),
+    (('email', 'cell_phone'), -1),
+    (('dni', 'email', 'cell_phone'), 1),
+)
+
+
+def _asof_previous(apps: pd.DataFrame, attempts: pd.DataFrame, keys, n: int):
+    """
+    Para cada una de las `n` solicitudes (columna _row de `apps`), número de intentos con las mismas `keys` (hash64, 0 si
+    la identidad está vacía) estrictamente anteriores a su created_at y fecha
+    (ns) del último de ellos, con un merge as-of.
+    """
+    attempts = attempts[list(keys) + ['created_at']]
+    attempts = attempts[(attempts[list(keys)] != 0).all(axis=1)].sort_values('created_at', kind='stable')
+    attempts = attempts.assign(
+        _count=attempts.groupby(list(keys), sort=False).cumcount() + 1,
+        _last=attempts['created_at'],
+    )
+
+    apps = apps[['_row'] + list(keys) + ['created_at']]
+    apps = apps[(apps[list(keys)] != 0).all(axis=1)].sort_values('created_at', kind='stable')
+
+    # allow_exact_matches=False: solo intentos con created_at < el de la solicitud (sin fuga de información)
+    merged = pd.merge_asof(
+        apps, attempts, on='created_at', by=list(keys),
+        allow_exact_matches=False, direction='backward',
+    )
+
+    count = np.zeros(n, dtype=np.int64)
+    last = np.full(n, _NO_TS, dtype=np.int64)
+    rows = merged['_row'].to_numpy()
+    count[rows] = merged['_count'].fillna(0).to_numpy(dtype=np.int64)
+    last[rows] = merged['_last'].fillna(_NO_TS).to_numpy(dtype=np.int64)
+    return count, last
+
+
+def _identity_index(values: pd.Series, normalize, ts: np.ndarray):
+    """
+    Hashea las identidades normalizadas de `values` y devuelve (keys, rows)
+    ordenados por (hash, fecha). Las identidades vacías se descartan.
+    """
+    codes, uniques = pd.factorize(values)
+    normalized = [normalize(value) for value in uniques]
+    hashes = hash64_array(normalized)
+
+    # Diccionario hash -> identidad solo para comprobar colisiones durante la construcción
+    seen: Dict[int, str] = {}
+    for h, identity in zip(hashes.tolist(), normalized):
+        if identity and seen.setdefault(h, identity) != identity:
+            raise ValueError(f"Colisión de hash64 entre '{seen[h]}' y '{identity}' en {values.name}")
+
+    non_empty = np.array([bool(identity) for identity in normalized] + [False], dtype=bool)
+    rows = np.flatnonzero(non_empty[codes]).astype(np.int32)  # codes == -1 (nulos) -> False
+
+    row_keys = hashes[codes[rows]]
+    order = np.lexsort((ts[rows], row_keys))
+    return row_keys[order], rows[order]
+
+
+class AttemptsStore(AttemptsBackend):
+    """
+    Intentos previos fallidos en memoria indexados por identidad.
+
+    Para cada tipo de identidad guarda `keys` (hash64 ordenado) y `rows` (fila del
+    intento, ordenada por fecha dentro de cada hash); las fechas se guardan una sola
+    vez en `ts`. Una consulta es una búsqueda binaria por hash y otra por fecha.
+    """
+
+    def __init__(self, ts: np.ndarray, keys: Dict[str, np.ndarray], rows: Dict[str, np.ndarray]):
+        self.ts = ts
+        self.keys = keys
+        self.rows = rows
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "AttemptsStore":
+        """Construye el store desde un DataFrame con las columnas de df_attempts.csv."""
+        created_at = pd.to_datetime(df['created_at'], errors="coerce")
+        valid = created_at.notna().to_numpy()
+        df = df.loc[valid]
+        ts = created_at[valid].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+
+        keys, rows = {}, {}
+        for kind, normalize in IDENTITY_NORMALIZERS.items():
+            keys[kind], rows[kind] = _identity_index(df[kind], normalize, ts)
+        return cls(ts, keys, rows)
+
+    def __len__(self):
+        return len(self.ts)
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria ocupada por los arrays del store."""
+        return self.ts.nbytes + sum(a.nbytes for a in self.keys.values()) + sum(a.nbytes for a in self.rows.values())
+
+    def identity_hashes(self, kind: str) -> np.ndarray:
+        """hash64 de las identidades distintas de tipo `kind` del historial."""
+        return np.unique(self.keys[kind])
+
+    def add(self, dni, email, cell_phone, ip_address, created_at):
+        """
+        Añade un intento en memoria manteniendo el orden (hash, fecha) de cada
+        índice. Cada inserción copia los arrays (O(n)): sirve para ir añadiendo
+        los intentos que llegan entre dos reconstrucciones, no para cargas
+        masivas (from_frame). No es thread-safe frente a consultas concurrentes.
+        """
+        created_at = pd.Timestamp(created_at)
+        if pd.isna(created_at):
+            return
+        t = created_at.value
+
+        row = len(self.ts)
+        self.ts = np.append(self.ts, np.int64(t))
+        values = {'dni': dni, 'email': email, 'cell_phone': cell_phone, 'ip_address': ip_address}
+        for kind, value in values.items():
+            identity = IDENTITY_NORMALIZERS[kind](value)
+            if not identity:
+                continue
+            h = hash64(identity)
+            keys, rows = self.keys[kind], self.rows[kind]
+            lo = np.searchsorted(keys, h, side='left')
+            hi = np.searchsorted(keys, h, side='right')
+            pos = lo + np.searchsorted(self.ts[rows[lo:hi]], t, side='right')
+            self.keys[kind] = np.insert(keys, pos, h)
+            self.rows[kind] = np.insert(rows, pos, row)
+
+    def previous_rows(self, kind: str, value, t: int) -> np.ndarray:
+        """Filas de los intentos con la identidad `value` de tipo `kind` anteriores a `t` (ns)."""
+        identity = IDENTITY_NORMALIZERS[kind](value)
+        if not identity:
+            return self.rows[kind][:0]
+
+        h = hash64(identity)
+        keys = self.keys[kind]
+        lo = np.searchsorted(keys, h, side='left')
+        hi = np.searchsorted(keys, h, side='right')
+        rows = self.rows[kind][lo:hi]
+        return rows[:np.searchsorted(self.ts[rows], t, side='left')]
+
+    def transform(self, dni, email, cell_phone, ip_address, created_at) -> Dict:
+        created_at = pd.Timestamp(created_at)
+        if pd.isna(created_at):
+            return empty_result()
+        t = created_at.value
+
+        # Intentos con el mismo dni, email o teléfono (cada intento una sola vez)
+        previous = np.unique(np.concatenate([
+            self.previous_rows('dni', dni, t),
+            self.previous_rows('email', email, t),
+            self.previous_rows('cell_phone', cell_phone, t),
+        ]))
+        last_ts = int(self.ts[previous].max()) if len(previous) else None
+
+        return attempts_result(t, len(previous), last_ts, len(self.previous_rows('ip_address', ip_address, t)))
+
+    def _row_hashes(self, kind: str) -> np.ndarray:
+        """hash64 de la identidad `kind` de cada intento (0 si está vacía)."""
+        hashes = np.zeros(len(self.ts), dtype=np.int64)
+        hashes[self.rows[kind]] = self.keys[kind]
+        return hashes
+
+    def transform_batch(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Versión por lotes de transform: un único merge as-of por combinación de
+        identidades (sobre sus hash64) en lugar de una consulta por solicitud. El
+        número de intentos con el mismo dni, email o teléfono se obtiene por
+        inclusión-exclusión sobre los conteos de cada combinación.
+        """
+        n = len(df)
+        created_at = pd.to_datetime(df['created_at']).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        valid = created_at != _NO_TS
+
+        attempts = pd.DataFrame({kind: self._row_hashes(kind) for kind in IDENTITY_NORMALIZERS})
+        attempts['created_at'] = self.ts
+        apps = pd.DataFrame({'_row': np.arange(n)})
+        for kind, normalize in IDENTITY_NORMALIZERS.items():
+            identities = df[kind].map(normalize)
+            apps[kind] = np.where(identities != "", hash64_array(identities.tolist()), 0)
+        apps['created_at'] = created_at
+        apps = apps[valid]
+
+        num_attempts = np.zeros(n, dtype=np.int64)
+        last = np.full(n, _NO_TS, dtype=np.int64)
+        for keys, sign in _ATTEMPT_KEY_SETS:
+            count, last_key = _asof_previous(apps, attempts, keys, n)
+            num_attempts += sign * count
+            if len(keys) == 1:
+                last = np.maximum(last, last_key)
+        req_ip, _ = _asof_previous(apps, attempts, ('ip_address',), n)
+
+        return _result_frame([
+            attempts_result(t, int(num), int(last_ts), int(ip)) if is_valid else empty_result()
+            for t, num, last_ts, ip, is_valid in zip(created_at, num_attempts, last, req_ip, valid)
+        ], df.index)
+
+
+def build_identity_filter(store, error_rate: float = 0.01, headroom: float = 2.0,
+                          source_stamp: Optional[str] = None) -> BloomFilter:
+    """
+    Construye el Bloom filter de identidades (dni, email, teléfono e IP) de un
+    AttemptsStore o SQLiteAttemptsStore (cualquier backend con identity_hashes).
+    `headroom` reserva capacidad para las identidades que se añadan después sin
+    reconstruirlo y `source_stamp` se guarda con el filtro.
+    """
+    unique_keys = {kind: store.identity_hashes(kind) for kind in IDENTITY_NORMALIZERS}
+    capacity = int(headroom * sum(len(keys) for keys in unique_keys.values()))
+
+    bloom = BloomFilter(capacity, error_rate=error_rate, source_stamp=source_stamp)
+    for kind, keys in unique_keys.items():
+        bloom.add_hashes(keys ^ np.int64(_KIND_SALT[kind]))
+    return bloom
+
+
+class PrefilteredAttempts(AttemptsBackend):
+    """
+    Backend de intentos previos precedido de un Bloom filter de identidades: si
+    ninguna identidad de la solicitud está en el filtro no tiene intentos previos
+    y se devuelve empty_result() sin consultar el backend.
+    """
+
+    def __init__(self, backend: AttemptsBackend, bloom: BloomFilter):
+        self.backend = backend
+        self.bloom = bloom
+
+    def __len__(self):
+        return len(self.backend)
+
+    def _hashes(self, dni, email, cell_phone, ip_address):
+        values = {'dni': dni, 'email': email, 'cell_phone': cell_phone, 'ip_address': ip_address}
+        for kind, value in values.items():
+            identity = IDENTITY_NORMALIZERS[kind](value)
+            if identity:
+                yield hash64(identity) ^ _KIND_SALT[kind]
+
+    def may_have_attempts(self, dni, email, cell_phone, ip_address) -> bool:
+        """False si es seguro que ninguna identidad tiene intentos previos."""
+        return any(self.bloom.contains_hash(h) for h in self._hashes(dni, email, cell_phone, ip_address))
+
+    def add_identities(self, dni, email, cell_phone, ip_address):
+        """Añade al filtro las identidades de un nuevo intento (actualización incremental)."""
+        for h in self._hashes(dni, email, cell_phone, ip_address):
+            self.bloom.add_hash(h)
+
+    def add(self, dni, email, cell_phone, ip_address, created_at):
+        """
+        Añade un nuevo intento al backend y sus identidades al filtro. El filtro
+        se actualiza primero: así una consulta nunca ve un intento del backend
+        que el filtro descarte. Los intentos añadidos solo viven en memoria (el
+        filtro guardado corresponde a df_attempts.csv).
+        """
+        self.add_identities(dni, email, cell_phone, ip_address)
+        self.backend.add(dni, email, cell_phone, ip_address, created_at)
+
+    def transform(self, dni, email, cell_phone, ip_address, created_at) -> Dict:
+        if not self.may_have_attempts(dni, email, cell_phone, ip_address):
+            return empty_result()
+        return self.backend.transform(dni, email, cell_phone, ip_address, created_at)
+
+    def transform_batch(self, df: pd.DataFrame) -> pd.DataFrame:
+        """transform_batch del backend solo con las solicitudes que pasan el filtro."""
+        columns = df[['dni', 'email', 'cell_phone', 'ip_address']]
+        candidates = np.fromiter(
+            (self.may_have_attempts(*row) for row in columns.itertuples(index=False)), dtype=bool, count=len(df),
+        )
+        result = _result_frame([empty_result()] * len(df), df.index)
+        if candidates.any():
+            batch = self.backend.transform_batch(df[candidates])
+            for col in result.columns:
+                values = result[col].to_numpy(copy=True)
+                values[candidates] = batch[col].to_numpy()
+                result[col] = values
+        return result
+
+    def close(self):
+        self.backend.close()
@@ -0,0 +1,402 @@
+"""
+Attempts velocity
+Contadores de intentos fallidos en ventanas deslizantes (1h, 24h, 7d, 30d) por
+dni, email, teléfono e IP, y número de dnis, emails y teléfonos distintos por IP,
+mantenidos de forma incremental a medida que llegan los intentos.
+
+Cada identidad guarda sus timestamps ordenados y, por ventana, un puntero al
+primer intento dentro de la ventana. Los punteros (y los contadores de
+identidades distintas) se mueven intento a intento en ambos sentidos: una
+consulta cuesta O(d) con d el número de intentos que separan su fecha de la de
+la consulta anterior, es decir O(1) amortizado para consultas en orden temporal
+(caso online). Un alta fuera de orden actualiza punteros y contadores en
+O(ventanas), más el desplazamiento O(n) de array.insert (memmove de los
+timestamps posteriores de esa identidad).
+
+Requisito de orden: el coste O(1) solo se cumple si las consultas de cada
+identidad llegan en orden de created_at. Una consulta anterior a la previa de la
+misma identidad retrocede los punteros intento a intento, así que un flujo
+desordenado puede costar O(n) por consulta; transform_batch ordena el lote por
+created_at antes de consultar.
+
+Con ATTEMPTS_VELOCITY=1 el pipeline añade estas features como EXTRA_FEATURES
+(etapa "velocity", ver pipeline.STAGES). record_attempt registra los nuevos
+intentos fallidos en memoria.
+"""
+
+import os
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from inference.artifacts import get_previous_attempts
+from inference.attempts_store import IDENTITY_NORMALIZERS
+
+# Nombre de la ventana -> duración en segundos
+WINDOWS: Dict[str, int] = {
+    '1h': 3600,
+    '24h': 24 * 3600,
+    '7d': 7 * 24 * 3600,
+    '30d': 30 * 24 * 3600,
+}
+
+# Tipo de identidad -> prefijo de la feature
+IDENTITY_KINDS: Dict[str, str] = {
+    'dni': 'dni',
+    'email': 'email',
+    'cell_phone': 'phone',
+    'ip_address': 'ip',
+}
+
+# Identidades de las que se cuentan valores distintos por IP (ip_distinct_{prefijo}_{ventana})
+DISTINCT_KINDS: Tuple[str, ...] = ('dni', 'email', 'cell_phone')
+
+_VELOCITY: Optional["AttemptsVelocity"] = None
+
+
+def velocity_feature_names(windows: Optional[Dict[str, int]] = None) -> Tuple[str, ...]:
+    """Nombres de las features de AttemptsVelocity.features, en su orden."""
+    windows = windows or WINDOWS
+    names = [f'attempts_{prefix}_{name}' for prefix in IDENTITY_KINDS.values() for name in windows]
+    names += [
+        f'ip_distinct_{IDENTITY_KINDS[kind]}_{name}' for name in windows for kind in DISTINCT_KINDS
+    ]
+    return tuple(names)
+
+
+# Features de velocidad con las ventanas por defecto (EXTRA_FEATURES del pipeline)
+VELOCITY_FEATURES: Tuple[str, ...] = velocity_feature_names()
+
+
+def _timestamp(created_at) -> float:
+    """Segundos desde epoch de una fecha (Timestamp, datetime o string)."""
+    return pd.Timestamp(created_at).value / 1e9
+
+
+def _count(counters, key: Tuple[str, ...], delta: int):
+    """Suma `delta` a cada identidad de `key` en su Counter (las vacías no cuentan)."""
+    for counter, identity in zip(counters, key):
+        if not identity:
+            continue
+        counter[identity] += delta
+        if not counter[identity]:
+            del counter[identity]
+
+
+class _Series:
+    """
+    Timestamps ordenados de los intentos de una identidad con los punteros de
+    cada ventana. Si `track_keys`, guarda también por intento una tupla con sus
+    identidades de DISTINCT_KINDS y, por ventana, un Counter por tipo para
+    contar identidades distintas.
+    """
+
+    __slots__ = ('ts', 'keys', 'windows', 'last_t', 'upper', 'lower', 'distinct')
+
+    def __init__(self, windows: Tuple[int, ...], track_keys: bool):
+        self.windows = windows
+        self.ts = array('d')
+        self.keys = [] if track_keys else None
+        self._reset()
+
+    def _reset(self):
+        # Sin consulta previa: la siguiente consulta recoloca los punteros con bisect
+        self.last_t = None
+        self.upper = 0
+        self.lower = [0] * len(self.windows)
+        self.distinct = (
+            [tuple(Counter() for _ in DISTINCT_KINDS) for _ in self.windows] if self.keys is not None else None
+        )
+
+    def add(self, t: float, key: Optional[Tuple[str, ...]] = None):
+        ts = self.ts
+        pos = len(ts) if not ts or t >= ts[-1] else bisect_right(ts, t)
+        ts.insert(pos, t)
+        if self.keys is not None:
+            self.keys.insert(pos, key)
+        if self.last_t is None or t >= self.last_t:
+            # Posterior a la última consulta: queda fuera de todas las ventanas
+            return
+
+        # Anterior a la última consulta: entra en [t - ventana, last_t) o desplaza el puntero
+        self.upper += 1
+        for i, window in enumerate(self.windows):
+            if t >= self.last_t - window:
+                if self.distinct is not None:
+                    _count(self.distinct[i], key, 1)
+            else:
+                self.lower[i] += 1
+
+    def _seek(self, t: float):
+        ts = self.ts
+        self.upper = bisect_left(ts, t)
+        for i, window in enumerate(self.windows):
+            self.lower[i] = bisect_left(ts, t - window, 0, self.upper)
+            if self.distinct is not None:
+                for key in self.keys[self.lower[i]:self.upper]:
+                    _count(self.distinct[i], key, 1)
+
+    def _advance(self, t: float):
+        ts, keys, distinct = self.ts, self.keys, self.distinct
+        n = len(ts)
+
+        while self.upper < n and ts[self.upper] < t:
+            if distinct is not None:
+                for counters in distinct:
+                    _count(counters, keys[self.upper], 1)
+            self.upper += 1
+
+        for i, window in enumerate(self.windows):
+            start = t - window
+            lower = self.lower[i]
+            while lower < self.upper and ts[lower] < start:
+                if distinct is not None:
+                    _count(distinct[i], keys[lower], -1)
+                lower += 1
+            self.lower[i] = lower
+
+    def _retreat(self, t: float):
+        ts, keys, distinct = self.ts, self.keys, self.distinct
+
+        # Primero se amplían las ventanas hacia atrás y después se recorta el final
+        for i, window in enumerate(self.windows):
+            start = t - window
+            lower = self.lower[i]
+            while lower > 0 and ts[lower - 1] >= start:
+                lower -= 1
+                if distinct is not None:
+                    _count(distinct[i], keys[lower], 1)
+            self.lower[i] = lower
+
+        while self.upper > 0 and ts[self.upper - 1] >= t:
+            self.upper -= 1
+            if distinct is not None:
+                for i, counters in enumerate(distinct):
+                    if self.lower[i] <= self.upper:
+                        _count(counters, keys[self.upper], -1)
+
+    def query(self, t: float):
+        """
+        Número de intentos en [t - ventana, t) por ventana y, si se guardan
+        claves, número de identidades distintas de cada tipo en cada ventana.
+        """
+        if self.last_t is None:
+            self._seek(t)
+        elif t >= self.last_t:
+            self._advance(t)
+        else:
+            self._retreat(t)
+        self.last_t = t
+
+        counts = [self.upper - lower for lower in self.lower]
+        distinct = (
+            [[len(counter) for counter in counters] for counters in self.distinct]
+            if self.distinct is not None else None
+        )
+        return counts, distinct
+
+    def prune(self, before: float):
+        """Elimina los intentos anteriores a `before` (los punteros se recolocan en la siguiente consulta)."""
+        n = bisect_left(self.ts, before)
+        if n:
+            del self.ts[:n]
+            if self.keys is not None:
+                del self.keys[:n]
+            self._reset()
+
+
+class AttemptsVelocity:
+    """
+    Agregados de intentos fallidos por ventana temporal e identidad.
+
+    Thread-safe: las altas y consultas se serializan con un lock.
+    """
+
+    def __init__(self, windows: Optional[Dict[str, int]] = None):
+        self.windows = dict(windows or WINDOWS)
+        self._window_secs = tuple(self.windows.values())
+        self._series: Dict[str, Dict[str, _Series]] = {kind: {} for kind in IDENTITY_KINDS}
+        self._lock = threading.Lock()
+        # Se incrementa con cada alta o poda (invalida la caché de resultados, ver score_cache)
+        self.version = 0
+
+    def _get_series(self, kind: str, identity: str) -> _Series:
+        series = self._series[kind].get(identity)
+        if series is None:
+            series = self._series[kind][identity] = _Series(self._window_secs, kind == 'ip_address')
+        return series
+
+    def add(self, dni, email, cell_phone, ip_address, created_at):
+        """Registra un intento fallido."""
+        t = _timestamp(created_at)
+        identities = self._identities(dni, email, cell_phone, ip_address)
+
+        with self._lock:
+            key = tuple(identities[kind] for kind in DISTINCT_KINDS)
+            for kind, identity in identities.items():
+                if identity:
+                    self._get_series(kind, identity).add(t, key)
+            self.version += 1
+
+    def add_frame(self, df: pd.DataFrame):
+        """
+        Registra en bloque los intentos de un DataFrame con columnas dni, email,
+        cell_phone, ip_address y created_at (p.ej. df_attempts de los artefactos).
+        """
+        ts = pd.to_datetime(df['created_at'], errors='coerce')
+        valid = ts.notna().to_numpy()
+        df = df.loc[valid]
+        if df.empty:
+            return
+        seconds = ts[valid].to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+
+        normalized = {
+            kind: df[kind].map(normalize).to_numpy(dtype=object) for kind, normalize in IDENTITY_NORMALIZERS.items()
+        }
+        # Tupla de identidades de DISTINCT_KINDS de cada intento (clave de las series de IP)
+        keys_by_row = np.empty(len(df), dtype=object)
+        keys_by_row[:] = list(zip(*(normalized[kind] for kind in DISTINCT_KINDS)))
+
+        with self._lock:
+            for kind, identities in normalized.items():
+                codes, uniques = pd.factorize(identities)
+
+                # Orden por (identidad, timestamp): cada identidad queda en un tramo contiguo
+                order = np.lexsort((seconds, codes))
+                sorted_codes = codes[order]
+                bounds = np.flatnonzero(np.diff(sorted_codes)) + 1
+                starts = np.concatenate(([0], bounds))
+                ends = np.concatenate((bounds, [len(order)]))
+
+                for start, end in zip(starts, ends):
+                    identity = uniques[sorted_codes[start]]
+                    if not identity:
+                        continue
+                    idx = order[start:end]
+                    series = self._get_series(kind, identity)
+                    keys = list(keys_by_row[idx]) if series.keys is not None else None
+                    if not series.ts:
+                        series.ts = array('d', seconds[idx].tobytes())
+                        if keys is not None:
+                            series.keys = keys
+                        series._reset()
+                    else:
+                        for i, t in enumerate(seconds[idx]):
+                            series.add(float(t), keys[i] if keys is not None else None)
+            self.version += 1
+
+    @staticmethod
+    def _identities(dni, email, cell_phone, ip_address) -> Dict[str, str]:
+        values = {'dni': dni, 'email': email, 'cell_phone': cell_phone, 'ip_address': ip_address}
+        return {kind: IDENTITY_NORMALIZERS[kind](value) for kind, value in values.items()}
+
+    def features(self, dni, email, cell_phone, ip_address, created_at) -> Dict[str, int]:
+        """
+        Calcula los agregados de intentos fallidos anteriores a `created_at`.
+
+        Es O(1) amortizado si las consultas de cada identidad llegan en orden de
+        `created_at`; una consulta anterior a la previa cuesta O(d) con d los
+        intentos entre ambas fechas (ver el docstring del módulo).
+
+        Returns
+        -------
+        dict
+            attempts_{dni,email,phone,ip}_{ventana} con el número de intentos en
+            cada ventana e ip_distinct_{dni,email,phone}_{ventana} con el número
+            de dnis, emails y teléfonos distintos (no vacíos) que han usado la IP
+            en cada ventana.
+        """
+        t = _timestamp(created_at)
+        identities = self._identities(dni, email, cell_phone, ip_address)
+        result: Dict[str, int] = {}
+
+        with self._lock:
+            for kind, prefix in IDENTITY_KINDS.items():
+                series = self._series[kind].get(identities[kind]) if identities[kind] else None
+                if series is None:
+                    counts = [0] * len(self.windows)
+                    distinct = [[0] * len(DISTINCT_KINDS)] * len(self.windows)
+                else:
+                    counts, distinct = series.query(t)
+
+                for name, count in zip(self.windows, counts):
+                    result[f'attempts_{prefix}_{name}'] = count
+                if kind == 'ip_address':
+                    for name, n_distinct in zip(self.windows, distinct):
+                        for distinct_kind, n in zip(DISTINCT_KINDS, n_distinct):
+                            result[f'ip_distinct_{IDENTITY_KINDS[distinct_kind]}_{name}'] = n
+
+        return result
+
+    def prune(self, now):
+        """Descarta los intentos más antiguos que la ventana más larga respecto a `now`."""
+        before = _timestamp(now) - max(self._window_secs)
+        with self._lock:
+            for series_by_identity in self._series.values():
+                for identity in list(series_by_identity):
+                    series = series_by_identity[identity]
+                    series.prune(before)
+                    if not series.ts:
+                        del series_by_identity[identity]
+            self.version += 1
+
+
+def load_attempts_velocity() -> AttemptsVelocity:
+    """Construye los agregados a partir de los intentos previos de los artefactos una sola vez."""
+    global _VELOCITY
+    if _VELOCITY is None:
+        velocity = AttemptsVelocity()
+        df_attempts = get_previous_attempts()
+        if df_attempts is not None:
+            velocity.add_frame(df_attempts)
+        _VELOCITY = velocity
+    return _VELOCITY
+
+
+def get_velocity_features(dni, email, cell_phone, ip_address, created_at) -> Dict[str, int]:
+    """Agregados de intentos fallidos por ventana (ver AttemptsVelocity.features)."""
+    return load_attempts_velocity().features(dni, email, cell_phone, ip_address, created_at)
+
+
+def record_attempt(dni, email, cell_phone, ip_address, created_at):
+    """Registra un nuevo intento fallido en los agregados en memoria."""
+    load_attempts_velocity().add(dni, email, cell_phone, ip_address, created_at)
+
+
+def velocity_enabled() -> bool:
+    """True si ATTEMPTS_VELOCITY=1: el pipeline calcula las features de velocidad."""
+    return os.environ.get("ATTEMPTS_VELOCITY", "0") == "1"
+
+
+def transform_batch(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Features de velocidad (VELOCITY_FEATURES) de un lote de solicitudes con las
+    columnas dni, email, cell_phone, ip_address y created_at.
+
+    Las solicitudes se consultan en orden de created_at para que cada consulta
+    solo avance los punteros (ver el requisito de orden del módulo); las
+    solicitudes sin fecha válida no tienen intentos anteriores (0).
+
+    Returns
+    -------
+    pandas.DataFrame
+        Una columna int64 por feature, con el índice de `df`.
+    """
+    velocity = load_attempts_velocity()
+    created_at = pd.to_datetime(df['created_at'], errors='coerce')
+    valid = np.flatnonzero(created_at.notna().to_numpy())
+    order = valid[np.argsort(created_at.to_numpy()[valid], kind='stable')]
+    names = velocity_feature_names(velocity.windows)
+
+    values = np.zeros((len(df), len(names)), dtype=np.int64)
+    columns = df[['dni', 'email', 'cell_phone', 'ip_address']].to_numpy(dtype=object)
+    for i in order:
+        features = velocity.features(*columns[i], created_at.iloc[i])
+        values[i] = [features[name] for name in names]
+
+    return pd.DataFrame(values, columns=list(names), index=df.index)
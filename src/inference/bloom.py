@@ -0,0 +1,125 @@
+"""
+Bloom filter
+Filtro de pertenencia aproximada sobre hashes de 64 bits (hash64): sin falsos
+negativos y con una tasa de falsos positivos acotada por `error_rate` mientras
+no se supere `capacity`. Las k posiciones de cada elemento se obtienen por doble
+hashing a partir de las dos mitades del hash.
+"""
+
+import math
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from inference.hashing import hash64
+
+_MASK32 = 0xFFFFFFFF
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+class BloomFilter:
+    """
+    Bloom filter de `n_bits` bits y `n_hashes` funciones hash.
+
+    Parameters
+    ----------
+    capacity : int
+        Número de elementos previstos.
+    error_rate : float, optional
+        Tasa de falsos positivos objetivo con `capacity` elementos.
+    source_stamp : str, optional
+        Huella de los datos con los que se construyó (se guarda con el filtro).
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01, source_stamp: Optional[str] = None):
+        capacity = max(1, int(capacity))
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.n_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+        self.bits = np.zeros((self.n_bits + 7) // 8, dtype=np.uint8)
+        self.count = 0
+        self.source_stamp = source_stamp
+
+    def _positions(self, h: int):
+        h &= _MASK64
+        h1, h2 = h & _MASK32, (h >> 32) | 1
+        return [(h1 + i * h2) % self.n_bits for i in range(self.n_hashes)]
+
+    def add_hash(self, h: int):
+        """Añade un elemento dado su hash64."""
+        for pos in self._positions(h):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def add_hashes(self, hashes: np.ndarray):
+        """Añade en bloque los elementos de un array de hash64 (int64)."""
+        u = np.asarray(hashes, dtype=np.int64).view(np.uint64)
+        h1 = u & np.uint64(_MASK32)
+        h2 = (u >> np.uint64(32)) | np.uint64(1)
+        i = np.arange(self.n_hashes, dtype=np.uint64)
+        pos = (h1[:, None] + i[None, :] * h2[:, None]) % np.uint64(self.n_bits)
+        np.bitwise_or.at(self.bits, (pos >> np.uint64(3)).astype(np.intp), (1 << (pos & np.uint64(7))).astype(np.uint8))
+        self.count += len(u)
+
+    def add(self, key: str):
+        self.add_hash(hash64(key))
+
+    def update(self, keys):
+        for key in keys:
+            self.add(key)
+
+    def contains_hash(self, h: int) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(h))
+
+    def __contains__(self, key: str) -> bool:
+        return self.contains_hash(hash64(key))
+
+    def __len__(self):
+        return self.count
+
+    def merge(self, other: "BloomFilter"):
+        """Une otro filtro con los mismos parámetros (OR de los bits)."""
+        if (other.n_bits, other.n_hashes) != (self.n_bits, self.n_hashes):
+            raise ValueError("Solo se pueden unir Bloom filters con el mismo tamaño y número de hashes")
+        np.bitwise_or(self.bits, other.bits, out=self.bits)
+        self.count += other.count
+
+    def save(self, path):
+        """Guarda el filtro en un fichero .npz (a través de un temporal único que se renombra)."""
+        path = Path(path)
+        fd, tmp_name = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp.npz", dir=path.parent)
+        os.close(fd)
+        tmp_path = Path(tmp_name)
+        try:
+            np.savez(
+                tmp_path,
+                bits=self.bits,
+                params=np.array([self.capacity, self.n_bits, self.n_hashes, self.count], dtype=np.int64),
+                error_rate=np.array(self.error_rate),
+                source_stamp=np.array(self.source_stamp or ""),
+            )
+            tmp_path.replace(path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    @classmethod
+    def load(cls, path) -> "BloomFilter":
+        """Carga un filtro guardado con save."""
+        with np.load(path) as data:
+            capacity, n_bits, n_hashes, count = (int(v) for v in data['params'])
+            bloom = cls.__new__(cls)
+            bloom.capacity = capacity
+            bloom.error_rate = float(data['error_rate'])
+            bloom.n_bits = n_bits
+            bloom.n_hashes = n_hashes
+            bloom.bits = data['bits'].copy()
+            bloom.count = count
+            # Los filtros guardados antes de registrar la huella no tienen source_stamp
+            bloom.source_stamp = (str(data['source_stamp']) if 'source_stamp' in data.files else "") or None
+        return bloom
@@ -0,0 +1,177 @@
+"""
+DAG executor
+Ejecuta un grafo de nodos (intermedios y features) en el que cada nodo declara
+sus entradas. Cada intermedio se calcula una sola vez por solicitud y, con
+run_batch, una sola vez por valor distinto de sus entradas dentro del lote.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+
+@dataclass(frozen=True)
+class Node:
+    # Nombre del intermedio o de la feature que produce el nodo
+    name: str
+    # Nombres de los nodos o columnas de la solicitud de los que depende
+    inputs: Tuple[str, ...]
+    # Función que recibe los valores de `inputs` (en orden) y devuelve el valor del nodo
+    fn: Callable[..., Any]
+    # Si es True, el resultado se reutiliza entre solicitudes del lote con las mismas entradas
+    shared: bool = False
+
+
+class FeatureGraph:
+    """
+    Grafo de dependencias entre intermedios y features.
+
+    Las entradas que no son nodos del grafo se leen directamente de la solicitud.
+    Un nodo puede declarar como entrada su propio nombre para leer la columna
+    homónima de la solicitud (p.ej. features que se copian tal cual).
+    """
+
+    def __init__(self, nodes: Iterable[Node]):
+        self.nodes: Dict[str, Node] = {}
+        for node in nodes:
+            if node.name in self.nodes:
+                raise ValueError(f"Nodo duplicado en el grafo: {node.name}")
+            self.nodes[node.name] = node
+        self._plans: Dict[Tuple[str, ...], List[List[Node]]] = {}
+        self._dependencies: Dict[Tuple[str, ...], FrozenSet[str]] = {}
+
+    def plan(self, outputs: Sequence[str]) -> List[List[Node]]:
+        """
+        Devuelve los nodos necesarios para calcular `outputs` agrupados por niveles:
+        los nodos de un mismo nivel solo dependen de niveles anteriores y pueden
+        ejecutarse en paralelo.
+        """
+        key = tuple(outputs)
+        if key in self._plans:
+            return self._plans[key]
+
+        depth: Dict[str, int] = {}
+        visiting = set()
+
+        def visit(name):
+            if name not in self.nodes:
+                return -1
+            if name in depth:
+                return depth[name]
+            if name in visiting:
+                raise ValueError(f"Ciclo en el grafo de features en el nodo {name}")
+            visiting.add(name)
+            deps = [dep for dep in self.nodes[name].inputs if dep != name]
+            depth[name] = 1 + max((visit(dep) for dep in deps), default=-1)
+            visiting.discard(name)
+            return depth[name]
+
+        for name in outputs:
+            if name not in self.nodes:
+                raise KeyError(f"Feature desconocida: {name}")
+            visit(name)
+
+        levels: List[List[Node]] = [[] for _ in range(max(depth.values(), default=-1) + 1)]
+        for name, level in depth.items():
+            levels[level].append(self.nodes[name])
+
+        self._plans[key] = levels
+        self._dependencies[key] = frozenset(
+            dep for level in levels for node in level for dep in node.inputs if dep != node.name
+        )
+        return levels
+
+    def _evaluate(self, node: Node, values: Dict[str, Any], application, shared_memo):
+        args = tuple(
+            values[dep] if dep != node.name and dep in values else application[dep]
+            for dep in node.inputs
+        )
+        if shared_memo is None or not node.shared:
+            return node.fn(*args)
+
+        memo = shared_memo.setdefault(node.name, {})
+        try:
+            return memo[args]
+        except KeyError:
+            result = memo[args] = node.fn(*args)
+            return result
+        except TypeError:
+            # Entradas no hashables: no se puede reutilizar el resultado
+            return node.fn(*args)
+
+    def run(
+        self,
+        application,
+        outputs: Sequence[str],
+        out=None,
+        index: Optional[Dict[str, int]] = None,
+        executor=None,
+        shared_memo: Optional[Dict[str, Dict]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Calcula `outputs` para una solicitud.
+
+        Parameters
+        ----------
+        application : dict
+            Diccionario columna -> valor con los datos de la solicitud.
+        outputs : sequence of str
+            Nombres de las features a calcular.
+        out : np.ndarray, optional
+            Si se indica, cada feature de `outputs` se escribe en out[index[feature]]
+            en cuanto se calcula, y solo se guardan en el diccionario devuelto los
+            nodos de los que depende otro nodo (intermedios).
+        index : dict, optional
+            Posición de cada feature en `out` (obligatorio si se indica `out`).
+        executor : concurrent.futures.Executor, optional
+            Si se indica, los nodos independientes de cada nivel se ejecutan en paralelo.
+        shared_memo : dict, optional
+            Memo de nodos `shared` compartido entre solicitudes (ver run_batch).
+
+        Returns
+        -------
+        dict
+            Valores de los nodos calculados: todos (intermedios y features) o,
+            con `out`, solo los intermedios.
+        """
+        values: Dict[str, Any] = {}
+        levels = self.plan(outputs)
+        if out is not None:
+            dependencies = self._dependencies[tuple(outputs)]
+
+        for level in levels:
+            if executor is not None and len(level) > 1:
+                results = list(executor.map(
+                    lambda node: self._evaluate(node, values, application, shared_memo), level
+                ))
+            else:
+                results = [self._evaluate(node, values, application, shared_memo) for node in level]
+
+            for node, result in zip(level, results):
+                if out is None:
+                    values[node.name] = result
+                    continue
+                if node.name in index:
+                    out[index[node.name]] = result
+                if node.name in dependencies:
+                    values[node.name] = result
+
+        return values
+
+    def run_batch(self, applications: Iterable, outputs: Sequence[str], executor=None) -> List[Dict[str, Any]]:
+        """
+        Calcula `outputs` para varias solicitudes reutilizando los nodos `shared`
+        entre solicitudes con las mismas entradas.
+
+        Returns
+        -------
+        list of dict
+            Un diccionario feature -> valor por solicitud.
+        """
+        shared_memo: Dict[str, Dict] = {}
+        return [
+            {name: values[name] for name in outputs}
+            for values in (
+                self.run(application, outputs, executor=executor, shared_memo=shared_memo)
+                for application in applications
+            )
+        ]
@@ -3,12 +3,21 @@ Email Similarity Transformer
 Calcula features de similitud de emails usando blocking con prefix/suffix.
 """
 
+import gzip
+import os
+import tempfile
+import threading
 import pandas as pd
 import numpy as np
 import Levenshtein as lv
-from typing import Dict, List
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
 import re
-from inference.artifacts import get_bad_emails_blocks
+from rapidfuzz import process
+from rapidfuzz.distance import Levenshtein as rf_levenshtein
+from inference.artifacts import _data_artifacts_dir, get_bad_emails_blocks
+from inference.qgram_index import QGramIndex
 
 K_PREFIX = 4
 K_SUFFIX = 4
@@ -27,6 +36,55 @@ pd.DataFrame({
 """
 
 
+# Separadores repetidos del local del email
+_SEPARATORS_RE = re.compile(r'[\._-]+')
+
+_GMAIL_DOMAINS = ("gmail.com", "googlemail.com")
+
+
+class EmailKey(NamedTuple):
+    email_norm: str
+    block_prefix: str
+    block_suffix: str
+
+
+_EMPTY_KEY = EmailKey("", "", "")
+
+
+@lru_cache(maxsize=65_536)
+def _normalize_and_key(email: str) -> EmailKey:
+    email = email.strip().lower()
+    local, domain = email.split('@', 1)
+
+    # Quitar +tag
+    local = local.split('+', 1)[0]
+
+    # Regla de puntos solo para Gmail/Googlemail
+    if domain in _GMAIL_DOMAINS:
+        local = local.replace('.', '')
+
+    # Colapsar separadores repetidos
+    local = _SEPARATORS_RE.sub('.', local)
+
+    return EmailKey(f"{local}@{domain}", f"{domain}|{local[:K_PREFIX]}", f"{domain}|{local[-K_SUFFIX:]}")
+
+
+def normalize_and_key(email) -> EmailKey:
+    """
+    Normaliza un email y calcula sus block keys en una sola pasada (con caché
+    para emails repetidos).
+
+    Returns
+    -------
+    EmailKey
+        (email_norm, block_prefix, block_suffix); todo "" si el email es inválido.
+        Equivale a _normalize_email, _block_key_prefix y _block_key_suffix.
+    """
+    if not isinstance(email, str) or '@' not in email:
+        return _EMPTY_KEY
+    return _normalize_and_key(email)
+
+
 def _normalize_email(email: str) -> str:
     """
     Normaliza un email para comparación.
@@ -36,23 +94,7 @@ def _normalize_email(email: str) -> str:
     - Elimina puntos en Gmail
     - Colapsa separadores repetidos
     """
-    if not isinstance(email, str) or '@' not in email:
-        return ""
-    
-    email = email.strip().lower()
-    local, domain = email.split('@', 1)
-    
-    # Quitar +tag
-    local = local.split('+', 1)[0]
-    
-    # Regla de puntos solo para Gmail/Googlemail
-    if domain in ("gmail.com", "googlemail.com"):
-        local = local.replace('.', '')
-    
-    # Colapsar separadores repetidos
-    local = re.sub(r'[\._-]+', '.', local)
-    
-    return f"{local}@{domain}"
+    return normalize_and_key(email).email_norm
 
 
 def _block_key_prefix(email_norm: str, k: int) -> str:
@@ -72,6 +114,202 @@ def _block_key_suffix(email_norm: str, k: int) -> str:
     return f"{domain}|{suffix}"
 
 
+class BadEmailIndex:
+    """
+    Índice en memoria de la lista negra de emails: block key (prefijo y sufijo)
+    -> emails normalizados del bloque.
+
+    Las altas y bajas se serializan con un lock y sustituyen la tupla del bloque
+    (copy-on-write), de forma que las consultas leen sin lock una versión
+    consistente de cada bloque. `version` se incrementa en cada cambio.
+
+    Opcionalmente mantiene además un QGramIndex sobre toda la lista (`qgram`)
+    para la distancia mínima global, sin depender de los bloques.
+    """
+
+    def __init__(self):
+        self.prefix_blocks: Dict[str, Tuple[str, ...]] = {}
+        self.suffix_blocks: Dict[str, Tuple[str, ...]] = {}
+        # email normalizado -> (block_prefix, block_suffix)
+        self._keys: Dict[str, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+        # Serializa los snapshots (save) sin bloquear las altas y bajas mientras se escribe
+        self._save_lock = threading.Lock()
+        self.version = 0
+        self.qgram: Optional[QGramIndex] = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "BadEmailIndex":
+        """Construye el índice desde el DataFrame de df_bad_emails.csv (email_norm, block_prefix, block_suffix)."""
+        index = cls()
+        with index._lock:
+            for email_norm, block_prefix, block_suffix in zip(df['email_norm'], df['block_prefix'], df['block_suffix']):
+                index._insert(email_norm, block_prefix, block_suffix)
+        return index
+
+    @classmethod
+    def from_emails(cls, emails_norm: Iterable[str]) -> "BadEmailIndex":
+        """Construye el índice desde emails ya normalizados (block keys calculadas)."""
+        index = cls()
+        with index._lock:
+            for email_norm in emails_norm:
+                index._insert(email_norm, _block_key_prefix(email_norm, K_PREFIX), _block_key_suffix(email_norm, K_SUFFIX))
+        return index
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, email_norm: str) -> bool:
+        return email_norm in self._keys
+
+    def build_qgram_index(self) -> QGramIndex:
+        """Construye el índice de q-gramas sobre los emails actuales (altas y bajas posteriores se propagan)."""
+        with self._lock:
+            self.qgram = QGramIndex(self._keys)
+        return self.qgram
+
+    def _insert(self, email_norm: str, block_prefix: str, block_suffix: str) -> bool:
+        if email_norm in self._keys:
+            return False
+        self._keys[email_norm] = (block_prefix, block_suffix)
+        self.prefix_blocks[block_prefix] = self.prefix_blocks.get(block_prefix, ()) + (email_norm,)
+        self.suffix_blocks[block_suffix] = self.suffix_blocks.get(block_suffix, ()) + (email_norm,)
+        return True
+
+    @staticmethod
+    def _discard(blocks: Dict[str, Tuple[str, ...]], key: str, email_norm: str):
+        remaining = tuple(email for email in blocks.get(key, ()) if email != email_norm)
+        if remaining:
+            blocks[key] = remaining
+        else:
+            blocks.pop(key, None)
+
+    def add(self, emails: Iterable[str]) -> int:
+        """
+        Añade emails a la lista negra (se normalizan con _normalize_email).
+
+        Returns
+        -------
+        int
+            Número de emails nuevos añadidos (los inválidos o ya presentes se ignoran).
+        """
+        added = []
+        with self._lock:
+            for email in emails:
+                key = normalize_and_key(email)
+                if key.email_norm and self._insert(*key):
+                    added.append(key.email_norm)
+            if added:
+                if self.qgram is not None:
+                    self.qgram.add(added)
+                self.version += 1
+        return len(added)
+
+    def remove(self, emails: Iterable[str]) -> int:
+        """
+        Elimina emails de la lista negra, buscándolos normalizados con
+        _normalize_email o tal cual (en minúsculas) si así se cargaron.
+
+        Returns
+        -------
+        int
+            Número de emails eliminados.
+        """
+        removed = []
+        with self._lock:
+            for email in emails:
+                if not isinstance(email, str):
+                    continue
+                for candidate in (_normalize_email(email), email.strip().lower()):
+                    keys = self._keys.pop(candidate, None)
+                    if keys is not None:
+                        self._discard(self.prefix_blocks, keys[0], candidate)
+                        self._discard(self.suffix_blocks, keys[1], candidate)
+                        removed.append(candidate)
+                        break
+            if removed:
+                if self.qgram is not None:
+                    self.qgram.remove(removed)
+                self.version += 1
+        return len(removed)
+
+    def save(self, path):
+        """
+        Guarda un snapshot compacto: un email normalizado por línea, comprimido
+        con gzip (las block keys se recalculan al cargarlo).
+
+        Se escribe en un fichero temporal único del mismo directorio que se
+        renombra al terminar; los snapshots concurrentes se serializan, de forma
+        que el último en terminar es el más reciente.
+        """
+        path = Path(path)
+        with self._save_lock:
+            with self._lock:
+                emails_norm = list(self._keys)
+            fd, tmp_name = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp", dir=path.parent)
+            tmp_path = Path(tmp_name)
+            try:
+                with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+                    f.writelines(email_norm + "\n" for email_norm in emails_norm)
+                tmp_path.replace(path)
+            except BaseException:
+                tmp_path.unlink(missing_ok=True)
+                raise
+
+    @classmethod
+    def load(cls, path) -> "BadEmailIndex":
+        """Carga un snapshot guardado con save."""
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return cls.from_emails(line.rstrip("\n") for line in f if line.strip())
+
+
+_BAD_EMAIL_INDEX: Optional[BadEmailIndex] = None
+
+
+def bad_emails_snapshot_path() -> Path:
+    """Ruta del snapshot de la lista negra (BAD_EMAILS_SNAPSHOT o bad_emails.txt.gz en el directorio de datos)."""
+    return Path(os.environ.get("BAD_EMAILS_SNAPSHOT", _data_artifacts_dir() / "bad_emails.txt.gz"))
+
+
+def global_index_enabled() -> bool:
+    """True si EMAIL_GLOBAL_INDEX=1: se calcula email_min_lev_global con un QGramIndex."""
+    return os.environ.get("EMAIL_GLOBAL_INDEX", "0") == "1"
+
+
+def load_bad_email_index() -> BadEmailIndex:
+    """
+    Carga el índice de bad emails una sola vez: desde el snapshot si existe y,
+    si no, desde df_bad_emails.csv de los artefactos. Con EMAIL_GLOBAL_INDEX=1
+    construye también su índice de q-gramas.
+    """
+    global _BAD_EMAIL_INDEX
+    if _BAD_EMAIL_INDEX is None:
+        path = bad_emails_snapshot_path()
+        if path.exists():
+            index = BadEmailIndex.load(path)
+        else:
+            index = BadEmailIndex.from_frame(get_bad_emails_blocks())
+        if global_index_enabled():
+            index.build_qgram_index()
+        _BAD_EMAIL_INDEX = index
+    return _BAD_EMAIL_INDEX
+
+
+def add_bad_emails(emails) -> int:
+    """Añade emails a la lista negra en memoria (ver BadEmailIndex.add)."""
+    return load_bad_email_index().add(emails)
+
+
+def remove_bad_emails(emails) -> int:
+    """Elimina emails de la lista negra en memoria (ver BadEmailIndex.remove)."""
+    return load_bad_email_index().remove(emails)
+
+
+def save_bad_emails_snapshot(path=None):
+    """Persiste la lista negra en memoria en el snapshot."""
+    load_bad_email_index().save(path or bad_emails_snapshot_path())
+
+
 def transform_single( email: str):
     """
     Calcula features de similitud para UN email.
@@ -86,22 +324,56 @@ def transform_single( email: str):
     dict
         Diccionario con features calculadas
     """
-    # Normalizar email
-    email_norm = _normalize_email(email)
+    return transform_keyed(normalize_and_key(email))
 
-    # Cargamos los datos de los bad emails
-    df_bad_emails_block = get_bad_emails_blocks()
-    
+
+def transform_normalized(email_norm: str):
+    """
+    Calcula features de similitud para UN email ya normalizado con _normalize_email.
+
+    Parameters
+    ----------
+    email_norm : str
+        Email normalizado ("" si el email es inválido)
+
+    Returns
+    -------
+    dict
+        Diccionario con features calculadas
+    """
     if not email_norm:
         return _default_features()
+    return transform_keyed(EmailKey(
+        email_norm, _block_key_prefix(email_norm, K_PREFIX), _block_key_suffix(email_norm, K_SUFFIX),
+    ))
+
+
+def transform_keyed(key: EmailKey):
+    """
+    Calcula features de similitud para UN email ya normalizado con sus block
+    keys (resultado de normalize_and_key).
+
+    Parameters
+    ----------
+    key : EmailKey
+        (email_norm, block_prefix, block_suffix)
+
+    Returns
+    -------
+    dict
+        Diccionario con features calculadas (más email_min_lev_global si el
+        índice de bad emails tiene QGramIndex)
+    """
+    # Cargamos el índice de bad emails
+    bad_emails = load_bad_email_index()
     
-    # Calcular blocks del email
-    block_prefix = _block_key_prefix(email_norm, K_PREFIX)
-    block_suffix = _block_key_suffix(email_norm, K_SUFFIX)
+    email_norm, block_prefix, block_suffix = key
+    if not email_norm:
+        return _default_features(bad_emails.qgram is not None)
     
     # Obtener emails en el mismo block
-    emails_in_prefix_block = df_bad_emails_block.loc[df_bad_emails_block['block_prefix'] == block_prefix, 'email_norm'].to_list()
-    emails_in_suffix_block = df_bad_emails_block.loc[df_bad_emails_block['block_suffix'] == block_suffix, 'email_norm'].to_list()
+    emails_in_prefix_block = bad_emails.prefix_blocks.get(block_prefix, ())
+    emails_in_suffix_block = bad_emails.suffix_blocks.get(block_suffix, ())
     
     # Calcular features PREFIX
     features_prefix = _calculate_block_features(email_norm, emails_in_prefix_block)
@@ -109,7 +381,7 @@ def transform_single( email: str):
     # Calcular features SUFFIX
     features_suffix = _calculate_block_features(email_norm, emails_in_suffix_block)
     
-    return {
+    features = {
         'email_min_lev_block_prefix': features_prefix['min_dist'],
         'email_cnt_lev_le_1_block_prefix': features_prefix['cnt_le_1'],
         'email_block_size_prefix': features_prefix['block_size'],
@@ -117,8 +389,17 @@ def transform_single( email: str):
         'email_cnt_lev_le_1_block_suffix': features_suffix['cnt_le_1'],
         'email_block_size_suffix': features_suffix['block_size'],
     }
+    if bad_emails.qgram is not None:
+        features['email_min_lev_global'] = _global_min_dist(bad_emails.qgram, email_norm)
+    return features
 
-def _calculate_block_features( email_norm: str, block_emails: List[str]) -> Dict[str, int]:
+
+def _global_min_dist(qgram: QGramIndex, email_norm: str) -> int:
+    """Distancia mínima a toda la lista negra (hasta qgram.max_dist; 99 si no hay ninguno a esa distancia)."""
+    dist = qgram.min_distance(email_norm)
+    return 99 if dist is None else dist
+
+def _calculate_block_features( email_norm: str, block_emails: Tuple[str, ...]) -> Dict[str, int]:
     """
     Calcula features de similitud dentro de un bloque.
     
@@ -126,8 +407,8 @@ def _calculate_block_features( email_norm: str, block_emails: List[str]) -> Dict
     ----------
     email_norm : str
         Email normalizado a evaluar
-    block_emails : list
-        Lista de emails en el mismo bloque
+    block_emails : tuple
+        Emails en el mismo bloque
         
     Returns
     -------
@@ -158,9 +439,9 @@ def _calculate_block_features( email_norm: str, block_emails: List[str]) -> Dict
         'block_size': len(block_emails)
     }
 
-def _default_features() -> Dict[str, float]:
+def _default_features(global_index: bool = False) -> Dict[str, float]:
     """Retorna features por defecto cuando el email es inválido."""
-    return {
+    features = {
         'email_min_lev_block_prefix': 99,
         'email_cnt_lev_le_1_block_prefix': 0,
         'email_block_size_prefix': 0,
@@ -168,6 +449,9 @@ def _default_features() -> Dict[str, float]:
         'email_cnt_lev_le_1_block_suffix': 0,
         'email_block_size_suffix': 0,
     }
+    if global_index:
+        features['email_min_lev_global'] = 99
+    return features
 
 def transform(emails: pd.Series) -> pd.DataFrame:
     """
@@ -183,10 +467,111 @@ def transform(emails: pd.Series) -> pd.DataFrame:
     pd.DataFrame
         DataFrame con features de similitud
     """
-    results = []
-    
-    for email in emails:
-        features = transform_single(email)
-        results.append(features)
-    
-    return pd.DataFrame(results)
\ No newline at end of file
+    return transform_batch(emails).reset_index(drop=True)
+
+
+_FEATURE_NAMES = tuple(_default_features())
+
+
+def _split_normalized(emails: pd.Series):
+    """
+    Versión vectorizada de _normalize_email que devuelve (local, dominio)
+    normalizados; los emails inválidos quedan con local y dominio nulos.
+    """
+    valid = emails.map(lambda email: isinstance(email, str) and '@' in email).astype(bool)
+    parts = emails[valid].astype(object).str.strip().str.lower().str.split('@', n=1)
+    local = parts.str[0].str.split('+', n=1).str[0]
+    domain = parts.str[1]
+
+    gmail = domain.isin(_GMAIL_DOMAINS)
+    local = local.where(~gmail, local.str.replace('.', '', regex=False))
+    local = local.str.replace(_SEPARATORS_RE, '.', regex=True)
+    return local.reindex(emails.index), domain.reindex(emails.index)
+
+
+def normalize_and_key_batch(emails) -> pd.DataFrame:
+    """
+    Versión por lotes de normalize_and_key con los métodos .str de pandas.
+
+    Returns
+    -------
+    pd.DataFrame
+        Columnas email_norm, block_prefix y block_suffix ("" para los emails
+        inválidos), con el índice de `emails` si es una Series.
+    """
+    emails = pd.Series(emails, dtype=object)
+    local, domain = _split_normalized(emails)
+    return pd.DataFrame({
+        'email_norm': local + '@' + domain,
+        'block_prefix': domain + '|' + local.str[:K_PREFIX],
+        'block_suffix': domain + '|' + local.str[-K_SUFFIX:],
+    }, index=emails.index, columns=list(EmailKey._fields)).fillna("")
+
+
+def _block_features_batch(emails_norm: np.ndarray, block_keys: np.ndarray, blocks: Dict[str, Tuple[str, ...]],
+                          workers: int) -> np.ndarray:
+    """
+    Features (min_dist, cnt_le_1, block_size) de cada email contra su bloque:
+    una matriz de distancias de Levenshtein (process.cdist) por bloque distinto.
+    """
+    result = np.empty((len(emails_norm), 3), dtype=np.int64)
+    result[:] = (99, 0, 0)
+
+    for key, rows in pd.Series(np.arange(len(block_keys))).groupby(block_keys, sort=True).indices.items():
+        block_emails = blocks.get(key)
+        if not block_emails:
+            continue
+        dist = process.cdist(
+            emails_norm[rows], block_emails, scorer=rf_levenshtein.distance, dtype=np.int32, workers=workers,
+        )
+        result[rows, 0] = dist.min(axis=1)
+        result[rows, 1] = (dist <= 1).sum(axis=1)
+        result[rows, 2] = len(block_emails)
+    return result
+
+
+def transform_batch(emails, workers: int = -1) -> pd.DataFrame:
+    """
+    Versión por lotes de transform: normaliza todos los emails de forma
+    vectorizada, agrupa los emails distintos por bloque (prefijo y sufijo) y
+    calcula las distancias contra cada bloque de bad emails con una sola
+    matriz de distancias por bloque.
+
+    Parameters
+    ----------
+    emails : array-like of str
+        Emails a transformar.
+    workers : int, optional
+        Hilos de process.cdist (-1: todos los cores).
+
+    Returns
+    -------
+    pd.DataFrame
+        Mismas columnas que transform_single, con el índice de `emails` si es una Series.
+    """
+    index = emails.index if isinstance(emails, pd.Series) else None
+    codes, uniques = pd.factorize(pd.Series(emails, dtype=object), use_na_sentinel=False)
+
+    keys = normalize_and_key_batch(uniques)
+    valid = (keys['email_norm'] != "").to_numpy()
+    keys = keys[valid]
+    emails_norm = keys['email_norm'].to_numpy(dtype=object)
+
+    features = np.tile(np.array([99, 0, 0, 99, 0, 0], dtype=np.int64), (len(uniques), 1))
+
+    bad_emails = load_bad_email_index()
+    if len(emails_norm):
+        for offset, blocks, block_keys in (
+            (0, bad_emails.prefix_blocks, keys['block_prefix']),
+            (3, bad_emails.suffix_blocks, keys['block_suffix']),
+        ):
+            features[valid, offset:offset + 3] = _block_features_batch(
+                emails_norm, block_keys.to_numpy(dtype=object), blocks, workers,
+            )
+
+    result = pd.DataFrame(features[codes], columns=list(_FEATURE_NAMES), index=index)
+    if bad_emails.qgram is not None:
+        global_dist = np.full(len(uniques), 99, dtype=np.int64)
+        global_dist[valid] = [_global_min_dist(bad_emails.qgram, email_norm) for email_norm in emails_norm]
+        result['email_min_lev_global'] = global_dist[codes]
+    return result
\ No newline at end of file
@@ -0,0 +1,89 @@
+"""
+Feature assembler
+Escribe las features de una solicitud (o de un lote) directamente en un vector
+float32 preasignado en el orden de FEATURE_SCHEMA, listo para el modelo final.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+from inference.feature_graph import get_feature_graph
+from inference.feature_schema import FEATURE_INDEX, FEATURE_SCHEMA, N_FEATURES
+from inference.pipeline import check_columns, iter_stage_features
+
+
+class FeatureAssembler:
+    """
+    Construye el vector de entrada del modelo final para una solicitud.
+
+    Las features se calculan con el grafo de features (cada intermedio una sola vez) y
+    cada una se escribe en su posición de FEATURE_SCHEMA dentro de un vector
+    float32 preasignado, que se reutiliza entre llamadas, en cuanto se calcula.
+    Solo se guardan aparte los intermedios que comparten varias features (firma
+    del User Agent, registro de la IP, ...). Una instancia no es thread-safe:
+    usar una por hilo.
+    """
+
+    def __init__(self):
+        self.row = np.full(N_FEATURES, np.nan, dtype=np.float32)
+
+    def assemble(self, application, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Calcula las features de una solicitud en orden de FEATURE_SCHEMA.
+
+        Parameters
+        ----------
+        application : dict
+            Diccionario columna -> valor con los datos de la solicitud.
+        out : np.ndarray, optional
+            Vector float32 de longitud N_FEATURES donde escribir. Por defecto se
+            reutiliza `self.row` (copiarlo si se necesita conservar).
+
+        Returns
+        -------
+        np.ndarray
+            Vector de features (`out`).
+        """
+        if out is None:
+            out = self.row
+
+        get_feature_graph().run(application, FEATURE_SCHEMA, out=out, index=FEATURE_INDEX)
+        return out
+
+
+def assemble_batch(df, out: Optional[np.ndarray] = None, timings=None) -> np.ndarray:
+    """
+    Calcula la matriz N x F de features de un lote con el pipeline por lotes.
+
+    Las columnas de cada etapa se escriben directamente en su columna de `out`
+    según FEATURE_INDEX, sin construir el DataFrame completo de transform_batch;
+    solo se reservan los DataFrames de features de cada etapa.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Solicitudes, una por fila.
+    out : np.ndarray, optional
+        Matriz float32 (len(df), N_FEATURES) preasignada donde escribir.
+    timings : dict, optional
+        Tiempos por etapa (ver transform_batch).
+
+    Returns
+    -------
+    np.ndarray
+        Matriz de features en orden de FEATURE_SCHEMA.
+    """
+    if out is None:
+        out = np.empty((len(df), N_FEATURES), dtype=np.float32)
+    elif out.shape != (len(df), N_FEATURES):
+        raise ValueError(f"`out` debe tener forma {(len(df), N_FEATURES)}, no {out.shape}")
+
+    check_columns(df)
+    for features in iter_stage_features(df, timings=timings):
+        for name in features.columns:
+            j = FEATURE_INDEX.get(name)
+            if j is not None:
+                out[:, j] = features[name].to_numpy(dtype=np.float32, na_value=np.nan)
+
+    return out
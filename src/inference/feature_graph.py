@@ -0,0 +1,193 @@
+"""
+Feature graph
+Declaración de las features del modelo y de los intermedios que comparten
+(firma del User Agent, registro de la IP, created_at como Timestamp, email
+normalizado, intentos previos, ...) como nodos de un FeatureGraph.
+"""
+
+import numpy as np
+import pandas as pd
+
+from inference.artifacts import get_shrinkage
+from inference.binning import get_tramo_comercial, get_tramo_professional_network_tool
+from inference.card_var_transformer import get_bizzum_vars, get_fastloan_vars
+from inference.dag import FeatureGraph, Node
+from inference.emailsimilarity_transformer import normalize_and_key, transform_keyed
+from inference.feature_transformers import (
+    bank_name_shrinkage,
+    tramo_amount_2_shrinkage,
+    tramo_days_shrinkage,
+    promo_code,
+    ip_asn_org_flag_shrinkage,
+    tramo_num_attempts,
+    tramo_days_last_attempt,
+    last_attempt_prob_xgb_flag,
+    req_ip_bin,
+    same_name_phone_database,
+    tramo_n_categorias_distintas,
+    tramo_fastloans_n_entidades_distintas,
+)
+from inference.geo_consistency_score import calculate_geo_consistency_score
+from inference.ip_info import get_ip_record
+from inference.previous_attempts_transformer import transform
+from inference.temporal_transformer import get_temporal_vars_fast
+from inference.trustfull_platform_transformer import get_digital_score_weights, load_digital_score_data
+from inference.ua_signature import get_ua_signature
+
+
+def _value(value):
+    """Valor crudo como float (None/NaN -> NaN)."""
+    return np.nan if value is None or pd.isna(value) else value
+
+
+def _digital_score(weights):
+    def fn(*values):
+        # Misma suma ponderada que calculate_digital_score (los nulos no suman)
+        score = 0.0
+        for value, weight in zip(values, weights):
+            if not pd.isna(value):
+                score += value * weight
+        return score
+    return fn
+
+
+def _platforms_shrinkage(feature, tramo_fn):
+    def fn(*values):
+        return get_shrinkage(feature, tramo_fn(sum(int(v) for v in values)), default=1.0)
+    return fn
+
+
+def _whatsapp_privacy_status(status):
+    if status == 'private':
+        return 1
+    if status == 'public':
+        return 0
+    return np.nan
+
+
+def _fastloans(fastloans_n_meses_activo, fastloans_n_entidades_distintas, n_meses_actividad, created_at, amount):
+    # Denominadores como float de NumPy: la división por cero da inf igual que en el camino por lotes
+    return get_fastloan_vars(
+        fastloans_n_meses_activo,
+        fastloans_n_entidades_distintas,
+        np.float64(n_meses_actividad),
+        created_at,
+        np.float64(amount),
+    )
+
+
+def _bizzum(n_bizzums, n_categorias_distintas, gambling_por_mes, total_transacciones, n_meses_actividad, salary_existe):
+    return get_bizzum_vars(
+        np.float64(n_bizzums),
+        n_categorias_distintas,
+        gambling_por_mes,
+        np.float64(total_transacciones),
+        n_meses_actividad,
+        salary_existe,
+    )
+
+
+def _pick(key):
+    """Nodo que extrae `key` (clave o posición) de un intermedio compuesto."""
+    return lambda value: value[key]
+
+
+_RAW_FEATURES = (
+    'breaches_count_email', 'phone_has_twitter', 'phone_first_seen_days',
+    'email_first_seen_days', 'phone_has_telegram', 'transacciones_por_mes', 'n_chargebacks',
+)
+
+_EMAIL_FEATURES = (
+    'email_min_lev_block_prefix', 'email_cnt_lev_le_1_block_prefix', 'email_block_size_prefix',
+    'email_min_lev_block_suffix', 'email_cnt_lev_le_1_block_suffix', 'email_block_size_suffix',
+)
+
+_FEATURE_GRAPH = None
+
+
+def _build_graph() -> FeatureGraph:
+    # Las columnas de los nodos de Trustfull y sus pesos salen de los datos del digital score
+    digi = load_digital_score_data()
+    weights = get_digital_score_weights()
+
+    intermediates = [
+        Node('created_at_ts', ('created_at',), pd.to_datetime),
+        Node('ua_signature', ('device_info',), get_ua_signature, shared=True),
+        Node('ip_record', ('ip_address',), get_ip_record, shared=True),
+        Node('email_key', ('email',), normalize_and_key),
+        Node('attempts', ('dni', 'email', 'cell_phone', 'ip_address', 'created_at_ts'), transform),
+        Node('temporal', ('created_at_ts',), get_temporal_vars_fast),
+        Node('email_similarity', ('email_key',), transform_keyed, shared=True),
+        Node('fastloans', (
+            'fastloans_n_meses_activo', 'fastloans_n_entidades_distintas',
+            'n_meses_actividad', 'created_at_ts', 'amount',
+        ), _fastloans),
+        Node('bizzum', (
+            'n_bizzums', 'n_categorias_distintas', 'gambling_por_mes',
+            'total_transacciones', 'n_meses_actividad', 'salary_existe',
+        ), _bizzum),
+    ]
+
+    features = [
+        # Solicitud
+        Node('bank_name_shrinkage', ('bank_name',), bank_name_shrinkage, shared=True),
+        Node('tramo_amount_2_shrinkage', ('amount',), tramo_amount_2_shrinkage),
+        Node('tramo_days_shrinkage', ('days',), tramo_days_shrinkage),
+        Node('promo_code', ('promo_code_id',), promo_code),
+        Node('ip_asn_flag_shrinkage', ('ip_record',), lambda record: ip_asn_org_flag_shrinkage(record.asn_org)),
+
+        # Intentos previos
+        Node('tramo_num_attempts_shrinkage', ('attempts',), lambda a: tramo_num_attempts(a['num_attempts'])),
+        Node('tramo_days_last_attempt_shrinkage', ('attempts',), lambda a: tramo_days_last_attempt(a['diff_days_last_attemtp'])),
+        Node('req_ip_bin_shrinkage', ('attempts',), lambda a: req_ip_bin(a['req_ip'])),
+        Node('last_attempt_flag_xgb_10_shrinkage', ('attempts',), lambda a: last_attempt_prob_xgb_flag(
+            a['last_attempt'], 1 if a['num_attempts'] > 0 else 0
+        )),
+
+        # Temporales
+        Node('hour_loan_flag_shrinkage', ('temporal',), _pick('hour_loan_flag_shrinkage')),
+        Node('day_week_flag_shrinkage', ('temporal',), _pick('day_week_flag_shrinkage')),
+        Node('day_hour_loan_flag_shrinkage', ('temporal',), _pick('day_hour_loan_flag_shrinkage')),
+
+        # Dispositivo y geolocalización
+        Node('device_browser_ver_flag_shrinkage', ('ua_signature',), lambda signature: signature.device_browser_ver_flag_shrinkage),
+        Node('geo_consistency_score', ('city', 'ip_record'), lambda city, record: calculate_geo_consistency_score(
+            city, record.lat, record.lon
+        ), shared=True),
+
+        # Trustfull
+        Node('digital_presence_score', tuple(weights.keys()), _digital_score(tuple(weights.values()))),
+        Node('tramo_platforms_comercial_shrinkage', tuple(digi.lst_cols_comercial), _platforms_shrinkage(
+            "tramo_platforms_comercial", get_tramo_comercial
+        )),
+        Node('tramo_platforms_network_tools_shrinkage', tuple(digi.lst_cols_network_tools), _platforms_shrinkage(
+            "tramo_platforms_network_tools", get_tramo_professional_network_tool
+        )),
+        Node('email_has_image', ('email_image_source',), lambda source: 0 if pd.isna(source) else 1),
+        Node('whatsapp_privacy_status', ('whatsapp_privacy_status',), _whatsapp_privacy_status),
+        Node('same_name_phone_database', ('phone_first_name', 'first_name'), same_name_phone_database),
+
+        # Tarjeta
+        Node('tramo_n_categorias_distintas_shrinkage', ('n_categorias_distintas',), tramo_n_categorias_distintas),
+        Node('tramo_fastloans_n_entidades_distintas_shrinkage', ('fastloans_n_entidades_distintas',),
+             tramo_fastloans_n_entidades_distintas),
+        Node('fl_min_diff_hours', ('fastloans',), _pick(0)),
+        Node('amount_vs_fl_conc_7d', ('fastloans',), _pick(1)),
+        Node('ratio_fl_concentration', ('fastloans',), _pick(2)),
+        Node('bizzum_ratio', ('bizzum',), _pick(0)),
+        Node('bizzum_intensity_velocity', ('bizzum',), _pick(1)),
+        Node('mule_purity_check', ('bizzum',), _pick(2)),
+        Node('bizzum_no_salary_risk', ('bizzum',), _pick(3)),
+    ]
+    features += [Node(name, (name,), _value) for name in _RAW_FEATURES]
+    features += [Node(name, ('email_similarity',), _pick(name)) for name in _EMAIL_FEATURES]
+
+    return FeatureGraph(intermediates + features)
+
+
+def get_feature_graph() -> FeatureGraph:
+    """Grafo de features del modelo, construido la primera vez que se pide."""
+    global _FEATURE_GRAPH
+    if _FEATURE_GRAPH is None:
+        _FEATURE_GRAPH = _build_graph()
+    return _FEATURE_GRAPH
@@ -0,0 +1,73 @@
+"""
+Feature schema
+Lista y orden de las features de entrada del modelo final de fraude
+(lst_final_vars de add_users_model.ipynb).
+"""
+
+from typing import Dict, Tuple
+
+from inference.attempts_velocity import VELOCITY_FEATURES
+
+FEATURE_SCHEMA: Tuple[str, ...] = (
+    # Solicitud
+    'bank_name_shrinkage',
+    'tramo_amount_2_shrinkage',
+    'tramo_days_shrinkage',
+    'promo_code',
+    'ip_asn_flag_shrinkage',
+    'tramo_num_attempts_shrinkage',
+    'tramo_days_last_attempt_shrinkage',
+    'req_ip_bin_shrinkage',
+    'last_attempt_flag_xgb_10_shrinkage',
+    'hour_loan_flag_shrinkage',
+    'day_week_flag_shrinkage',
+    'day_hour_loan_flag_shrinkage',
+    'device_browser_ver_flag_shrinkage',
+    'geo_consistency_score',
+
+    # Trustfull
+    'digital_presence_score',
+    'breaches_count_email',
+    'tramo_platforms_comercial_shrinkage',
+    'phone_has_twitter',
+    'email_has_image',
+    'whatsapp_privacy_status',
+    'same_name_phone_database',
+    'phone_first_seen_days',
+    'email_first_seen_days',
+    'phone_has_telegram',
+    'tramo_platforms_network_tools_shrinkage',
+
+    # Similitud email
+    'email_min_lev_block_prefix',
+    'email_cnt_lev_le_1_block_prefix',
+    'email_block_size_prefix',
+    'email_min_lev_block_suffix',
+    'email_cnt_lev_le_1_block_suffix',
+    'email_block_size_suffix',
+
+    # Variables de tarjeta
+    'transacciones_por_mes',
+    'tramo_n_categorias_distintas_shrinkage',
+    'n_chargebacks',
+    'tramo_fastloans_n_entidades_distintas_shrinkage',
+    'fl_min_diff_hours',
+    'amount_vs_fl_conc_7d',
+    'ratio_fl_concentration',
+    'bizzum_ratio',
+    'bizzum_intensity_velocity',
+    'mule_purity_check',
+    'bizzum_no_salary_risk',
+)
+
+# Posición de cada feature en el vector de entrada del modelo
+FEATURE_INDEX: Dict[str, int] = {name: i for i, name in enumerate(FEATURE_SCHEMA)}
+
+N_FEATURES = len(FEATURE_SCHEMA)
+
+# Features opcionales que no entran en el modelo: el pipeline las añade tras
+# FEATURE_SCHEMA cuando se calculan (email_min_lev_global con EMAIL_GLOBAL_INDEX=1
+# y las de velocidad de intentos con ATTEMPTS_VELOCITY=1)
+EXTRA_FEATURES: Tuple[str, ...] = (
+    'email_min_lev_global',
+) + VELOCITY_FEATURES
@@ -1,15 +1,17 @@
 from numba.core.ir import Var
 import pandas as pd
 import numpy as np
-from inference.artifacts import get_shrinkage, get_var_flag, get_last_attempt_shrinkage
+from inference.artifacts import get_shrinkage, get_var_flag, get_last_attempt_shrinkage, get_ip_flag_table
 from inference.binning import *
 from inference.user_agent_parser import parse_user_agent
-from inference.ip_info import get_asn_org, get_city, get_lat, get_lon
+from inference.ip_info import get_asn_org, get_city, get_lat, get_lon, get_ip_record
 
 from inference.trustfull_platform_transformer import calculate_num_prof_net_tools, calculate_digital_score, calculate_num_com, masked_email_match, match_2_last_numbers
 from inference.previous_attempts_transformer import transform
 from inference.emailsimilarity_transformer import transform_single
-from inference.geo_consistency_score import calculate_geo_consistency_score
+from inference.geo_consistency_score import (
+    calculate_geo_consistency_score, calculate_geo_consistency_score_batch, nearest_city_distance, ip_near_declared_city,
+)
 from inference.card_var_transformer import get_fastloan_vars, get_bizzum_vars
 from inference.bank_name_normalizer import normalize_bank_name
 
@@ -54,7 +56,24 @@ def os_family_shrinkage(user_agent):
         Si la categoría no existe en los artefactos, se devuelve el valor por defecto (1.0).
     """
 
-    os_family = parse_user_agent(user_agent)["os_family"]
+    return os_family_shrinkage_from_parsed(parse_user_agent(user_agent))
+
+
+def os_family_shrinkage_from_parsed(dct_parsed):
+    """
+    Igual que os_family_shrinkage pero a partir del User Agent ya analizado.
+
+    Parameters
+    ----------
+    dct_parsed : dict
+        Resultado de parse_user_agent.
+
+    Returns
+    -------
+    float
+        Valor de shrinkage asociado a la familia del sistema operativo.
+    """
+    os_family = dct_parsed["os_family"]
     return get_shrinkage(
         "os_family",
         os_family,
@@ -126,9 +145,27 @@ def ip_asn_flag_shrinkage(ip):
         Valor de shrinkage asociado al flag de ASN.
         Si la categoría no existe en los artefactos, se devuelve el valor por defecto (1.0).`
     """
+    table = get_ip_flag_table()
+    if table is not None:
+        return table.lookup(ip)[0]
 
-    asn_org = get_asn_org(ip)
+    return ip_asn_org_flag_shrinkage(get_asn_org(ip))
 
+
+def ip_asn_org_flag_shrinkage(asn_org):
+    """
+    Igual que ip_asn_flag_shrinkage pero a partir de la organización ASN ya resuelta.
+
+    Parameters
+    ----------
+    asn_org : str
+        Organización ASN de la IP.
+
+    Returns
+    -------
+    float
+        Valor de shrinkage asociado al flag de ASN.
+    """
     ip_asn_flag = get_var_flag("ip_asn_org", asn_org, default="NORMAL")
 
     return get_shrinkage(
@@ -154,7 +191,27 @@ def ip_city_flag_shrinkage(ip):
         Si la categoría no existe en los artefactos, se devuelve el valor por defecto (1.0).
     """
 
-    city = get_city(ip)
+    table = get_ip_flag_table()
+    if table is not None:
+        return table.lookup(ip)[1]
+
+    return ip_city_name_flag_shrinkage(get_city(ip))
+
+
+def ip_city_name_flag_shrinkage(city):
+    """
+    Igual que ip_city_flag_shrinkage pero a partir de la ciudad (subdivisión) ya resuelta.
+
+    Parameters
+    ----------
+    city : str
+        Ciudad de la IP.
+
+    Returns
+    -------
+    float
+        Valor de shrinkage asociado al flag de ciudad.
+    """
     ip_city_flag = get_var_flag("ip_city", city, default="NORMAL")
 
     return get_shrinkage(
@@ -710,8 +767,23 @@ def device_browser_ver_flag(user_agent):
     dict
         Diccionario con las diferentes variables realacionadas con las variables temporales.
     """
-    dct_parsed = parse_user_agent(user_agent)
+    return device_browser_ver_flag_from_parsed(parse_user_agent(user_agent))
+
+
+def device_browser_ver_flag_from_parsed(dct_parsed):
+    """
+    Igual que device_browser_ver_flag pero a partir del User Agent ya analizado.
+
+    Parameters
+    ----------
+    dct_parsed : dict
+        Resultado de parse_user_agent.
 
+    Returns
+    -------
+    float
+        Valor de shrinkage asociado al flag de dispositivo, buscador y versión.
+    """
     device_browser_ver = dct_parsed['device'] + " " +  dct_parsed['browser_family'] + " " + dct_parsed['browser_version']
 
     device_browser_ver_flag = get_var_flag("device_browser_ver", device_browser_ver, default="NORMAL")
@@ -765,6 +837,72 @@ def get_geo_consistency_score(ip, city_name):
     return score
 
 
+def get_geo_consistency_score_batch(ips, city_names):
+    """
+    Versión por lotes de get_geo_consistency_score: consulta cada IP distinta una
+    sola vez y calcula todos los scores en una pasada vectorizada.
+
+    Parameters
+    ----------
+    ips : array-like of str
+        IPs desde las que se realizan las solicitudes.
+    city_names : array-like of str
+        Ciudades de residencia de los usuarios.
+
+    Returns
+    -------
+    np.ndarray
+        Score de consistencia geográfica de cada solicitud.
+    """
+    codes, uniques = pd.factorize(pd.Series(ips, dtype=object), use_na_sentinel=False)
+    records = [get_ip_record(ip) for ip in uniques]
+
+    # Coordenadas nulas de la IP -> NaN (el score queda NaN)
+    lat = np.array([np.nan if r.lat is None else r.lat for r in records], dtype=float)
+    lon = np.array([np.nan if r.lon is None else r.lon for r in records], dtype=float)
+
+    return calculate_geo_consistency_score_batch(city_names, lat[codes], lon[codes])
+
+
+def get_nearest_city_km(ip):
+    """
+    Distancia (km) desde la ubicación de la IP hasta la ciudad más cercana de geonames.
+
+    Parameters
+    ----------
+    ip : str
+        IP desde la que se realiza la solicitud.
+
+    Returns
+    -------
+    float
+        Distancia en km, o NaN si la IP no tiene coordenadas.
+    """
+    record = get_ip_record(ip)
+    return nearest_city_distance(record.lat, record.lon)
+
+
+def get_ip_near_city_flag(ip, city_name):
+    """
+    Flag que indica si la IP está cerca (NEAR_CITY_KM) de una ciudad que coincide
+    con la ciudad de residencia declarada.
+
+    Parameters
+    ----------
+    ip : str
+        IP desde la que se realiza la solicitud.
+    city_name : str
+        Ciudad de residencia del usuario.
+
+    Returns
+    -------
+    int
+        1 si la IP está cerca de la ciudad declarada; 0 en caso contrario.
+    """
+    record = get_ip_record(ip)
+    return ip_near_declared_city(city_name, record.lat, record.lon)
+
+
 def tramo_n_categorias_distintas(n_categorias):
     """
     Aplica el shrinkage correspondiente al tramo segun el número de categorias diferentes de movimientos de tarjeta.
@@ -927,14 +1065,14 @@ def same_name_phone_database(phone_first_name, db_first_name):
     Returns
     -------
     int
-        Devuelve 1 para cuando coinciden 0 para cuando no .
+        Devuelve 1 para cuando coinciden 0 para cuando no (o si falta alguno de los dos nombres).
     """
-    # Normalizamos los dos nombres
-    if isinstance(phone_first_name, str):
-        name1 = phone_first_name.strip().lower()
+    if not isinstance(phone_first_name, str) or not isinstance(db_first_name, str):
+        return 0
 
-    if isinstance(db_first_name, str):
-        name2 = db_first_name.strip().lower()
+    # Normalizamos los dos nombres
+    name1 = phone_first_name.strip().lower()
+    name2 = db_first_name.strip().lower()
 
     # Normalizamos 
     if name1 in name2:
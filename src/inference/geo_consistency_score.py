@@ -2,15 +2,53 @@ import pandas as pd
 import numpy as np
 import unicodedata
 
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional, Tuple
 from dataclasses import dataclass
 from rapidfuzz import process, fuzz
 
+from inference.geo_index import CityGridIndex, haversine_np
+
+
+# Ciudad usada cuando la ciudad del usuario no se parece a ninguna ciudad válida
+DEFAULT_CITY = 'madrid'
+
+# Columnas del fichero de geonames (https://download.geonames.org/export/dump/)
+GEONAMES_COLS = [
+    "geonameid", "name", "asciiname", "alternatenames",
+    "lat", "lon", "feature_class", "feature_code",
+    "country_code", "cc2", "admin1_code", "admin2_code",
+    "admin3_code", "admin4_code", "population",
+    "elevation", "dem", "timezone", "modification_date"
+]
+
+# Columnas que se leen y sus tipos (el resto, incluido alternatenames, no se carga)
+GEONAMES_USECOLS = ["name", "asciiname", "lat", "lon", "country_code", "population"]
+GEONAMES_DTYPES = {
+    "name": str,
+    "asciiname": str,
+    "lat": np.float32,
+    "lon": np.float32,
+    "country_code": str,
+    "population": np.int32,
+}
+GEONAMES_COUNTRY = "ES"
+GEONAMES_CHUNKSIZE = 50_000
+
+# Radio (km) para considerar que la IP está en la ciudad declarada
+NEAR_CITY_KM = 25.0
+
 
 @dataclass(frozen=True)
 class orig_city_info:
     df_geonames: Optional[pd.DataFrame]
+    # Nombres normalizados de las ciudades válidas (en el orden de df_geonames)
+    valid_cities: Tuple[str, ...] = ()
+    # Nombre normalizado -> (lat, lon)
+    city_coords: Optional[Dict[str, Tuple[float, float]]] = None
+    # Índice espacial de las ciudades para consultas de cercanía
+    city_index: Optional[CityGridIndex] = None
 
 _ORIG_CITY_INFO: Optional[orig_city_info] = None
 
@@ -24,6 +62,42 @@ def normalize_text(x):
     return x
 
 
+def normalize_text_series(s):
+    """Versión vectorizada de normalize_text sobre una Series de strings (los nulos se mantienen)."""
+    return (
+        s.str.strip()
+            .str.lower()
+            .str.normalize("NFKD")
+            .str.encode("ascii", "ignore")
+            .str.decode("utf-8")
+            .str.split()
+            .str.join(" ")
+    )
+
+
+def read_geonames(city_path, country_code=GEONAMES_COUNTRY, chunksize=GEONAMES_CHUNKSIZE):
+    """
+    Lee por bloques el fichero de geonames quedándose solo con las filas de
+    `country_code` y las columnas necesarias con tipos compactos (float32 para
+    las coordenadas), de forma que nunca se carga el fichero completo en memoria.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Columnas name, asciiname, lat, lon, country_code y population.
+    """
+    chunks = pd.read_csv(
+        city_path,
+        sep="\t",
+        names=GEONAMES_COLS,
+        usecols=GEONAMES_USECOLS,
+        dtype=GEONAMES_DTYPES,
+        chunksize=chunksize,
+    )
+    frames = [chunk[chunk["country_code"] == country_code] for chunk in chunks]
+    return pd.concat(frames, ignore_index=True)
+
+
 def load_orig_city():
     """
     Función encargada de cargar la informacion de las ciudades indicadas por los usuarios en el proceso de registro.
@@ -39,48 +113,40 @@ def load_orig_city():
     # Cargamos la informacion de las ciudades obtenidos de https://download.geonames.org/export/dump/
     city_path = Path(__file__).resolve().parent.parent / "data/datos/cities500.txt"
 
-    # Declaramos las columnas del df de geonames
-    cols = [
-        "geonameid", "name", "asciiname", "alternatenames",
-        "lat", "lon", "feature_class", "feature_code",
-        "country_code", "cc2", "admin1_code", "admin2_code",
-        "admin3_code", "admin4_code", "population",
-        "elevation", "dem", "timezone", "modification_date"
-    ]   
-
-    # declaramos el df que contendra toda la informacion de las ciudades
-    geonames = pd.read_csv(
-        city_path,
-        sep="\t",
-        names=cols,
-        low_memory=False
-    )
-
-    geonames["name_norm"] = geonames["name"].apply(normalize_text)
-    geonames["asciiname_norm"] = geonames["asciiname"].apply(normalize_text)
-
-    geo_name = geonames[[
-    "name_norm", "country_code", "lat", "lon", "population"
-    ]].copy()
-
-    geo_ascii = geonames[[
-        "asciiname_norm", "country_code", "lat", "lon", "population"
-    ]].rename(columns={"asciiname_norm": "name_norm"}).copy()
-
-    geo_all = pd.concat([geo_name, geo_ascii], ignore_index=True)
+    # Solo las ciudades de España y las columnas que se usan
+    geonames = read_geonames(city_path)
+
+    # Cada ciudad aparece por su nombre y por su nombre ascii (normalizados)
+    geo_all = pd.DataFrame({
+        "name_norm": normalize_text_series(pd.concat([geonames["name"], geonames["asciiname"]], ignore_index=True)),
+        "country_code": np.tile(geonames["country_code"].to_numpy(), 2),
+        "lat": np.tile(geonames["lat"].to_numpy(), 2),
+        "lon": np.tile(geonames["lon"].to_numpy(), 2),
+        "population": np.tile(geonames["population"].to_numpy(), 2),
+    })
+    del geonames
     geo_all = geo_all.dropna(subset=["name_norm", "country_code", "lat", "lon"])
 
-    geo_all = (
+    geo_spain = (
         geo_all.sort_values(["country_code", "name_norm", "population"], ascending=[True, True, False])
             .drop_duplicates(subset=["country_code", "name_norm"], keep="first")
     )
+    del geo_all
+
+    geo_spain["name_norm"] = geo_spain["name_norm"].astype("category")
+    geo_spain["country_code"] = geo_spain["country_code"].astype("category")
 
-    geo_spain = geo_all[geo_all["country_code"] == "ES"].copy()
+    # Ciudades válidas y coordenadas precalculadas para no recorrer el DataFrame en cada consulta
+    valid_cities = tuple(geo_spain['name_norm'].unique().tolist())
+    city_coords = {}
+    for name, lat, lon in zip(geo_spain['name_norm'], geo_spain['lat'].tolist(), geo_spain['lon'].tolist()):
+        city_coords.setdefault(name, (lat, lon))
 
-    # Para el ahorro de memoria eliminamos todas las variables temporales auxiliares creadas
-    del geo_all, geo_ascii, geo_name, geonames
+    city_index = CityGridIndex.from_frame(geo_spain)
 
-    return orig_city_info(df_geonames = geo_spain)
+    return orig_city_info(
+        df_geonames = geo_spain, valid_cities = valid_cities, city_coords = city_coords, city_index = city_index
+    )
 
 
 def get_geoname_info():
@@ -118,50 +184,6 @@ def find_closest_city(city_name, valid_cities, threshold=85):
     return None
 
 
-def haversine_np(lat1, lon1, lat2, lon2):
-    """
-    Calcula la distancia del gran círculo entre dos puntos en la superficie de la Tierra
-    utilizando la fórmula de Haversine vectorizada.
-
-    Esta implementación utiliza NumPy para permitir el cálculo eficiente tanto de
-    puntos individuales como de arrays de coordenadas (Series de Pandas).
-
-    Parameters
-    ----------
-    lat1 : float o array-like
-        Latitud del primer punto (en grados decimales).
-    lon1 : float o array-like
-        Longitud del primer punto (en grados decimales).
-    lat2 : float o array-like
-        Latitud del segundo punto (en grados decimales).
-    lon2 : float o array-like
-        Longitud del segundo punto (en grados decimales).
-
-    Returns
-    -------
-    distancia : float 
-        Distancia entre los puntos en kilómetros (km).
-    """
-
-    R = 6371.0
-
-    lat1 = np.radians(lat1)
-    lon1 = np.radians(lon1)
-    lat2 = np.radians(lat2)
-    lon2 = np.radians(lon2)
-
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-
-    a = (
-        np.sin(dlat / 2.0) ** 2
-        + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2.0) ** 2
-    )
-    c = 2 * np.arcsin(np.sqrt(a))
-
-    return R * c
-
-    
 def consistency_score(dist_km, tau=100.1518898):
     """
     Calcula un score de confianza basado en la proximidad geográfica mediante
@@ -209,28 +231,108 @@ def calculate_geo_consistency_score(city_name, lat_ip, lon_ip):
     float
         Score de confianza en el rango (0, 1].
     """
-    # 1. Aquí deberías obtener las coordenadas de city_name (lat_res, lon_res)
-    geo_name = get_geoname_info()
-    df = geo_name.df_geonames
-    # Obtenemos la lista de ciudades validas en el territorio español
-    lst_valid_cities = df['name_norm'].unique().tolist()
+    lat_user, lon_user = resolve_city(normalize_text(city_name))
+    return _cached_score(lat_user, lon_user, lat_ip, lon_ip)
+
 
-    # Normalizamos la direccion del usuario
-    norm_city_name = normalize_text(city_name)
+@lru_cache(maxsize=16_384)
+def resolve_city(norm_city_name):
+    """
+    Coordenadas (lat, lon) de la ciudad válida más parecida a `norm_city_name`
+    (ya normalizado con normalize_text), o de DEFAULT_CITY si no hay ninguna.
+    """
+    geo_name = get_geoname_info()
 
     # Encotnramos la ciudad valida mas similar
-    closest = find_closest_city(norm_city_name, lst_valid_cities)
+    closest = find_closest_city(norm_city_name, geo_name.valid_cities)
 
     if closest is None:
-        closest = 'madrid'
-    # Obtenemos la latitud y longitud del usuario 
-    lat_user = df.loc[df['name_norm'] == closest,'lat'].iloc[0]
-    lon_user = df.loc[df['name_norm'] == closest,'lon'].iloc[0]
+        closest = DEFAULT_CITY
+    return geo_name.city_coords[closest]
 
+
+@lru_cache(maxsize=65_536)
+def _cached_score(lat_user, lon_user, lat_ip, lon_ip):
+    """Score de consistencia para un par (coordenadas de la ciudad, coordenadas de la IP)."""
     #  distancia usando Haversine (dist_km)
     dist_km = haversine_np(lat_ip, lon_ip, lat_user, lon_user)
-    
+
     # Score segun la distancia entre ciudades
-    score = consistency_score(dist_km)
-    
-    return float(score)
\ No newline at end of file
+    return float(consistency_score(dist_km))
+
+
+def calculate_geo_consistency_score_batch(city_names, lat_ip, lon_ip):
+    """
+    Versión por lotes de calculate_geo_consistency_score: resuelve cada ciudad
+    distinta una sola vez y calcula todas las distancias y scores en una pasada
+    vectorizada.
+
+    Parameters
+    ----------
+    city_names : array-like of str
+        Ciudades de residencia de los usuarios.
+    lat_ip, lon_ip : array-like of float
+        Coordenadas de la IP de cada solicitud (NaN si no se conocen).
+
+    Returns
+    -------
+    np.ndarray
+        Score de confianza de cada solicitud (NaN si faltan las coordenadas de la IP).
+    """
+    codes, uniques = pd.factorize(pd.Series(city_names, dtype=object), use_na_sentinel=False)
+    coords = np.array([resolve_city(normalize_text(city)) for city in uniques], dtype=float).reshape(-1, 2)
+
+    dist_km = haversine_np(
+        np.asarray(lat_ip, dtype=float), np.asarray(lon_ip, dtype=float),
+        coords[codes, 0], coords[codes, 1],
+    )
+    return consistency_score(dist_km)
+
+
+@lru_cache(maxsize=16_384)
+def matching_cities(norm_city_name, threshold=85):
+    """
+    Nombres de todas las ciudades válidas parecidas a `norm_city_name` (ya
+    normalizado con normalize_text) con un score mínimo de `threshold`.
+    """
+    if norm_city_name is None:
+        return frozenset()
+
+    matches = process.extract(
+        norm_city_name,
+        get_geoname_info().valid_cities,
+        scorer=fuzz.ratio,
+        score_cutoff=threshold,
+        limit=None,
+    )
+    return frozenset(match[0] for match in matches)
+
+
+def nearest_city_distance(lat_ip, lon_ip):
+    """
+    Distancia (km) de la ubicación de la IP a la ciudad más cercana del gazetteer.
+
+    Returns
+    -------
+    float
+        Distancia en km, o NaN si no se conocen las coordenadas de la IP.
+    """
+    nearest = get_geoname_info().city_index.nearest(lat_ip, lon_ip)
+    return np.nan if nearest is None else nearest[1]
+
+
+def ip_near_declared_city(city_name, lat_ip, lon_ip, km=NEAR_CITY_KM):
+    """
+    Indica si la IP está a menos de `km` kilómetros de alguna ciudad cuyo nombre
+    coincide (fuzzy matching) con la ciudad declarada por el usuario.
+
+    Returns
+    -------
+    int
+        1 si hay alguna ciudad coincidente dentro del radio; 0 en caso contrario
+        (también si la ciudad no se parece a ninguna o no se conocen las coordenadas).
+    """
+    names = matching_cities(normalize_text(city_name))
+    if not names:
+        return 0
+    return int(get_geoname_info().city_index.within_km(lat_ip, lon_ip, km, names=names))
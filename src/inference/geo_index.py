@@ -0,0 +1,202 @@
+"""
+Geo index
+Índice espacial en rejilla lat/lon sobre las ciudades de geonames para consultas
+de ciudad más cercana y de ciudades dentro de un radio. Los puntos se guardan
+ordenados por celda de forma que cada fila de celdas de una consulta es un tramo
+contiguo de los arrays.
+"""
+
+import math
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 2 * math.pi * EARTH_RADIUS_KM / 360
+
+# Tamaño de celda por defecto (grados): ~28 km de latitud
+DEFAULT_CELL_DEG = 0.25
+
+
+def haversine_np(lat1, lon1, lat2, lon2):
+    """
+    Calcula la distancia del gran círculo entre dos puntos en la superficie de la Tierra
+    utilizando la fórmula de Haversine vectorizada.
+
+    Esta implementación utiliza NumPy para permitir el cálculo eficiente tanto de
+    puntos individuales como de arrays de coordenadas (Series de Pandas).
+
+    Parameters
+    ----------
+    lat1 : float o array-like
+        Latitud del primer punto (en grados decimales).
+    lon1 : float o array-like
+        Longitud del primer punto (en grados decimales).
+    lat2 : float o array-like
+        Latitud del segundo punto (en grados decimales).
+    lon2 : float o array-like
+        Longitud del segundo punto (en grados decimales).
+
+    Returns
+    -------
+    distancia : float
+        Distancia entre los puntos en kilómetros (km).
+    """
+
+    R = EARTH_RADIUS_KM
+
+    lat1 = np.radians(lat1)
+    lon1 = np.radians(lon1)
+    lat2 = np.radians(lat2)
+    lon2 = np.radians(lon2)
+
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+
+    a = (
+        np.sin(dlat / 2.0) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2.0) ** 2
+    )
+    c = 2 * np.arcsin(np.sqrt(a))
+
+    return R * c
+
+
+class CityGridIndex:
+    """
+    Rejilla de celdas de `cell_deg` grados sobre un conjunto de ciudades.
+
+    Parameters
+    ----------
+    lat, lon : array-like of float
+        Coordenadas de las ciudades.
+    names : array-like of str
+        Nombre normalizado de cada ciudad.
+    population : array-like of int, optional
+        Población de cada ciudad.
+    cell_deg : float, optional
+        Tamaño de la celda en grados.
+    """
+
+    def __init__(self, lat, lon, names, population=None, cell_deg: float = DEFAULT_CELL_DEG):
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        if not len(lat):
+            raise ValueError("No se puede construir un CityGridIndex sin ciudades")
+        if population is None:
+            population = np.zeros(len(lat), dtype=np.int64)
+
+        self.cell_deg = cell_deg
+        self.lat0 = float(lat.min())
+        self.lon0 = float(lon.min())
+        self.n_rows = int((lat.max() - self.lat0) // cell_deg) + 1
+        self.n_cols = int((lon.max() - self.lon0) // cell_deg) + 1
+
+        rows = ((lat - self.lat0) // cell_deg).astype(np.int64)
+        cols = ((lon - self.lon0) // cell_deg).astype(np.int64)
+        cell_ids = rows * self.n_cols + cols
+        order = np.argsort(cell_ids, kind='stable')
+
+        self.lat = lat[order]
+        self.lon = lon[order]
+        self.names = np.asarray(names, dtype=object)[order]
+        self.population = np.asarray(population)[order]
+        # offsets[c]:offsets[c + 1] son los puntos de la celda c
+        self.offsets = np.searchsorted(cell_ids[order], np.arange(self.n_rows * self.n_cols + 1))
+
+        # Cota inferior del lado de una celda en km (el lado este-oeste mengua con la latitud)
+        max_abs_lat = min(89.0, max(abs(self.lat0), abs(float(lat.max()))) + 1.0)
+        self.min_cell_km = cell_deg * KM_PER_DEGREE * math.cos(math.radians(max_abs_lat))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, cell_deg: float = DEFAULT_CELL_DEG) -> "CityGridIndex":
+        """Construye el índice desde un DataFrame con columnas name_norm, lat, lon y population."""
+        return cls(df['lat'], df['lon'], df['name_norm'], df['population'], cell_deg=cell_deg)
+
+    def __len__(self):
+        return len(self.lat)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (
+            math.floor((lat - self.lat0) / self.cell_deg),
+            math.floor((lon - self.lon0) / self.cell_deg),
+        )
+
+    def _block(self, row: int, col: int, radius: int) -> np.ndarray:
+        """Índices de los puntos en las celdas a distancia (Chebyshev) <= `radius` de (row, col)."""
+        r0, r1 = max(row - radius, 0), min(row + radius, self.n_rows - 1)
+        c0, c1 = max(col - radius, 0), min(col + radius, self.n_cols - 1)
+        if r0 > r1 or c0 > c1:
+            return np.empty(0, dtype=np.intp)
+
+        offsets = self.offsets
+        spans = [
+            (offsets[r * self.n_cols + c0], offsets[r * self.n_cols + c1 + 1])
+            for r in range(r0, r1 + 1)
+        ]
+        return np.concatenate([np.arange(start, end) for start, end in spans])
+
+    def _inside(self, row: int, col: int) -> bool:
+        return 0 <= row < self.n_rows and 0 <= col < self.n_cols
+
+    def nearest(self, lat: float, lon: float) -> Optional[Tuple[str, float]]:
+        """
+        Ciudad más cercana a (lat, lon).
+
+        Returns
+        -------
+        tuple or None
+            (nombre, distancia en km), o None si las coordenadas son nulas.
+        """
+        if lat is None or lon is None or pd.isna(lat) or pd.isna(lon):
+            return None
+
+        row, col = self._cell(lat, lon)
+        if not self._inside(row, col):
+            # Fuera de la rejilla la cota por celdas no es fiable: se recorren todas las ciudades
+            dist = haversine_np(lat, lon, self.lat, self.lon)
+            i = int(np.argmin(dist))
+            return self.names[i], float(dist[i])
+
+        # Se amplía el bloque de celdas hasta que la mejor distancia es menor que la
+        # distancia mínima a cualquier celda fuera del bloque
+        max_radius = max(self.n_rows, self.n_cols)
+        for radius in range(max_radius + 1):
+            idx = self._block(row, col, radius)
+            if not len(idx):
+                continue
+            dist = haversine_np(lat, lon, self.lat[idx], self.lon[idx])
+            i = int(np.argmin(dist))
+            if dist[i] <= radius * self.min_cell_km or radius == max_radius:
+                return self.names[idx[i]], float(dist[i])
+        return None
+
+    def query_radius(self, lat: float, lon: float, km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Ciudades a menos de `km` kilómetros de (lat, lon).
+
+        Returns
+        -------
+        tuple
+            (nombres, distancias en km) de las ciudades dentro del radio.
+        """
+        if lat is None or lon is None or pd.isna(lat) or pd.isna(lon):
+            return self.names[:0], np.empty(0)
+
+        row, col = self._cell(lat, lon)
+        idx = self._block(row, col, math.ceil(km / self.min_cell_km))
+        dist = haversine_np(lat, lon, self.lat[idx], self.lon[idx])
+        mask = dist <= km
+        return self.names[idx[mask]], dist[mask]
+
+    def within_km(self, lat: float, lon: float, km: float, names: Optional[Iterable[str]] = None) -> bool:
+        """
+        True si hay alguna ciudad a menos de `km` kilómetros de (lat, lon); si se
+        indica `names`, solo cuentan las ciudades con alguno de esos nombres.
+        """
+        found, _ = self.query_radius(lat, lon, km)
+        if names is None:
+            return bool(len(found))
+        names = set(names)
+        return any(name in names for name in found)
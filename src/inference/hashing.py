@@ -0,0 +1,18 @@
+"""
+Hashing
+Hash estable de 64 bits (blake2b) para representar identidades como enteros.
+"""
+
+from hashlib import blake2b
+
+import numpy as np
+
+
+def hash64(value: str) -> int:
+    """Hash de 64 bits con signo de un string (estable entre procesos, a diferencia de hash())."""
+    return int.from_bytes(blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+def hash64_array(values) -> np.ndarray:
+    """hash64 de cada string de `values` como array int64."""
+    return np.fromiter((hash64(value) for value in values), dtype=np.int64, count=len(values))
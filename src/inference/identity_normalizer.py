@@ -0,0 +1,47 @@
+"""
+Identity normalizer
+Normalización de los identificadores de una solicitud (dni, email, teléfono)
+usada para cruzarla con los intentos previos fallidos.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def normalize_dni(dni):
+  if pd.isna(dni) or dni is None:
+      return ""
+  dni = str(dni).strip()
+  dni = ''.join(c for c in dni if c.isalnum())
+  return dni.upper()
+
+
+def normalize_email(email):
+  if pd.isna(email) or email is None:
+      return ""
+  return str(email).strip().lower()
+
+
+def normalize_cell_phone(phone):
+  if pd.isna(phone) or phone is None:
+      return ""
+  # Una columna de teléfonos con nulos se lee como float: 600000349.0 -> "600000349"
+  if isinstance(phone, (float, np.floating)) and float(phone).is_integer():
+      phone = int(phone)
+  phone = str(phone).strip()
+  if phone.endswith('.0'):
+      phone = phone[:-2]
+  phone = ''.join(c for c in phone if c.isdigit())
+  if phone.startswith('0034'):
+      phone = phone[4:]
+  elif phone.startswith('34'):
+      phone = phone[2:]
+  if phone.startswith('0') and len(phone) == 10:
+      phone = phone[1:]
+  return phone
+
+
+def normalize_ip(ip_address):
+  if pd.isna(ip_address) or ip_address is None:
+      return ""
+  return str(ip_address).strip()
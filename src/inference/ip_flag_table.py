@@ -0,0 +1,223 @@
+"""
+IP flag table
+Tabla de rangos de IP -> (ip_asn_flag_shrinkage, ip_city_flag_shrinkage)
+precalculada a partir de las bases GeoLite2 (ASN y City) y de los CSVs de flags y
+shrinkage. Cada rango es un tramo del espacio de direcciones en el que ambos
+valores son constantes, de forma que una consulta es una búsqueda binaria sobre
+el entero de la IP y la lectura de dos arrays.
+
+La tabla refleja los ficheros con los que se construyó: guarda su huella
+(`source_stamp`) y, si no coincide con la de los ficheros actuales, no se usa
+hasta regenerarla (python -m inference build-ip-table).
+"""
+
+from bisect import bisect_right
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from inference.ip_info import extract_asn, extract_city, get_info_geoip, parse_ip
+
+_MASK64 = (1 << 64) - 1
+
+
+def _ranges(reader, value_fn):
+    """
+    Rangos [inicio, fin) de las redes de una base mmdb con value_fn(registro),
+    por versión de IP. Las redes IPv4 se incluyen también en IPv6 (subárbol ::/96).
+    """
+    ranges = {4: [], 6: []}
+    for network, record in reader:
+        start = int(network.network_address)
+        item = (start, start + network.num_addresses, value_fn(record))
+        ranges[network.version].append(item)
+        if network.version == 4:
+            ranges[6].append(item)
+    return ranges
+
+
+def _step_function(ranges, default: float):
+    """(inicios, valores) de la función escalonada de unos rangos disjuntos, con `default` fuera de ellos."""
+    starts, values = [0], [default]
+    for start, end, value in sorted(ranges):
+        if start == starts[-1]:
+            values[-1] = value
+        else:
+            starts.append(start)
+            values.append(value)
+        starts.append(end)
+        values.append(default)
+    return starts, values
+
+
+def _merge(asn_steps, city_steps, bits: int):
+    """Une dos funciones escalonadas en una sola con el par de valores, sin tramos redundantes."""
+    asn_starts, asn_values = asn_steps
+    city_starts, city_values = city_steps
+
+    starts, asn, city = [], [], []
+    for start in sorted(set(asn_starts) | set(city_starts)):
+        if start >= 1 << bits:
+            break
+        pair = (asn_values[bisect_right(asn_starts, start) - 1], city_values[bisect_right(city_starts, start) - 1])
+        if starts and pair == (asn[-1], city[-1]):
+            continue
+        starts.append(start)
+        asn.append(pair[0])
+        city.append(pair[1])
+    return starts, np.array(asn, dtype=np.float64), np.array(city, dtype=np.float64)
+
+
+class IpFlagTable:
+    """
+    Rangos de IPv4 (array int64, búsqueda con np.searchsorted) e IPv6 (lista de
+    enteros, búsqueda con bisect) con el par de shrinkages de cada rango.
+    `source_stamp` es la huella de las bases y CSVs con los que se construyó.
+    """
+
+    def __init__(self, starts_v4: np.ndarray, asn_v4: np.ndarray, city_v4: np.ndarray,
+                 starts_v6: List[int], asn_v6: np.ndarray, city_v6: np.ndarray, default: Tuple[float, float],
+                 source_stamp: Optional[str] = None):
+        self.starts_v4 = starts_v4
+        self.asn_v4 = asn_v4
+        self.city_v4 = city_v4
+        self.starts_v6 = starts_v6
+        self.asn_v6 = asn_v6
+        self.city_v6 = city_v6
+        self.default = default
+        self.source_stamp = source_stamp
+
+    @classmethod
+    def build(cls, reader_asn, reader_city, asn_value: Callable, city_value: Callable,
+              default_name: str = "UNKNOWN") -> "IpFlagTable":
+        """
+        Construye la tabla desde los lectores maxminddb de las bases ASN y City.
+
+        Parameters
+        ----------
+        reader_asn, reader_city : maxminddb.Reader
+            Bases GeoLite2-ASN y GeoLite2-City.
+        asn_value : callable
+            Organización ASN -> shrinkage (ip_asn_org_flag_shrinkage).
+        city_value : callable
+            Subdivisión -> shrinkage (ip_city_name_flag_shrinkage).
+        default_name : str, optional
+            Nombre usado para las IPs que no están en la base (igual que ip_info).
+        """
+        default = (asn_value(default_name), city_value(default_name))
+
+        def asn_fn(record):
+            return asn_value(extract_asn(record))
+
+        def city_fn(record):
+            return city_value(extract_city(record)[0])
+
+        asn_ranges = _ranges(reader_asn, asn_fn)
+        city_ranges = _ranges(reader_city, city_fn)
+
+        tables = {}
+        for version, bits in ((4, 32), (6, 128)):
+            tables[version] = _merge(
+                _step_function(asn_ranges[version], default[0]),
+                _step_function(city_ranges[version], default[1]),
+                bits,
+            )
+
+        starts_v4, asn_v4, city_v4 = tables[4]
+        starts_v6, asn_v6, city_v6 = tables[6]
+        return cls(np.array(starts_v4, dtype=np.int64), asn_v4, city_v4, starts_v6, asn_v6, city_v6, default)
+
+    def __len__(self):
+        return len(self.starts_v4) + len(self.starts_v6)
+
+    def lookup(self, ip) -> Tuple[float, float]:
+        """(ip_asn_flag_shrinkage, ip_city_flag_shrinkage) de una IP (valores por defecto si no es válida)."""
+        try:
+            version, _, ip_int = parse_ip(ip)
+        except ValueError:
+            return self.default
+
+        if version == 4:
+            i = int(np.searchsorted(self.starts_v4, ip_int, side='right')) - 1
+            return float(self.asn_v4[i]), float(self.city_v4[i])
+
+        i = bisect_right(self.starts_v6, ip_int) - 1
+        return float(self.asn_v6[i]), float(self.city_v6[i])
+
+    def lookup_batch(self, ips) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Versión por lotes de lookup: las IPv4 se resuelven con un único
+        np.searchsorted y el resto una a una.
+
+        Returns
+        -------
+        tuple of np.ndarray
+            (ip_asn_flag_shrinkage, ip_city_flag_shrinkage) de cada IP.
+        """
+        n = len(ips)
+        asn = np.full(n, self.default[0])
+        city = np.full(n, self.default[1])
+
+        v4_rows, v4_ints = [], []
+        for row, ip in enumerate(ips):
+            try:
+                version, _, ip_int = parse_ip(ip)
+            except ValueError:
+                continue
+            if version == 4:
+                v4_rows.append(row)
+                v4_ints.append(ip_int)
+            else:
+                asn[row], city[row] = self.lookup(ip)
+
+        if v4_rows:
+            idx = np.searchsorted(self.starts_v4, np.array(v4_ints, dtype=np.int64), side='right') - 1
+            asn[v4_rows] = self.asn_v4[idx]
+            city[v4_rows] = self.city_v4[idx]
+        return asn, city
+
+    def save(self, path):
+        """Guarda la tabla en un fichero .npz (los inicios IPv6 como dos mitades de 64 bits)."""
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp.npz")
+        np.savez(
+            tmp_path,
+            starts_v4=self.starts_v4,
+            asn_v4=self.asn_v4,
+            city_v4=self.city_v4,
+            starts_v6_hi=np.array([start >> 64 for start in self.starts_v6], dtype=np.uint64),
+            starts_v6_lo=np.array([start & _MASK64 for start in self.starts_v6], dtype=np.uint64),
+            asn_v6=self.asn_v6,
+            city_v6=self.city_v6,
+            default=np.array(self.default, dtype=np.float64),
+            source_stamp=np.array(self.source_stamp or ""),
+        )
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path) -> "IpFlagTable":
+        """Carga una tabla guardada con save."""
+        with np.load(path) as data:
+            starts_v6 = [
+                (hi << 64) | lo for hi, lo in zip(data['starts_v6_hi'].tolist(), data['starts_v6_lo'].tolist())
+            ]
+            # Las tablas guardadas antes de registrar la huella no tienen source_stamp
+            source_stamp = str(data['source_stamp']) if 'source_stamp' in data.files else ""
+            return cls(
+                data['starts_v4'], data['asn_v4'], data['city_v4'],
+                starts_v6, data['asn_v6'], data['city_v6'],
+                tuple(float(v) for v in data['default']),
+                source_stamp or None,
+            )
+
+
+def build_ip_flag_table(asn_value: Callable, city_value: Callable, reader_asn=None, reader_city=None) -> IpFlagTable:
+    """
+    Construye la tabla desde las bases GeoLite2 de ip_info (o los lectores
+    maxminddb indicados).
+    """
+    ip_info = get_info_geoip()
+    reader_asn = reader_asn or ip_info.reader_asn.reader
+    reader_city = reader_city or ip_info.reader_city.reader
+    return IpFlagTable.build(reader_asn, reader_city, asn_value, city_value)
@@ -1,28 +1,161 @@
+import socket
+import threading
 from dataclasses import dataclass
-from typing import Optional
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
 from pathlib import Path
-import geoip2.database
-from geoip2.errors import AddressNotFoundError  # ← NUEVO IMPORT
+import maxminddb
+import numpy as np
+import pandas as pd
+
+# Máximo de redes decodificadas en la caché de cada base
+DEFAULT_CACHE_ENTRIES = 262_144
+
+
+def open_mmdb(path):
+    """
+    Abre una base mmdb en modo memory-mapped con el lector en C (MODE_MMAP_EXT) o,
+    si la extensión no está disponible, con el lector en Python (MODE_MMAP).
+    """
+    try:
+        return maxminddb.open_database(str(path), maxminddb.MODE_MMAP_EXT)
+    except ValueError:
+        return maxminddb.open_database(str(path), maxminddb.MODE_MMAP)
+
+
+def parse_ip(ip) -> Tuple[int, int, int]:
+    """(versión, bits, entero) de una IP en texto; ValueError si no es válida."""
+    for family, version, bits in ((socket.AF_INET, 4, 32), (socket.AF_INET6, 6, 128)):
+        try:
+            return version, bits, int.from_bytes(socket.inet_pton(family, ip), 'big')
+        except (OSError, TypeError):
+            continue
+    raise ValueError(f"{ip!r} no es una dirección IP válida")
+
+
+class MmdbLookup:
+    """
+    Consultas a una base mmdb que decodifican solo los campos que usan las
+    features (`extract` sobre el registro en bruto) y cachean el resultado por red.
+
+    Cada registro de la base corresponde a una red (IP, longitud de prefijo); la
+    caché guarda el resultado con clave (versión, prefijo, red), de forma que
+    cualquier IP de una red ya consultada es un acierto sin acceder a la base.
+
+    Parameters
+    ----------
+    path : str or Path
+        Ruta del fichero .mmdb.
+    extract : callable
+        Función registro (dict) -> valor cacheado.
+    max_entries : int, optional
+        Máximo de redes en caché; al superarlo se vacía.
+
+    La caché y las longitudes de prefijo se protegen con un lock, de forma que
+    una instancia se puede consultar desde varios hilos (la consulta a la base
+    se hace fuera del lock).
+    """
+
+    def __init__(self, path, extract: Callable[[Dict], object], max_entries: int = DEFAULT_CACHE_ENTRIES):
+        self.reader = open_mmdb(path)
+        self.max_entries = max_entries
+        self._extract = extract
+        self._cache: Dict[Tuple[int, int, int], object] = {}
+        # Longitudes de prefijo ya vistas por versión de IP (tupla: se reemplaza, nunca se modifica)
+        self._prefix_lens: Dict[int, Tuple[int, ...]] = {4: (), 6: ()}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, ip):
+        """
+        Valor extraído del registro de la IP, o None si la IP no está en la base.
+        Lanza ValueError si `ip` no es una dirección válida.
+        """
+        version, bits, ip_int = parse_ip(ip)
+
+        # Las redes de la base son disjuntas: como mucho coincide una de las cacheadas
+        with self._lock:
+            cache = self._cache
+            for prefix_len in self._prefix_lens[version]:
+                key = (version, prefix_len, ip_int >> (bits - prefix_len))
+                if key in cache:
+                    self.hits += 1
+                    return cache[key]
+            self.misses += 1
+
+        record, prefix_len = self.reader.get_with_prefix_len(ip)
+        value = None if record is None else self._extract(record)
+
+        with self._lock:
+            if len(self._cache) >= self.max_entries:
+                self._cache.clear()
+            self._cache[(version, prefix_len, ip_int >> (bits - prefix_len))] = value
+            if prefix_len not in self._prefix_lens[version]:
+                self._prefix_lens[version] = tuple(sorted(self._prefix_lens[version] + (prefix_len,), reverse=True))
+        return value
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+            self._prefix_lens = {4: (), 6: ()}
+
+    def close(self):
+        self.reader.close()
+
+
+def extract_asn(record: Dict) -> Optional[str]:
+    """Organización del ASN de un registro en bruto de GeoLite2-ASN."""
+    return record.get('autonomous_system_organization')
+
+
+def extract_city(record: Dict) -> Tuple[Optional[str], Optional[float], Optional[float]]:
+    """(subdivisión más específica en inglés, latitud, longitud), igual que los modelos de geoip2."""
+    subdivisions = record.get('subdivisions')
+    subdivision = subdivisions[-1].get('names', {}).get('en') if subdivisions else None
+    location = record.get('location', {})
+    return subdivision, location.get('latitude'), location.get('longitude')
+
 
 @dataclass(frozen=True)
 class IpInfo:
-    reader_city: Optional[geoip2.database.Reader]
-    reader_asn: Optional[geoip2.database.Reader]
+    reader_city: Optional[MmdbLookup]
+    reader_asn: Optional[MmdbLookup]
 
 _IP_INFO: Optional[IpInfo] = None 
 
+def database_paths() -> Tuple[Path, Path]:
+    """Rutas de las bases de datos de GeoLite2 (ciudad, ASN)."""
+    base = Path(__file__).resolve().parent.parent / "data/datos"
+    return base / "GeoLite2-City.mmdb", base / "GeoLite2-ASN.mmdb"
+
+
 def load_databases():
     """
-    Función encargada de cargar las bases de datos de la libreria geoip2.
+    Función encargada de cargar las bases de datos de GeoLite2 (ciudad y ASN).
     """
-    db_city_path = Path(__file__).resolve().parent.parent / "data/datos/GeoLite2-City.mmdb"
-    db_asn_path = Path(__file__).resolve().parent.parent / "data/datos/GeoLite2-ASN.mmdb"
+    db_city_path, db_asn_path = database_paths()
 
-    reader_city = geoip2.database.Reader(db_city_path)
-    reader_asn = geoip2.database.Reader(db_asn_path)
+    reader_city = MmdbLookup(db_city_path, extract_city)
+    reader_asn = MmdbLookup(db_asn_path, extract_asn)
     return IpInfo(reader_city=reader_city, reader_asn=reader_asn)
 
 
+def _city_record(ip):
+    """(subdivisión, latitud, longitud) de la IP; KeyError si no está en la base."""
+    record = get_info_geoip().reader_city.get(ip)
+    if record is None:
+        raise KeyError(ip)
+    return record
+
+
+def _asn_record(ip):
+    """Organización del ASN de la IP; KeyError si no está en la base."""
+    record = get_info_geoip().reader_asn.get(ip)
+    if record is None:
+        raise KeyError(ip)
+    return record
+
+
 def get_info_geoip():
     """
     Funcion encargada de inicializar la dataclass IpInfo.
@@ -52,12 +185,8 @@ def get_asn_org(ip: str, default: str = "UNKNOWN") -> str:
         Nombre de la organización ASN o el valor por defecto.
     """
     try:
-        ip_info = get_info_geoip()
-        return ip_info.reader_asn.asn(ip).autonomous_system_organization
-    except AddressNotFoundError:
-        return default
-    except Exception as e:
-        # Log o manejo de otros errores (opcional)
+        return _asn_record(ip)
+    except (KeyError, ValueError):
         return default
 
 
@@ -78,12 +207,8 @@ def get_city(ip: str, default: str = "UNKNOWN") -> str:
         Nombre de la ciudad o el valor por defecto.
     """
     try:
-        ip_info = get_info_geoip()
-        return ip_info.reader_city.city(ip).subdivisions.most_specific.name
-    except (AddressNotFoundError, AttributeError):
-        # AttributeError puede ocurrir si subdivisions.most_specific es None
-        return default
-    except Exception as e:
+        return _city_record(ip)[0]
+    except (KeyError, ValueError):
         return default
 
 
@@ -104,11 +229,8 @@ def get_lat(ip: str, default: float = 0.0) -> float:
         Latitud o el valor por defecto.
     """
     try:
-        ip_info = get_info_geoip()
-        return ip_info.reader_city.city(ip).location.latitude
-    except (AddressNotFoundError, AttributeError):
-        return default
-    except Exception as e:
+        return _city_record(ip)[1]
+    except (KeyError, ValueError):
         return default
 
 
@@ -129,9 +251,99 @@ def get_lon(ip: str, default: float = 0.0) -> float:
         Longitud o el valor por defecto.
     """
     try:
-        ip_info = get_info_geoip()
-        return ip_info.reader_city.city(ip).location.longitude
-    except (AddressNotFoundError, AttributeError):
+        return _city_record(ip)[2]
+    except (KeyError, ValueError):
         return default
-    except Exception as e:
-        return default
\ No newline at end of file
+
+
+class IpRecord(NamedTuple):
+    asn_org: Optional[str]
+    city: Optional[str]
+    lat: Optional[float]
+    lon: Optional[float]
+
+
+def get_ip_record(ip: str, default_name: str = "UNKNOWN", default_coord: float = 0.0) -> IpRecord:
+    """
+    Obtiene en una sola consulta por base de datos toda la información de la IP
+    que usan las features (ASN, ciudad, latitud y longitud).
+
+    Parameters
+    ----------
+    ip : str
+        Dirección IP a consultar.
+    default_name : str, optional
+        Valor de ASN/ciudad si la IP no se encuentra (igual que get_asn_org/get_city).
+    default_coord : float, optional
+        Valor de latitud/longitud si la IP no se encuentra (igual que get_lat/get_lon).
+
+    Returns
+    -------
+    IpRecord
+        Tupla (asn_org, city, lat, lon).
+    """
+    try:
+        asn_org = _asn_record(ip)
+    except (KeyError, ValueError):
+        asn_org = default_name
+
+    try:
+        city, lat, lon = _city_record(ip)
+    except (KeyError, ValueError):
+        return IpRecord(asn_org, default_name, default_coord, default_coord)
+
+    return IpRecord(asn_org, city, lat, lon)
+
+
+def _sort_key(ip):
+    """Clave de orden numérico (versión, entero); las IPs no válidas van al final."""
+    try:
+        version, _, ip_int = parse_ip(ip)
+    except ValueError:
+        return (7, 0)
+    return (version, ip_int)
+
+
+def enrich_ips(ips, default_name: str = "UNKNOWN", default_coord: float = 0.0) -> pd.DataFrame:
+    """
+    Enriquecimiento en bloque de una columna de IPs, equivalente a llamar a
+    get_asn_org, get_city, get_lat y get_lon fila a fila.
+
+    Cada IP distinta se consulta una sola vez con get_ip_record (una consulta
+    por base en lugar de cuatro) y las IPs se recorren ordenadas numéricamente,
+    de forma que las IPs consecutivas de una misma red aciertan en la caché por
+    red de MmdbLookup. Las consultas retienen el GIL, así que no se reparten
+    entre hilos; para datasets muy grandes, paralelizar por bloques en procesos
+    (ver score-file --workers).
+
+    Parameters
+    ----------
+    ips : array-like of str
+        IPs a enriquecer (pueden repetirse o ser nulas).
+    default_name, default_coord : optional
+        Valores para las IPs que no están en las bases (igual que get_ip_record).
+
+    Returns
+    -------
+    pandas.DataFrame
+        Columnas asn_org y subdivision (category) y lat y lon (float64, NaN si la
+        IP está en la base sin coordenadas), con el índice de `ips` si es una Series.
+    """
+    index = ips.index if isinstance(ips, pd.Series) else None
+    codes, uniques = pd.factorize(pd.Series(ips, dtype=object), use_na_sentinel=False)
+    uniques = uniques.tolist()
+    order = sorted(range(len(uniques)), key=lambda i: _sort_key(uniques[i]))
+    records = [get_ip_record(uniques[i], default_name, default_coord) for i in order]
+
+    # Código de cada IP -> posición de su registro tras ordenar
+    position = np.empty(len(order), dtype=np.intp)
+    position[order] = np.arange(len(order))
+    rows = position[codes]
+
+    asn_org, subdivision, lat, lon = zip(*records) if records else ((), (), (), ())
+    return pd.DataFrame({
+        'asn_org': pd.Categorical(asn_org)[rows],
+        'subdivision': pd.Categorical(subdivision)[rows],
+        'lat': np.array(lat, dtype=np.float64)[rows],
+        'lon': np.array(lon, dtype=np.float64)[rows],
+    }, index=index)
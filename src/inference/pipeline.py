@@ -0,0 +1,458 @@
+"""
+Pipeline de features
+Aplica todos los transformers de inference sobre un DataFrame de solicitudes,
+agrupados por etapas (misma secuencia que en add_users_model.ipynb).
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from inference.feature_transformers import (
+    bank_name_shrinkage,
+    tramo_amount_2_shrinkage,
+    tramo_days_shrinkage,
+    promo_code,
+    ip_asn_flag_shrinkage,
+    tramo_num_attempts,
+    tramo_days_last_attempt,
+    last_attempt_prob_xgb_flag,
+    req_ip_bin,
+    get_geo_consistency_score_batch,
+    get_digital_score,
+    same_name_phone_database,
+    tramo_n_categorias_distintas,
+    tramo_fastloans_n_entidades_distintas,
+    fastloan_vars,
+    bizzum_vars,
+)
+from inference.artifacts import get_ip_flag_table, get_shrinkage, load_artifacts
+from inference.attempts_velocity import (
+    load_attempts_velocity, transform_batch as velocity_batch, velocity_enabled,
+)
+from inference.emailsimilarity_transformer import load_bad_email_index, transform_batch as email_similarity_batch
+from inference.feature_schema import EXTRA_FEATURES, FEATURE_SCHEMA
+from inference.geo_consistency_score import get_geoname_info
+from inference.ip_info import get_info_geoip
+from inference.previous_attempts_transformer import transform_batch as previous_attempts_batch
+from inference.score_cache import DEFAULT_MAX_ENTRIES, DEFAULT_TTL_S, ScoreCache, ScoreCaches, artifact_version, fingerprint
+from inference.temporal_transformer import get_temporal_vars_batch
+from inference.ua_signature import load_ua_signatures
+from inference.binning import get_tramo_comercial, get_tramo_professional_network_tool
+from inference.trustfull_platform_transformer import load_digital_score_data
+
+
+# Columnas identificativas que deben tratarse como texto (p.ej. teléfonos numéricos)
+STRING_COLUMNS = {"dni": str, "email": str, "cell_phone": str, "ip_address": str}
+
+
+@dataclass(frozen=True)
+class Stage:
+    # Nombre de la etapa (se usa para reportar tiempos)
+    name: str
+    # Columnas de entrada que necesita la etapa
+    columns: Tuple[str, ...]
+    # Función que recibe el DataFrame de solicitudes y devuelve un DataFrame de features
+    fn: Callable[[pd.DataFrame], pd.DataFrame]
+    # Si es True, la etapa tiene caché propia (clave: sus columnas de entrada) en ScoreCaches
+    cached: bool = False
+
+
+def _map_unique(values, fn, dtype=float):
+    """
+    Aplica `fn` una sola vez por valor distinto de `values` y expande el resultado.
+
+    Parameters
+    ----------
+    values : array-like
+        Valores de entrada (pueden contener nulos).
+    fn : callable
+        Función escalar a aplicar.
+    dtype : type, optional
+        Tipo del array de salida.
+
+    Returns
+    -------
+    np.ndarray
+        Array con el resultado de `fn` para cada elemento de `values`.
+    """
+    codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=False)
+    mapped = np.empty(len(uniques), dtype=dtype)
+    for i, value in enumerate(uniques):
+        mapped[i] = fn(value)
+    return mapped[codes]
+
+
+def _frame(df, columns):
+    """Crea un DataFrame de salida alineado con el índice de las solicitudes."""
+    return pd.DataFrame(columns, index=df.index)
+
+
+def _stage_application(df):
+    return _frame(df, {
+        'bank_name_shrinkage': _map_unique(df['bank_name'], bank_name_shrinkage),
+        'tramo_amount_2_shrinkage': _map_unique(df['amount'], tramo_amount_2_shrinkage),
+        'tramo_days_shrinkage': _map_unique(df['days'], tramo_days_shrinkage),
+        'promo_code': _map_unique(df['promo_code_id'], promo_code, dtype=np.int64),
+    })
+
+
+def _stage_ip(df):
+    table = get_ip_flag_table()
+    if table is not None:
+        # Una sola búsqueda binaria vectorizada sobre la tabla de rangos
+        codes, uniques = pd.factorize(df['ip_address'], use_na_sentinel=False)
+        asn, _ = table.lookup_batch(uniques)
+        return _frame(df, {'ip_asn_flag_shrinkage': asn[codes]})
+
+    return _frame(df, {
+        'ip_asn_flag_shrinkage': _map_unique(df['ip_address'], ip_asn_flag_shrinkage),
+    })
+
+
+def _stage_attempts(df):
+    attempts = previous_attempts_batch(df)
+    num_attempts = attempts['num_attempts']
+
+    # El modelo de last_attempt se evalúa una vez por par (minutos, intentos previos) distinto
+    cache: Dict[Tuple, float] = {}
+    last_attempt_flag = np.empty(len(df), dtype=object)
+    for i, key in enumerate(zip(attempts['last_attempt'], (num_attempts > 0).astype(int))):
+        if key not in cache:
+            cache[key] = last_attempt_prob_xgb_flag(*key)
+        last_attempt_flag[i] = cache[key]
+
+    return _frame(df, {
+        'tramo_num_attempts_shrinkage': _map_unique(num_attempts, tramo_num_attempts),
+        'tramo_days_last_attempt_shrinkage': _map_unique(attempts['diff_days_last_attemtp'], tramo_days_last_attempt),
+        'req_ip_bin_shrinkage': _map_unique(attempts['req_ip'], req_ip_bin),
+        'last_attempt_flag_xgb_10_shrinkage': last_attempt_flag,
+    })
+
+
+def _stage_velocity(df):
+    # Opcional (ATTEMPTS_VELOCITY=1): las features van a EXTRA_FEATURES
+    if not velocity_enabled():
+        return _frame(df, {})
+    return velocity_batch(df)
+
+
+def _stage_temporal(df):
+    return get_temporal_vars_batch(df['created_at'])
+
+
+def _stage_user_agent(df):
+    _, device_browser_ver_flag_shrinkage = load_ua_signatures().lookup_batch(df['device_info'])
+    return _frame(df, {
+        'device_browser_ver_flag_shrinkage': device_browser_ver_flag_shrinkage,
+    })
+
+
+def _stage_geo(df):
+    return _frame(df, {
+        'geo_consistency_score': get_geo_consistency_score_batch(df['ip_address'], df['city']),
+    })
+
+
+def _tramo_platforms_shrinkage(df, lst_cols, tramo_fn, feature):
+    """Versión por lotes de tramo_platforms_*_shrinkage: cuenta plataformas y mapea tramo -> shrinkage."""
+    num_platforms = df[lst_cols].astype("int8").sum(axis=1)
+    return _map_unique(
+        num_platforms,
+        lambda n: get_shrinkage(feature, tramo_fn(n), default=1.0),
+    )
+
+
+def _stage_trustfull(df):
+    digi = load_digital_score_data()
+
+    whatsapp = df['whatsapp_privacy_status']
+    return _frame(df, {
+        'digital_presence_score': get_digital_score(df[digi.lst_cols_trust].copy()),
+        'breaches_count_email': df['breaches_count_email'],
+        'tramo_platforms_comercial_shrinkage': _tramo_platforms_shrinkage(
+            df, digi.lst_cols_comercial, get_tramo_comercial, "tramo_platforms_comercial"
+        ),
+        'phone_has_twitter': df['phone_has_twitter'],
+        'email_has_image': np.where(df['email_image_source'].isna(), 0, 1),
+        'whatsapp_privacy_status': np.where(whatsapp == 'private', 1, np.where(whatsapp == 'public', 0, np.nan)),
+        'same_name_phone_database': [
+            same_name_phone_database(a, b) for a, b in zip(df['phone_first_name'], df['first_name'])
+        ],
+        'phone_first_seen_days': df['phone_first_seen_days'],
+        'email_first_seen_days': df['email_first_seen_days'],
+        'phone_has_telegram': df['phone_has_telegram'],
+        'tramo_platforms_network_tools_shrinkage': _tramo_platforms_shrinkage(
+            df, digi.lst_cols_network_tools, get_tramo_professional_network_tool, "tramo_platforms_network_tools"
+        ),
+    })
+
+
+def _stage_email_similarity(df):
+    return email_similarity_batch(df['email'])
+
+
+def _stage_card(df):
+    fastloans = pd.DataFrame(
+        [fastloan_vars(row) for row in df[list(_FASTLOAN_COLUMNS)].to_dict('records')],
+        index=df.index,
+    )
+    bizzum = bizzum_vars(df)
+
+    return _frame(df, {
+        'transacciones_por_mes': df['transacciones_por_mes'],
+        'tramo_n_categorias_distintas_shrinkage': _map_unique(
+            df['n_categorias_distintas'], tramo_n_categorias_distintas
+        ),
+        'n_chargebacks': df['n_chargebacks'],
+        'tramo_fastloans_n_entidades_distintas_shrinkage': _map_unique(
+            df['fastloans_n_entidades_distintas'], tramo_fastloans_n_entidades_distintas
+        ),
+        'fl_min_diff_hours': fastloans['fl_min_diff_hours'],
+        'amount_vs_fl_conc_7d': fastloans['amount_vs_fl_conc_7d'],
+        'ratio_fl_concentration': fastloans['ratio_fl_concentration'],
+        'bizzum_ratio': bizzum['bizzum_ratio'],
+        'bizzum_intensity_velocity': bizzum['bizzum_intensity_velocity'],
+        'mule_purity_check': bizzum['mule_purity_check'],
+        'bizzum_no_salary_risk': bizzum['bizzum_no_salary_risk'],
+    })
+
+
+_FASTLOAN_COLUMNS = (
+    'fastloans_n_meses_activo', 'fastloans_n_entidades_distintas',
+    'n_meses_actividad', 'created_at', 'amount',
+)
+
+STAGES: List[Stage] = [
+    Stage("application", ('bank_name', 'amount', 'days', 'promo_code_id'), _stage_application),
+    Stage("ip", ('ip_address',), _stage_ip),
+    Stage("attempts", ('dni', 'email', 'cell_phone', 'ip_address', 'created_at'), _stage_attempts, cached=True),
+    Stage("velocity", ('dni', 'email', 'cell_phone', 'ip_address', 'created_at'), _stage_velocity),
+    Stage("temporal", ('created_at',), _stage_temporal),
+    Stage("user_agent", ('device_info',), _stage_user_agent),
+    Stage("geo", ('ip_address', 'city'), _stage_geo, cached=True),
+    Stage("trustfull", (
+        'breaches_count_email', 'phone_has_twitter', 'email_image_source',
+        'whatsapp_privacy_status', 'phone_first_name', 'first_name',
+        'phone_first_seen_days', 'email_first_seen_days', 'phone_has_telegram',
+    ), _stage_trustfull),
+    Stage("email_similarity", ('email',), _stage_email_similarity, cached=True),
+    Stage("card", _FASTLOAN_COLUMNS + (
+        'transacciones_por_mes', 'n_categorias_distintas', 'n_chargebacks',
+        'n_bizzums', 'gambling_por_mes', 'total_transacciones', 'salary_existe',
+    ), _stage_card),
+]
+
+
+def score_caches(max_entries: int = DEFAULT_MAX_ENTRIES, ttl_s: float = DEFAULT_TTL_S) -> ScoreCaches:
+    """Crea las cachés de resultados del pipeline (solicitudes completas y etapas con `cached`)."""
+    return ScoreCaches([stage.name for stage in STAGES if stage.cached], max_entries=max_entries, ttl_s=ttl_s)
+
+
+def required_columns():
+    """Devuelve la lista de columnas de entrada que necesita el pipeline completo."""
+    digi = load_digital_score_data()
+    columns = list(dict.fromkeys(
+        [col for stage in STAGES for col in stage.columns] + list(digi.lst_cols_trust)
+    ))
+    return columns
+
+
+def missing_columns(application: dict, columns=None) -> List[str]:
+    """
+    Columnas de entrada del pipeline que faltan en una solicitud JSON.
+
+    applications_frame rellena con NaN las columnas que faltan en una solicitud
+    si otra del mismo lote las trae, así que la validación de columnas de
+    transform_batch no basta cuando se agrupan solicitudes: hay que comprobar
+    cada solicitud antes de agruparla.
+
+    Parameters
+    ----------
+    application : dict
+        Solicitud (columna -> valor).
+    columns : list of str, optional
+        Columnas requeridas (por defecto `required_columns()`).
+
+    Returns
+    -------
+    list of str
+        Columnas requeridas que no están en `application`.
+    """
+    if columns is None:
+        columns = required_columns()
+    return [col for col in columns if col not in application]
+
+
+def warmup():
+    """
+    Carga todos los artefactos perezosos del pipeline (shrinkage, modelos,
+    intentos previos, índice de bad emails, bases de datos de IP, geonames,
+    firmas de User Agent y, con ATTEMPTS_VELOCITY=1, los contadores de velocidad).
+
+    Se usa para que la primera solicitud no pague el cold start. Los cargadores
+    no usan locks: dos hilos que los llamen a la vez antes del warmup pueden
+    cargar el mismo artefacto dos veces, así que en un proceso multihilo hay que
+    llamar a warmup antes de calcular features de forma concurrente.
+    """
+    load_artifacts()
+    load_digital_score_data()
+    load_bad_email_index()
+    get_info_geoip()
+    get_geoname_info()
+    load_ua_signatures()
+    if velocity_enabled():
+        load_attempts_velocity()
+
+
+def merge_timings(total: Dict[str, float], timings: Dict[str, float]):
+    """Acumula en `total` los segundos por etapa de `timings`."""
+    for name, seconds in timings.items():
+        total[name] = total.get(name, 0.0) + seconds
+    return total
+
+
+def _with_cache(cache: ScoreCache, keys, df, compute):
+    """
+    Resultado de `compute(df)` tomando de `cache` las filas cuya clave está
+    guardada: solo se calculan (y se guardan) las filas restantes.
+    """
+    cached = [cache.get(key) for key in keys]
+    miss = [i for i, entry in enumerate(cached) if entry is None]
+    hits = [i for i, entry in enumerate(cached) if entry is not None]
+
+    frames = []
+    if miss or not hits:
+        computed = compute(df.iloc[miss])
+        columns = tuple(computed.columns)
+        for i, row in zip(miss, computed.astype(object).itertuples(index=False, name=None)):
+            cache.put(keys[i], (columns, row))
+        frames.append(computed.set_axis(miss))
+    if hits:
+        frames.append(pd.DataFrame([cached[i][1] for i in hits], index=hits, columns=list(cached[hits[0]][0])))
+
+    return pd.concat(frames).sort_index().set_axis(df.index)
+
+
+def _row_keys(df, columns, version):
+    """Huella de los valores de `columns` de cada fila de `df`."""
+    return [fingerprint(row, version) for row in df[list(columns)].itertuples(index=False, name=None)]
+
+
+def iter_stage_features(df, timings: Optional[Dict[str, float]] = None, caches: Optional[ScoreCaches] = None,
+                        version=None):
+    """
+    Calcula las etapas de STAGES una a una y devuelve (generador) el DataFrame
+    de features de cada una, alineado con el índice de `df`. No comprueba las
+    columnas de entrada (ver check_columns).
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Solicitudes, una por fila.
+    timings : dict, optional
+        Si se indica, se acumulan en él los segundos empleados por cada etapa.
+    caches : ScoreCaches, optional
+        Cachés de las etapas con `cached` (con la versión de artefactos `version`).
+    """
+    for stage in STAGES:
+        start = time.perf_counter()
+        if caches is not None and stage.cached:
+            keys = _row_keys(df, stage.columns, version)
+            features = _with_cache(caches.groups[stage.name], keys, df, stage.fn)
+        else:
+            features = stage.fn(df)
+        if timings is not None:
+            timings[stage.name] = timings.get(stage.name, 0.0) + time.perf_counter() - start
+        yield features
+
+
+def _run_stages(df, timings, caches=None, version=None):
+    features = pd.concat(list(iter_stage_features(df, timings, caches, version)), axis=1)
+    return features[list(FEATURE_SCHEMA) + [name for name in EXTRA_FEATURES if name in features.columns]]
+
+
+def check_columns(df):
+    """Lanza KeyError si a `df` le falta alguna columna de `required_columns()`; devuelve las columnas."""
+    columns = required_columns()
+    missing = [col for col in columns if col not in df.columns]
+    if missing:
+        raise KeyError(f"Faltan columnas de entrada para el pipeline: {missing}")
+    return columns
+
+
+def transform_batch(df, timings: Optional[Dict[str, float]] = None, caches: Optional[ScoreCaches] = None):
+    """
+    Calcula todas las features del modelo para un lote de solicitudes.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        DataFrame con una fila por solicitud y las columnas de `required_columns()`.
+    timings : dict, optional
+        Si se indica, se acumulan en él los segundos empleados por cada etapa.
+    caches : ScoreCaches, optional
+        Si se indica (ver score_caches), las solicitudes ya calculadas con las
+        mismas entradas y versión de artefactos se toman de la caché, y las
+        etapas con `cached` solo se calculan para las entradas que no están en
+        la caché de la etapa.
+
+    Returns
+    -------
+    pandas.DataFrame
+        DataFrame con las features del modelo en el orden de FEATURE_SCHEMA,
+        seguidas de las EXTRA_FEATURES que se hayan calculado, alineado con el
+        índice de `df`.
+    """
+    columns = check_columns(df)
+
+    if caches is None:
+        return _run_stages(df, timings)
+
+    version = artifact_version()
+    return _with_cache(
+        caches.scores, _row_keys(df, columns, version), df,
+        lambda df_miss: _run_stages(df_miss, timings, caches, version),
+    )
+
+
+def applications_frame(applications):
+    """
+    Construye el DataFrame de entrada del pipeline a partir de solicitudes en JSON.
+
+    Parameters
+    ----------
+    applications : list of dict
+        Solicitudes (columna -> valor).
+
+    Returns
+    -------
+    pandas.DataFrame
+        Una fila por solicitud, con las STRING_COLUMNS convertidas a texto.
+    """
+    df = pd.DataFrame(applications)
+    for col, dtype in STRING_COLUMNS.items():
+        if col in df.columns:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(dtype))
+    return df
+
+
+def transform_application(application):
+    """
+    Calcula todas las features del modelo para UNA solicitud.
+
+    Parameters
+    ----------
+    application : dict
+        Diccionario columna -> valor con los datos de la solicitud.
+
+    Returns
+    -------
+    dict
+        Diccionario feature -> valor.
+    """
+    df = applications_frame([application])
+    return transform_batch(df).iloc[0].to_dict()
@@ -3,35 +3,12 @@ import pandas as pd
 import mysql.connector as sq
 from datetime import date, timedelta
 import os
-from inference.artifacts import get_previous_attempts
-
-
-def _normalize_dni(dni):
-  if pd.isna(dni) or dni is None:
-      return ""
-  dni = str(dni).strip()
-  dni = ''.join(c for c in dni if c.isalnum())
-  return dni.upper()
-
-  
-def _normalize_email(email):
-  if pd.isna(email) or email is None:
-      return ""
-  return str(email).strip().lower()
-
-
-def _normalize_cell_phone(phone):
-  if pd.isna(phone) or phone is None:
-      return ""
-  phone = str(phone).strip()
-  phone = ''.join(c for c in phone if c.isdigit())
-  if phone.startswith('0034'):
-      phone = phone[4:]
-  elif phone.startswith('34'):
-      phone = phone[2:]
-  if phone.startswith('0') and len(phone) == 10:
-      phone = phone[1:]
-  return phone
+from inference.artifacts import get_attempts_store, get_previous_attempts
+from inference.attempts_store import empty_result
+from inference.identity_normalizer import (
+    normalize_dni as _normalize_dni,
+    normalize_email as _normalize_email,
+)
 
 
 def get_df_attempts(dni, email, cell_phone, created_at = pd.to_datetime(date.today(), errors="coerce")):
@@ -140,28 +117,31 @@ def transform(dni, email, cell_phone, ip_address, created_at):
         Devuelve 1 si existe coincidencia parcial entre los nombres;
         devuelve 0 en caso contrario.
     """
-    # Declaramos las variables en caso de que no encuentre intentos previos 
-    num_attempts = 0
-    diff_days_last_attempt = np.nan
-    last_attempt = 0
-    created_at = pd.to_datetime(created_at)
-
-    # Obtenemos los intentos fallidos previos
-    df_attempts = get_df_attempts(dni, email, cell_phone, created_at)
-    
-    if not df_attempts.empty:
-        # Calculamos las diferentes metricas
-        num_attempts = df_attempts.shape[0]
-        diff_days_last_attempt = (created_at - df_attempts['created_at'].max()).days
-        last_attempt = (created_at - df_attempts["created_at"].max()).total_seconds() / 60
-    
-    # Obtenemos los intentos fallidos previos con la misma ip
-    req_ip = get_df_attempts_req_ip(ip_address, created_at)
+    store = get_attempts_store()
+    if store is None:
+        return empty_result()
 
-    return{
-        'num_attempts':num_attempts,
-        'diff_days_last_attemtp': diff_days_last_attempt,
-        'last_attempt': last_attempt,
-        'req_ip': req_ip
-    }
+    # Búsqueda en el store compacto (dni, email y teléfono normalizados en historial y solicitud)
+    return store.transform(dni, email, cell_phone, ip_address, created_at)
 
+
+def transform_batch(df):
+    """
+    Versión por lotes de transform: calcula num_attempts, diff_days_last_attemtp,
+    last_attempt y req_ip para todas las solicitudes con el backend de intentos
+    configurado (ver AttemptsBackend.transform_batch), sin cargar df_attempts.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Solicitudes con columnas dni, email, cell_phone, ip_address y created_at.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Mismas columnas que el diccionario de transform, con el índice de `df`.
+    """
+    store = get_attempts_store()
+    if store is None:
+        return pd.DataFrame([empty_result()] * len(df), index=df.index)
+    return store.transform_batch(df)
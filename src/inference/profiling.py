@@ -0,0 +1,163 @@
+"""
+Profiling
+Captura opcional de perfiles de CPU (cProfile) y de memoria (tracemalloc) de una
+fracción de las llamadas de scoring, para localizar regresiones de latencia en
+llamadas reales.
+
+Cada llamada muestreada escribe en el directorio de salida, con el prefijo
+<instante>-<huella de las solicitudes>:
+
+- .prof       : estadísticas de cProfile (pstats).
+- .tracemalloc: snapshot de tracemalloc de la memoria reservada durante la llamada.
+- .json       : metadatos (filas, segundos, pico de memoria).
+
+Sin profiling no hay ningún coste: el servidor y el CLI solo sustituyen la
+función de scoring por la envuelta con ScoringProfiler.wrap cuando se activa.
+"""
+
+import cProfile
+import functools
+import json
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from inference.score_cache import fingerprint
+
+DEFAULT_SAMPLE_RATE = 0.01
+# Frames guardados por reserva en los snapshots de tracemalloc
+TRACEMALLOC_FRAMES = 10
+
+
+def applications_fingerprint(df) -> str:
+    """Huella (hex) de las filas de un lote de solicitudes."""
+    return fingerprint([fingerprint(row).hex() for row in df.itertuples(index=False, name=None)]).hex()
+
+
+class ScoringProfiler:
+    """
+    Perfila una fracción `sample_rate` de las llamadas a una función de scoring
+    que recibe el DataFrame de solicitudes como primer argumento.
+
+    Solo se perfila una llamada a la vez (tracemalloc es global al proceso): si
+    otra llamada muestreada está en curso, la nueva se ejecuta sin perfilar.
+
+    Parameters
+    ----------
+    output_dir : str or Path
+        Directorio donde se escriben los perfiles.
+    sample_rate : float, optional
+        Fracción de llamadas que se perfilan (1.0: todas).
+    seed : int, optional
+        Semilla del muestreo.
+    """
+
+    def __init__(self, output_dir, sample_rate: float = DEFAULT_SAMPLE_RATE, seed: Optional[int] = None):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.sample_rate = sample_rate
+        self.samples = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def wrap(self, fn: Callable) -> Callable:
+        """Devuelve `fn` envuelta para perfilar las llamadas muestreadas."""
+        @functools.wraps(fn)
+        def wrapper(df, *args, **kwargs):
+            if self._random.random() >= self.sample_rate or not self._lock.acquire(blocking=False):
+                return fn(df, *args, **kwargs)
+            try:
+                return self._profile(fn, df, *args, **kwargs)
+            finally:
+                self._lock.release()
+        return wrapper
+
+    def _profile(self, fn: Callable, df, *args, **kwargs):
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        profiler = cProfile.Profile()
+
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                result = fn(df, *args, **kwargs)
+            finally:
+                profiler.disable()
+            elapsed = time.perf_counter() - start
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+
+        prefix = self.output_dir / f"{time.time_ns()}-{applications_fingerprint(df)[:16]}"
+        profiler.dump_stats(f"{prefix}.prof")
+        snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        )).dump(f"{prefix}.tracemalloc")
+        with open(f"{prefix}.json", "w", encoding="utf-8") as f:
+            json.dump({"rows": len(df), "seconds": elapsed, "peak_bytes": peak}, f)
+
+        self.samples += 1
+        return result
+
+
+def _allocation_sites(snapshot_paths, top: int) -> List[Dict]:
+    """Líneas con más memoria reservada sumando todos los snapshots."""
+    sizes: Dict[str, List[int]] = {}
+    for path in snapshot_paths:
+        for stat in tracemalloc.Snapshot.load(str(path)).statistics('lineno'):
+            frame = stat.traceback[0]
+            site = sizes.setdefault(f"{frame.filename}:{frame.lineno}", [0, 0])
+            site[0] += stat.size
+            site[1] += stat.count
+    ranked = sorted(sizes.items(), key=lambda item: item[1][0], reverse=True)[:top]
+    return [{"site": site, "bytes": size, "count": count} for site, (size, count) in ranked]
+
+
+def profile_report(directory, top: int = 20, sort: str = "cumulative", stream=None):
+    """
+    Imprime el resumen de los perfiles de un directorio: funciones con más
+    tiempo sumando todas las muestras (cProfile) y líneas con más memoria
+    reservada (tracemalloc).
+
+    Parameters
+    ----------
+    directory : str or Path
+        Directorio de salida de ScoringProfiler.
+    top : int, optional
+        Número de funciones y de líneas a mostrar.
+    sort : str, optional
+        Criterio de orden de pstats ('cumulative', 'tottime', 'calls', ...).
+    stream : file, optional
+        Salida del informe (por defecto stdout).
+    """
+    directory = Path(directory)
+    prof_paths = sorted(directory.glob("*.prof"))
+    if not prof_paths:
+        raise FileNotFoundError(f"No hay perfiles (.prof) en {directory}")
+
+    meta = [json.loads(path.read_text(encoding="utf-8")) for path in sorted(directory.glob("*.json"))]
+    rows = sum(m["rows"] for m in meta)
+    seconds = sum(m["seconds"] for m in meta)
+    print(f"{len(prof_paths)} muestras, {rows} filas, {seconds:.3f} s", file=stream)
+    if meta:
+        print(f"Pico de memoria máximo: {max(m['peak_bytes'] for m in meta) / 2 ** 20:.2f} MiB", file=stream)
+
+    print(f"\nFunciones (orden: {sort}):", file=stream)
+    stats = pstats.Stats(*map(str, prof_paths), stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+
+    sites = _allocation_sites(sorted(directory.glob("*.tracemalloc")), top)
+    if sites:
+        print("Memoria reservada por línea (suma de todas las muestras):", file=stream)
+        for site in sites:
+            print(f"  {site['bytes'] / 2 ** 10:10.1f} KiB  {site['count']:>8}  {site['site']}", file=stream)
@@ -0,0 +1,204 @@
+"""
+Q-gram index
+Índice invertido de q-gramas sobre una lista de strings para encontrar los que
+están a distancia de Levenshtein <= k de una consulta sin recorrer la lista.
+
+Cada string se rellena con q - 1 marcas al inicio y al final y se descompone en
+sus q-gramas; cada edición destruye como mucho q de ellos, así que un string a
+distancia <= k comparte con la consulta al menos p - k * q de cualesquiera p
+q-gramas distintos de la consulta. La consulta toma los p q-gramas menos
+frecuentes (prefix filtering), cuenta en cuántas de sus listas aparece cada
+string (count filtering) y verifica los candidatos con la distancia exacta.
+
+Los ids se asignan en orden de (longitud, string), de forma que el filtro de
+longitud (|len(s) - len(t)| <= k) es un tramo contiguo de cada lista invertida.
+"""
+
+import threading
+from typing import Iterable, Optional
+
+import numpy as np
+from rapidfuzz import process
+from rapidfuzz.distance import Levenshtein as rf_levenshtein
+
+DEFAULT_Q = 3
+DEFAULT_MAX_DIST = 2
+# Listas extra (sobre k * q) que se recorren: un candidato debe aparecer en al menos MIN_SHARED
+MIN_SHARED = 4
+
+_PAD_START = '\x02'
+_PAD_END = '\x03'
+# Bits por carácter al codificar un q-grama como entero (code points Unicode)
+_CHAR_BITS = 21
+
+
+class QGramIndex:
+    """
+    Índice de q-gramas con altas y bajas en caliente.
+
+    Los strings iniciales se indexan en arrays (listas invertidas en formato CSR);
+    los añadidos después se guardan aparte y se comparan por fuerza bruta, y las
+    bajas se marcan en una máscara, de forma que el índice no se reconstruye.
+
+    Parameters
+    ----------
+    strings : iterable of str
+        Strings a indexar.
+    q : int, optional
+        Longitud de los q-gramas (1 a 3).
+    max_dist : int, optional
+        Distancia máxima por defecto de las consultas.
+    """
+
+    def __init__(self, strings: Iterable[str], q: int = DEFAULT_Q, max_dist: int = DEFAULT_MAX_DIST):
+        if not 1 <= q <= 3:
+            raise ValueError(f"q debe estar entre 1 y 3, no {q}")
+        self.q = q
+        self.max_dist = max_dist
+
+        self.strings = np.array(sorted(set(strings), key=lambda s: (len(s), s)), dtype=object)
+        self.lengths = np.fromiter((len(s) for s in self.strings), dtype=np.int32, count=len(self.strings))
+        # Ids de los strings de longitud L: length_offsets[L]:length_offsets[L + 1]
+        self.length_offsets = np.searchsorted(self.lengths, np.arange(int(self.lengths.max(initial=0)) + 2))
+        self.grams, self.offsets, self.postings = self._build(self.strings)
+
+        self._alive = np.ones(len(self.strings), dtype=bool)
+        # Altas posteriores a la construcción (tupla: se reemplaza, nunca se modifica)
+        self._extra = ()
+        self._lock = threading.Lock()
+
+    def _encode(self, codes: np.ndarray) -> np.ndarray:
+        """Código entero de los q-gramas que empiezan en cada posición válida de `codes`."""
+        n = len(codes) - self.q + 1
+        grams = np.zeros(max(n, 0), dtype=np.int64)
+        for j in range(self.q):
+            grams = (grams << _CHAR_BITS) | codes[j:j + n]
+        return grams
+
+    def _code_points(self, s: str) -> np.ndarray:
+        padded = _PAD_START * (self.q - 1) + s + _PAD_END * (self.q - 1)
+        return np.frombuffer(padded.encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+
+    def _build(self, strings: np.ndarray):
+        """(q-gramas distintos, offsets, ids de string) de las listas invertidas."""
+        pad = self.q - 1
+        n_grams = self.lengths.astype(np.int64) + pad
+        char_starts = np.concatenate(([0], np.cumsum(self.lengths.astype(np.int64) + 2 * pad)))[:-1]
+        codes = self._code_points(
+            (_PAD_END * pad + _PAD_START * pad).join(strings.tolist())
+        ) if len(strings) else np.empty(0, dtype=np.int64)
+
+        # Posición en `codes` del primer carácter de cada q-grama
+        ids = np.repeat(np.arange(len(strings), dtype=np.int32), n_grams)
+        gram_starts = np.concatenate(([0], np.cumsum(n_grams)))[:-1]
+        positions = np.arange(len(ids), dtype=np.int64) - np.repeat(gram_starts - char_starts, n_grams)
+        grams = self._encode(codes)[positions] if len(ids) else np.empty(0, dtype=np.int64)
+
+        # Orden por (q-grama, id) sin pares repetidos
+        order = np.lexsort((ids, grams))
+        grams, ids = grams[order], ids[order]
+        keep = np.ones(len(grams), dtype=bool)
+        keep[1:] = (grams[1:] != grams[:-1]) | (ids[1:] != ids[:-1])
+        grams, ids = grams[keep], ids[keep]
+
+        unique_grams, starts = np.unique(grams, return_index=True)
+        offsets = np.append(starts, len(grams)).astype(np.int64)
+        return unique_grams, offsets, ids
+
+    def __len__(self):
+        return int(self._alive.sum()) + len(self._extra)
+
+    def _id_range(self, min_length: int, max_length: int):
+        """Tramo [inicio, fin) de ids con longitud entre `min_length` y `max_length`."""
+        last = len(self.length_offsets) - 1
+        return (
+            int(self.length_offsets[min(max(min_length, 0), last)]),
+            int(self.length_offsets[min(max(max_length + 1, 0), last)]),
+        )
+
+    def _position(self, s: str) -> int:
+        """Id de `s` entre los strings indexados, o -1 si no está."""
+        start, end = self._id_range(len(s), len(s))
+        i = start + int(np.searchsorted(self.strings[start:end], s))
+        return i if i < end and self.strings[i] == s else -1
+
+    def __contains__(self, s: str) -> bool:
+        i = self._position(s)
+        return (i >= 0 and bool(self._alive[i])) or s in self._extra
+
+    def add(self, strings: Iterable[str]):
+        """Añade strings al índice."""
+        with self._lock:
+            extra = list(self._extra)
+            for s in strings:
+                i = self._position(s)
+                if i >= 0:
+                    self._alive[i] = True
+                elif s not in extra:
+                    extra.append(s)
+            self._extra = tuple(extra)
+
+    def remove(self, strings: Iterable[str]):
+        """Elimina strings del índice (los que no están se ignoran)."""
+        with self._lock:
+            removed = set()
+            for s in strings:
+                i = self._position(s)
+                if i >= 0:
+                    self._alive[i] = False
+                removed.add(s)
+            self._extra = tuple(s for s in self._extra if s not in removed)
+
+    def candidates(self, s: str, k: Optional[int] = None) -> np.ndarray:
+        """
+        Ids de los strings indexados que pasan los filtros de q-gramas y de
+        longitud para distancia <= k (sin verificar la distancia exacta).
+        """
+        k = self.max_dist if k is None else k
+        length = len(s)
+        if not len(self.strings):
+            return np.empty(0, dtype=np.int32)
+
+        query = np.unique(self._encode(self._code_points(s)))
+        n_lists = min(len(query), k * self.q + MIN_SHARED)
+        min_shared = n_lists - k * self.q
+
+        first_id, end_id = (np.int32(i) for i in self._id_range(length - k, length + k))
+        if min_shared < 1:
+            # Consulta demasiado corta para filtrar por q-gramas: solo filtro de longitud
+            ids = np.arange(first_id, end_id)
+            return ids[self._alive[ids]]
+
+        # Tramo de cada lista con ids dentro del filtro de longitud
+        pos = np.minimum(np.searchsorted(self.grams, query), len(self.grams) - 1)
+        pos = pos[self.grams[pos] == query]
+        spans = []
+        for p in pos:
+            postings = self.postings[self.offsets[p]:self.offsets[p + 1]]
+            spans.append(postings[np.searchsorted(postings, first_id):np.searchsorted(postings, end_id)])
+
+        # Listas de los q-gramas de la consulta, de la menos a la más frecuente (los
+        # q-gramas que no están en el índice cuentan como listas vacías)
+        spans.sort(key=len)
+        lists = spans[:max(n_lists - (len(query) - len(pos)), 0)]
+        if not lists:
+            return np.empty(0, dtype=np.int32)
+
+        ids, counts = np.unique(np.concatenate(lists), return_counts=True)
+        ids = ids[counts >= min_shared]
+        return ids[self._alive[ids]]
+
+    def min_distance(self, s: str, k: Optional[int] = None) -> Optional[int]:
+        """
+        Menor distancia de Levenshtein de `s` a los strings del índice si es <= k,
+        o None si ninguno está a distancia <= k.
+        """
+        k = self.max_dist if k is None else k
+        ids = self.candidates(s, k)
+        choices = self.strings[ids].tolist() + [t for t in self._extra if abs(len(t) - len(s)) <= k]
+        if not choices:
+            return None
+
+        dist = process.cdist([s], choices, scorer=rf_levenshtein.distance, score_cutoff=k, dtype=np.int32, workers=1)
+        best = int(dist.min())
+        return best if best <= k else None
@@ -0,0 +1,202 @@
+"""
+Score cache
+Caché de resultados para solicitudes repetidas (reintentos, recargas de página).
+
+La clave es una huella estable (blake2b) de las entradas en bruto (solo se
+unifican los nulos) junto con la versión de los artefactos: la huella de los
+ficheros del directorio de datos, la versión de la lista negra de emails y, con
+ATTEMPTS_VELOCITY=1, la de los contadores de velocidad, de forma que una
+actualización de cualquiera de ellos deja sin efecto las entradas anteriores.
+Las entradas caducan a los `ttl_s` segundos y, al llenarse, se descarta la usada
+hace más tiempo (LRU).
+
+Además de la caché de solicitudes completas se mantiene una caché por grupo de
+features costoso (similitud de email, geo score, intentos previos) con clave
+solo en las columnas que lee el grupo: una solicitud reenviada con otro
+created_at no acierta en la caché completa, pero sí en los grupos que no
+dependen de la fecha.
+"""
+
+import json
+import math
+import sys
+import threading
+import time
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Dict, Hashable, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from inference.artifacts import _data_artifacts_dir
+from inference.attempts_velocity import load_attempts_velocity, velocity_enabled
+from inference.emailsimilarity_transformer import load_bad_email_index
+
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_TTL_S = 300.0
+
+_ARTIFACTS_STAMP: Optional[str] = None
+
+
+def _normalize_value(value):
+    """
+    Valor de entrada en forma canónica para la huella: solo se unifican los
+    nulos (None, NaN, NaT, NA -> None). El resto se hashea tal cual, porque el
+    pipeline distingue valores que solo difieren en espacios (p.ej. una IP con
+    un espacio inicial no se encuentra en las bases de IP).
+    """
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if value is pd.NaT or value is pd.NA:
+        return None
+    return value
+
+
+def fingerprint(values: Iterable, version: Hashable = None) -> bytes:
+    """Huella de 128 bits de una secuencia de valores de entrada y de la versión de los artefactos."""
+    payload = json.dumps(
+        [_normalize_value(value) for value in values] + [version], ensure_ascii=False, default=str,
+    )
+    return blake2b(payload.encode('utf-8'), digest_size=16).digest()
+
+
+def _artifacts_stamp() -> str:
+    """Huella (nombre, tamaño, fecha de modificación) de los ficheros del directorio de datos, calculada una vez."""
+    global _ARTIFACTS_STAMP
+    if _ARTIFACTS_STAMP is None:
+        digest = blake2b(digest_size=8)
+        root = _data_artifacts_dir()
+        for path in sorted(root.rglob("*")) if root.exists() else ():
+            if path.is_file():
+                stat = path.stat()
+                digest.update(f"{path.relative_to(root)}:{stat.st_size}:{stat.st_mtime_ns};".encode('utf-8'))
+        _ARTIFACTS_STAMP = digest.hexdigest()
+    return _ARTIFACTS_STAMP
+
+
+def artifact_version() -> Tuple[str, int, int]:
+    """
+    Versión actual de los artefactos: (huella de los ficheros, versión de la lista
+    negra de emails, versión de los contadores de velocidad o 0 si no se calculan).
+    """
+    velocity = load_attempts_velocity().version if velocity_enabled() else 0
+    return _artifacts_stamp(), load_bad_email_index().version, velocity
+
+
+def _sizeof(value) -> int:
+    """Tamaño aproximado en bytes de una entrada (contenedor y elementos de primer nivel)."""
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        size += sum(sys.getsizeof(item) for item in value)
+    return size
+
+
+class ScoreCache:
+    """
+    Caché LRU con caducidad por entrada y contadores de aciertos y memoria.
+
+    Parameters
+    ----------
+    max_entries : int, optional
+        Máximo de entradas; al superarlo se descarta la usada hace más tiempo.
+    ttl_s : float, optional
+        Segundos que una entrada es válida desde que se guardó.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_s: float = DEFAULT_TTL_S):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        # clave -> (instante de caducidad, tamaño aproximado, valor)
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable):
+        """Valor guardado con `key`, o None si no está o ha caducado."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= time.monotonic():
+                self._pop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: Hashable, value):
+        """Guarda `value` con `key` durante ttl_s segundos."""
+        size = _sizeof(key) + _sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_s, size, value)
+            self.bytes += size
+            while len(self._entries) > self.max_entries:
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _pop(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        """Entradas, memoria aproximada y contadores de la caché."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class ScoreCaches:
+    """
+    Caché de solicitudes completas (`scores`) y cachés de los grupos de features
+    costosos (`groups`, por nombre de etapa del pipeline).
+
+    Parameters
+    ----------
+    groups : sequence of str
+        Nombres de las etapas con caché propia.
+    max_entries : int, optional
+        Máximo de entradas de cada caché.
+    ttl_s : float, optional
+        Caducidad de las entradas de cada caché.
+    """
+
+    def __init__(self, groups: Sequence[str], max_entries: int = DEFAULT_MAX_ENTRIES, ttl_s: float = DEFAULT_TTL_S):
+        self.scores = ScoreCache(max_entries, ttl_s)
+        self.groups = {name: ScoreCache(max_entries, ttl_s) for name in groups}
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Estadísticas de cada caché (la de solicitudes completas como 'scores')."""
+        stats = {"scores": self.scores.stats()}
+        stats.update({name: cache.stats() for name, cache in self.groups.items()})
+        return stats
@@ -0,0 +1,321 @@
+"""
+Servidor HTTP de scoring
+Servicio ligero (stdlib) que carga los artefactos una sola vez y calcula las
+features de solicitudes individuales o por lotes.
+
+Endpoints
+---------
+GET  /health : devuelve 200 solo cuando todos los artefactos están cargados.
+               Hasta entonces /score y /bad-emails responden 503.
+GET  /metrics : estadísticas de la caché de resultados (aciertos, memoria), si está activa.
+POST /score  : body JSON con una solicitud (objeto) o una lista de solicitudes.
+               La respuesta tiene las features de FEATURE_SCHEMA y las
+               EXTRA_FEATURES calculadas (email_min_lev_global con EMAIL_GLOBAL_INDEX=1,
+               contadores attempts_*_<ventana> con ATTEMPTS_VELOCITY=1).
+               Cada solicitud debe traer todas las columnas de required_columns();
+               si a alguna le falta alguna, se responde 400 sin calcular el lote.
+POST /bad-emails : body JSON {"add": [...], "remove": [...], "snapshot": bool} para
+                   actualizar la lista negra de emails sin reiniciar. Es un endpoint
+                   de escritura sin autenticación: solo se atiende si el servidor se
+                   arranca con bad_emails_api=True (--enable-bad-emails-api); si no
+                   responde 403.
+
+Las solicitudes individuales concurrentes se agrupan en micro-lotes para
+aprovechar el camino por lotes del pipeline (transform_batch). Con la caché de
+resultados activa, las solicitudes repetidas se responden desde la caché; con
+profiling activo, una fracción de las llamadas se perfila (ver profiling).
+
+Los cargadores perezosos de artefactos (load_artifacts, get_info_geoip,
+load_bad_email_index, ...) no son thread-safe: el servidor los ejecuta una sola
+vez en el warmup y no atiende solicitudes de scoring hasta que termina. Las
+llamadas al pipeline (micro-lotes y solicitudes en lista) se serializan con un
+lock, de forma que nunca hay dos transform_batch concurrentes.
+"""
+
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+from inference.emailsimilarity_transformer import load_bad_email_index, save_bad_emails_snapshot
+from inference.pipeline import applications_frame, missing_columns, required_columns, score_caches, transform_batch, warmup
+from inference.profiling import DEFAULT_SAMPLE_RATE, ScoringProfiler
+from inference.score_cache import DEFAULT_MAX_ENTRIES, DEFAULT_TTL_S, ScoreCaches
+
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT_MS = 5.0
+REQUEST_TIMEOUT_S = 30.0
+
+# Resultado de _read_json cuando el body no es JSON válido (ya se ha respondido 400)
+_INVALID_JSON = object()
+
+
+def _records(features):
+    """Convierte el DataFrame de features en una lista de dicts serializables (NaN -> null)."""
+    return json.loads(features.to_json(orient="records"))
+
+
+class MicroBatcher:
+    """
+    Agrupa solicitudes individuales concurrentes en micro-lotes.
+
+    Un hilo de fondo espera la primera solicitud de la cola y acumula las que
+    lleguen durante `max_wait_ms` (hasta `max_batch_size`), calcula todas con
+    una única llamada a transform_batch y resuelve el Future de cada una.
+    """
+
+    def __init__(self, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE, max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+                 caches: Optional[ScoreCaches] = None, transform: Callable = transform_batch,
+                 lock: Optional[threading.Lock] = None):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.caches = caches
+        self.transform = transform
+        # Lock compartido con el resto de llamadas al pipeline del servidor
+        self.lock = lock or threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, application: dict) -> Future:
+        """Encola una solicitud y devuelve un Future con su dict de features."""
+        future: Future = Future()
+        self._queue.put((application, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            with self.lock:
+                self._score(batch)
+
+    def _score(self, batch):
+        try:
+            records = _records(self.transform(applications_frame([app for app, _ in batch]), caches=self.caches))
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            # Si falla el lote, calculamos cada solicitud por separado para
+            # que una solicitud inválida no haga fallar al resto
+            for app, future in batch:
+                try:
+                    future.set_result(_records(self.transform(applications_frame([app]), caches=self.caches))[0])
+                except Exception as e:
+                    future.set_exception(e)
+            return
+
+        for (_, future), record in zip(batch, records):
+            future.set_result(record)
+
+
+class ScoringServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE, max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+                 caches: Optional[ScoreCaches] = None, profiler: Optional[ScoringProfiler] = None,
+                 bad_emails_api: bool = False):
+        super().__init__(address, ScoringHandler)
+        self.caches = caches
+        self.bad_emails_api = bad_emails_api
+        # Sin profiler se llama directamente a transform_batch
+        self.transform = profiler.wrap(transform_batch) if profiler is not None else transform_batch
+        self.pipeline_lock = threading.Lock()
+        self.batcher = MicroBatcher(max_batch_size, max_wait_ms, caches, self.transform, self.pipeline_lock)
+        self.ready = threading.Event()
+        self.warmup_error: Optional[str] = None
+        threading.Thread(target=self._warmup, name="warmup", daemon=True).start()
+
+    def _warmup(self):
+        try:
+            warmup()
+        except Exception as e:
+            self.warmup_error = f"{type(e).__name__}: {e}"
+        self.ready.set()
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    server: ScoringServer
+
+    def _send_json(self, status: int, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            caches = self.server.caches
+            self._send_json(200, {"score_cache": caches.stats() if caches is not None else None})
+            return
+        if self.path != "/health":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        # Espera a que termine el warmup antes de responder
+        self.server.ready.wait()
+        if self.server.warmup_error is not None:
+            self._send_json(503, {"status": "error", "error": self.server.warmup_error})
+        else:
+            self._send_json(200, {"status": "ok"})
+
+    def _check_ready(self) -> bool:
+        """True si el warmup ha terminado bien; si no responde 503 y devuelve False."""
+        if not self.server.ready.is_set():
+            self._send_json(503, {"status": "starting", "error": "El servidor está cargando los artefactos"})
+            return False
+        if self.server.warmup_error is not None:
+            self._send_json(503, {"status": "error", "error": self.server.warmup_error})
+            return False
+        return True
+
+    def _read_json(self):
+        """Lee el body JSON; si no es válido responde 400 y devuelve _INVALID_JSON."""
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length))
+        except ValueError as e:
+            self._send_json(400, {"error": f"JSON inválido: {e}"})
+            return _INVALID_JSON
+
+    def do_POST(self):
+        if self.path == "/bad-emails" and not self.server.bad_emails_api:
+            self._send_json(403, {"error": "POST /bad-emails está desactivado (arrancar con --enable-bad-emails-api)"})
+            return
+        if self.path in ("/score", "/bad-emails") and not self._check_ready():
+            return
+        if self.path == "/bad-emails":
+            self._post_bad_emails()
+            return
+        if self.path != "/score":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        payload = self._read_json()
+        if payload is _INVALID_JSON:
+            return
+        if not (isinstance(payload, dict) or (isinstance(payload, list) and all(isinstance(app, dict) for app in payload))):
+            self._send_json(400, {"error": "Se espera un objeto o una lista de objetos"})
+            return
+
+        # Se valida cada solicitud antes de agruparla: en un lote, applications_frame
+        # rellenaría con NaN las columnas que faltan si otra solicitud las trae
+        error = self._check_columns(payload)
+        if error is not None:
+            self._send_json(400, {"error": error})
+            return
+
+        try:
+            if isinstance(payload, dict):
+                result = self.server.batcher.submit(payload).result(timeout=REQUEST_TIMEOUT_S)
+            else:
+                with self.server.pipeline_lock:
+                    result = _records(self.server.transform(applications_frame(payload), caches=self.server.caches))
+        except KeyError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        self._send_json(200, result)
+
+    @staticmethod
+    def _check_columns(payload) -> Optional[str]:
+        """Mensaje de error si a alguna solicitud le faltan columnas de entrada; si no, None."""
+        columns = required_columns()
+        applications = [payload] if isinstance(payload, dict) else payload
+        for i, application in enumerate(applications):
+            missing = missing_columns(application, columns)
+            if missing:
+                where = "" if isinstance(payload, dict) else f" (solicitud {i})"
+                return f"Faltan columnas de entrada para el pipeline{where}: {missing}"
+        return None
+
+    def _post_bad_emails(self):
+        payload = self._read_json()
+        if payload is _INVALID_JSON:
+            return
+        if not isinstance(payload, dict) or not all(
+            isinstance(payload.get(key, []), list) for key in ("add", "remove")
+        ):
+            self._send_json(400, {"error": "Se espera un objeto con las listas 'add' y/o 'remove'"})
+            return
+
+        index = load_bad_email_index()
+        added = index.add(payload.get("add", []))
+        removed = index.remove(payload.get("remove", []))
+        if payload.get("snapshot"):
+            try:
+                save_bad_emails_snapshot()
+            except Exception as e:
+                # Las altas y bajas ya están aplicadas en memoria; solo ha fallado el snapshot
+                self._send_json(500, {
+                    "error": f"No se ha podido guardar el snapshot: {type(e).__name__}: {e}",
+                    "added": added, "removed": removed, "size": len(index), "version": index.version,
+                })
+                return
+        self._send_json(200, {"added": added, "removed": removed, "size": len(index), "version": index.version})
+
+    def log_message(self, format, *args):
+        # Sin log por petición: en carga alta domina el tiempo de respuesta
+        pass
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE, max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+          score_cache: bool = False, cache_max_entries: int = DEFAULT_MAX_ENTRIES, cache_ttl_s: float = DEFAULT_TTL_S,
+          profile_dir: Optional[str] = None, profile_rate: float = DEFAULT_SAMPLE_RATE, bad_emails_api: bool = False):
+    """
+    Arranca el servidor de scoring (bloqueante).
+
+    Parameters
+    ----------
+    host : str
+        Dirección de escucha.
+    port : int
+        Puerto de escucha.
+    max_batch_size : int
+        Tamaño máximo de cada micro-lote.
+    max_wait_ms : float
+        Tiempo máximo que espera una solicitud individual a que se llene el micro-lote.
+    score_cache : bool
+        Si es True, activa la caché de resultados (ver score_cache).
+    cache_max_entries : int
+        Máximo de entradas de cada caché.
+    cache_ttl_s : float
+        Segundos que es válida cada entrada de la caché.
+    profile_dir : str, optional
+        Si se indica, activa el profiling y escribe los perfiles en este directorio.
+    profile_rate : float
+        Fracción de llamadas de scoring que se perfilan.
+    bad_emails_api : bool
+        Si es True, atiende POST /bad-emails (escritura sin autenticación).
+    """
+    caches = score_caches(cache_max_entries, cache_ttl_s) if score_cache else None
+    profiler = ScoringProfiler(profile_dir, profile_rate) if profile_dir else None
+    server = ScoringServer(
+        (host, port), max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, caches=caches, profiler=profiler,
+        bad_emails_api=bad_emails_api,
+    )
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
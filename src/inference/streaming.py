@@ -0,0 +1,242 @@
+"""
+Streaming scorer
+Lee un export de solicitudes (CSV o Parquet) por bloques, calcula las features
+de cada bloque con el pipeline y las escribe de forma incremental en Parquet.
+"""
+
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Sequence
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from inference.pipeline import STRING_COLUMNS, merge_timings, transform_batch
+
+CHECKPOINT_FILE = "_checkpoint.json"
+DEFAULT_CHUNKSIZE = 50_000
+DEFAULT_ID_COLUMNS = ("id", "user_id", "public_id")
+
+
+def _iter_csv(path: Path, chunksize: int, offset: int) -> Iterator[pd.DataFrame]:
+    """Lee el CSV por bloques saltando las `offset` primeras filas de datos."""
+    skiprows = range(1, offset + 1) if offset else None
+    yield from pd.read_csv(
+        path, chunksize=chunksize, skiprows=skiprows, dtype=STRING_COLUMNS, low_memory=False
+    )
+
+
+def _iter_parquet(path: Path, chunksize: int, offset: int) -> Iterator[pd.DataFrame]:
+    """Lee el Parquet por bloques saltando los row groups ya procesados."""
+    parquet_file = pq.ParquetFile(path)
+
+    # Descartamos los row groups completos anteriores al offset; a partir del
+    # primero que se conserva se leen todos
+    skip = offset
+    first = parquet_file.num_row_groups
+    for i in range(parquet_file.num_row_groups):
+        num_rows = parquet_file.metadata.row_group(i).num_rows
+        if skip < num_rows:
+            first = i
+            break
+        skip -= num_rows
+
+    row_groups = list(range(first, parquet_file.num_row_groups))
+    if not row_groups:
+        return
+
+    # Las filas restantes a saltar pueden ocupar más de un batch
+    for batch in parquet_file.iter_batches(batch_size=chunksize, row_groups=row_groups):
+        df = batch.to_pandas()
+        if skip:
+            dropped = min(skip, len(df))
+            df = df.iloc[dropped:]
+            skip -= dropped
+        if not df.empty:
+            yield df
+
+
+def iter_chunks(path, chunksize: int = DEFAULT_CHUNKSIZE, offset: int = 0) -> Iterator[pd.DataFrame]:
+    """
+    Itera un fichero de solicitudes por bloques de como mucho `chunksize` filas.
+
+    Parameters
+    ----------
+    path : str or Path
+        Fichero .csv o .parquet de entrada.
+    chunksize : int
+        Número máximo de filas por bloque.
+    offset : int
+        Número de filas iniciales a saltar (para reanudar).
+
+    Returns
+    -------
+    Iterator[pandas.DataFrame]
+        Bloques del fichero de entrada.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+
+    if suffix == ".csv":
+        return _iter_csv(path, chunksize, offset)
+    if suffix in (".parquet", ".pq"):
+        return _iter_parquet(path, chunksize, offset)
+    raise ValueError(f"Formato de entrada no soportado: {path.suffix}")
+
+
+def load_checkpoint(output_dir) -> Optional[dict]:
+    """Devuelve el checkpoint del directorio de salida o None si no existe."""
+    path = Path(output_dir) / CHECKPOINT_FILE
+    if not path.exists():
+        return None
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(output_dir, input_path, offset: int):
+    """Guarda de forma atómica el número de filas ya escritas (con la ruta absoluta de la entrada)."""
+    path = Path(output_dir) / CHECKPOINT_FILE
+    tmp_path = path.with_suffix(".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump({"input": str(Path(input_path).resolve()), "offset": offset}, f)
+    os.replace(tmp_path, path)
+
+
+def _write_part(output_dir: Path, offset: int, df: pd.DataFrame):
+    """Escribe un bloque de resultados como part-<offset>.parquet (idempotente al reanudar)."""
+    path = output_dir / f"part-{offset:012d}.parquet"
+    tmp_path = output_dir / f"part-{offset:012d}.parquet.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def score_chunk(df: pd.DataFrame, offset: int, id_cols: Sequence[str], timings: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+    """Calcula las features de un bloque y añade las columnas identificativas."""
+    features = transform_batch(df, timings=timings)
+    result = df[list(id_cols)].copy()
+    result.insert(0, "row_number", range(offset, offset + len(df)))
+    return pd.concat([result, features], axis=1).reset_index(drop=True)
+
+
+def _score_task(df: pd.DataFrame, offset: int, id_cols: Sequence[str]):
+    """Tarea de un worker: devuelve (offset, resultado, tiempos por etapa) de un bloque."""
+    timings: Dict[str, float] = {}
+    result = score_chunk(df, offset, id_cols, timings)
+    return offset, result, timings
+
+
+def iter_scored(tasks, workers: int = 1):
+    """
+    Calcula las features de una secuencia de bloques, en paralelo si `workers` > 1.
+
+    Los resultados se devuelven en el mismo orden que los bloques de entrada y se
+    mantienen como mucho 2 * `workers` bloques en vuelo para acotar la memoria.
+
+    Parameters
+    ----------
+    tasks : iterable of tuple
+        Tuplas (df, offset, id_cols) con cada bloque a procesar.
+    workers : int
+        Número de procesos.
+
+    Returns
+    -------
+    Iterator[tuple]
+        Tuplas (offset, resultado, tiempos por etapa).
+    """
+    if workers <= 1:
+        for task in tasks:
+            yield _score_task(*task)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(_score_task, *task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def score_file(
+    input_path,
+    output_dir,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    resume: bool = True,
+    id_cols=None,
+    workers: int = 1,
+    timings: Optional[Dict[str, float]] = None,
+):
+    """
+    Calcula las features de un export completo de solicitudes con memoria acotada.
+
+    El resultado se escribe como un dataset Parquet (un fichero por bloque) en
+    `output_dir`, junto con un checkpoint que permite reanudar tras un fallo
+    desde la última fila escrita.
+
+    Parameters
+    ----------
+    input_path : str or Path
+        Fichero .csv o .parquet con las solicitudes.
+    output_dir : str or Path
+        Directorio de salida del dataset Parquet.
+    chunksize : int
+        Número de filas por bloque.
+    resume : bool
+        Si es True y existe checkpoint en `output_dir`, se continúa desde él; si
+        es False se borran los resultados y el checkpoint anteriores.
+    id_cols : list of str, optional
+        Columnas de entrada que se copian a la salida. Por defecto las de
+        DEFAULT_ID_COLUMNS presentes en el fichero.
+    workers : int
+        Número de procesos que calculan bloques en paralelo.
+    timings : dict, optional
+        Si se indica, se acumulan en él los segundos empleados por cada etapa.
+
+    Returns
+    -------
+    int
+        Número total de filas escritas en `output_dir`.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    offset = 0
+    checkpoint = load_checkpoint(output_dir) if resume else None
+    if checkpoint is not None:
+        # Se comparan rutas resueltas: la misma entrada puede darse como relativa,
+        # absoluta o a través de un enlace simbólico
+        if Path(checkpoint["input"]).resolve() != Path(input_path).resolve():
+            raise ValueError(
+                f"El checkpoint de {output_dir} corresponde a {checkpoint['input']}, no a {input_path}"
+            )
+        offset = int(checkpoint["offset"])
+    else:
+        # Sin reanudar: eliminamos los resultados y el checkpoint de ejecuciones
+        # anteriores (si no, una ejecución que falla antes del primer bloque deja
+        # el checkpoint viejo y la siguiente reanudación saltaría filas)
+        for path in output_dir.glob("part-*.parquet"):
+            path.unlink()
+        (output_dir / CHECKPOINT_FILE).unlink(missing_ok=True)
+
+    def tasks():
+        chunk_offset = offset
+        for df in iter_chunks(input_path, chunksize, offset):
+            cols = id_cols
+            if cols is None:
+                cols = [col for col in DEFAULT_ID_COLUMNS if col in df.columns]
+            yield df, chunk_offset, cols
+            chunk_offset += len(df)
+
+    for chunk_offset, result, chunk_timings in iter_scored(tasks(), workers):
+        _write_part(output_dir, chunk_offset, result)
+        offset = chunk_offset + len(result)
+        save_checkpoint(output_dir, input_path, offset)
+        if timings is not None:
+            merge_timings(timings, chunk_timings)
+
+    return offset
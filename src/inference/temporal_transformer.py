@@ -0,0 +1,105 @@
+"""
+Temporal transformer
+Variables temporales a partir del cubo de shrinkage precalculado en los artefactos
+(temporal_cube): cada solicitud se reduce a descomponer la fecha en día de la
+semana, día del mes y hora e indexar el cubo, sin formatear strings.
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from inference.artifacts import DAY_NAMES, TEMPORAL_VARS, get_temporal_cube
+from inference.feature_transformers import get_temporal_vars
+
+
+def get_temporal_vars_fast(created_at) -> Dict[str, float]:
+    """
+    Equivalente a get_temporal_vars con una sola consulta al cubo temporal.
+
+    Parameters
+    ----------
+    created_at : pd.Timestamp or str
+        Fecha de creación de la solicitud del prestamo.
+
+    Returns
+    -------
+    dict
+        Diccionario con las variables de TEMPORAL_VARS (NaN si la fecha es nula)
+        y diff_minutes_flag_shrinkage.
+    """
+    created_at = pd.Timestamp(created_at)
+    if pd.isna(created_at):
+        values = (np.nan,) * len(TEMPORAL_VARS)
+    else:
+        values = get_temporal_cube()[created_at.dayofweek, created_at.day - 1, created_at.hour]
+
+    result = dict(zip(TEMPORAL_VARS, (float(value) for value in values)))
+    result['diff_minutes_flag_shrinkage'] = np.nan
+    return result
+
+
+def get_temporal_vars_batch(created_at) -> pd.DataFrame:
+    """
+    Calcula las variables temporales de un lote de solicitudes.
+
+    Parameters
+    ----------
+    created_at : pandas.Series or array-like
+        Fechas de creación de las solicitudes (datetime64 o strings parseables).
+
+    Returns
+    -------
+    pandas.DataFrame
+        Columnas de TEMPORAL_VARS (NaN para fechas nulas), con el índice de
+        `created_at` si es una Series.
+    """
+    cube = get_temporal_cube()
+    index = created_at.index if isinstance(created_at, pd.Series) else None
+
+    dt = pd.DatetimeIndex(pd.to_datetime(created_at))
+    valid = ~dt.isna()
+
+    # Para NaT se usa la posición 0 y después se sobreescribe con NaN
+    weekday = np.where(valid, dt.dayofweek, 0).astype(np.intp)
+    day = np.where(valid, dt.day - 1, 0).astype(np.intp)
+    hour = np.where(valid, dt.hour, 0).astype(np.intp)
+
+    values = cube[weekday, day, hour]
+    values[~valid] = np.nan
+
+    return pd.DataFrame(values, columns=list(TEMPORAL_VARS), index=index)
+
+
+def verify_temporal_cube() -> List[Tuple[str, str, float, float]]:
+    """
+    Compara el cubo temporal con get_temporal_vars en todas las combinaciones de
+    día de la semana, día del mes y hora.
+
+    Returns
+    -------
+    list of tuple
+        (fecha, variable, valor de get_temporal_vars, valor del cubo) para cada
+        discrepancia. Vacía si el cubo es correcto.
+    """
+    cube = get_temporal_cube()
+
+    # Una fecha real por cada combinación (día de la semana, día del mes): el
+    # calendario gregoriano las cubre todas en menos de 28 años
+    dates = {}
+    for date in pd.date_range('2000-01-01', '2027-12-31', freq='D'):
+        dates.setdefault((date.dayofweek, date.day), date)
+    assert len(dates) == len(DAY_NAMES) * 31
+
+    mismatches = []
+    for (weekday, day), date in sorted(dates.items()):
+        for hour in range(24):
+            created_at = date + pd.Timedelta(hours=hour)
+            expected = get_temporal_vars(created_at)
+            for k, var in enumerate(TEMPORAL_VARS):
+                value = cube[weekday, day - 1, hour, k]
+                if not np.isclose(expected[var], value):
+                    mismatches.append((str(created_at), var, expected[var], float(value)))
+
+    return mismatches
@@ -58,6 +58,36 @@ def load_digital_score_data():
         )
     return _DIGITAL_SCORE
 
+def get_digital_score_weights():
+    """
+    Devuelve el peso de cada columna de `lst_cols_trust` en el digital presence score
+    según el grupo de plataforma al que pertenece (0.0 si no pertenece a ninguno).
+
+    Returns
+    -------
+    dict
+        Diccionario columna -> peso.
+    """
+    digi = load_digital_score_data()
+
+    # Diccionaro que contendra todas las puntuaciones segun el grupo de la plataforma
+    col_weights = {}
+
+    for col in digi.lst_cols_trust:
+        if col in digi.lst_cols_comunication:
+            col_weights[col] = digi.weights["comunication"]
+        elif col in digi.lst_cols_comercial:
+            col_weights[col] = digi.weights["comercial"]
+        elif col in digi.lst_cols_identity:
+            col_weights[col] = digi.weights["identity"]
+        elif col in digi.lst_cols_network_tools:
+            col_weights[col] = digi.weights["network_tools"]
+        else:
+            col_weights[col] = 0.0
+
+    return col_weights
+
+
 def calculate_digital_score(df):
     """
     Calcula el digital presence score de un usuario a partir de sus señales
@@ -82,23 +112,7 @@ def calculate_digital_score(df):
     # Cargamos los datos para calcular el digital score
     digi = load_digital_score_data()
 
-    # Diccionaro que contendra todas las puntuaciones segun el grupo de la plataforma
-
-    col_weights = {}
-
-    for col in digi.lst_cols_trust:
-        if col in digi.lst_cols_comunication:
-            col_weights[col] = digi.weights["comunication"]
-        elif col in digi.lst_cols_comercial:
-            col_weights[col] = digi.weights["comercial"]
-        elif col in digi.lst_cols_identity:
-            col_weights[col] = digi.weights["identity"]
-        elif col in digi.lst_cols_network_tools:
-            col_weights[col] = digi.weights["network_tools"]
-        else:
-            col_weights[col] = 0.0
-
-    weights = pd.Series(col_weights)
+    weights = pd.Series(get_digital_score_weights())
     
     df["digital_presence_score"] = (
         df[digi.lst_cols_trust]
@@ -0,0 +1,192 @@
+"""
+UA signature
+Tabla hash64(User Agent) -> (os_family_shrinkage, device_browser_ver_flag_shrinkage)
+construida a partir de los User Agents históricos. Los User Agents conocidos se
+resuelven con una búsqueda en un diccionario, sin analizar la cadena; los nuevos
+se analizan con user_agents una sola vez y se añaden a la tabla.
+
+La tabla persistida guarda la huella de los CSVs de shrinkage y de las versiones
+de los parsers con los que se calculó; si no coincide con la actual no se usa.
+"""
+
+import os
+import threading
+import warnings
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from inference.artifacts import _data_artifacts_dir, files_stamp
+from inference.feature_transformers import device_browser_ver_flag_from_parsed, os_family_shrinkage_from_parsed
+from inference.hashing import hash64
+from inference.user_agent_parser import parse_user_agent
+
+# Máximo de User Agents en la tabla (los nuevos a partir de aquí se analizan sin guardarse)
+DEFAULT_MAX_ENTRIES = 1_000_000
+
+_UA_SIGNATURES: Optional["UaSignatureTable"] = None
+
+
+class UaSignature(NamedTuple):
+    os_family_shrinkage: float
+    device_browser_ver_flag_shrinkage: float
+
+
+def ua_signature(user_agent: str) -> UaSignature:
+    """Analiza un User Agent y calcula sus shrinkages (camino sin tabla)."""
+    parsed = parse_user_agent(user_agent)
+    return UaSignature(os_family_shrinkage_from_parsed(parsed), device_browser_ver_flag_from_parsed(parsed))
+
+
+def ua_signatures_path() -> Path:
+    """Ruta de la tabla persistida (UA_SIGNATURES o ua_signatures.npz en el directorio de datos)."""
+    return Path(os.environ.get("UA_SIGNATURES", _data_artifacts_dir() / "ua_signatures.npz"))
+
+
+def _package_version(name: str) -> str:
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return "-"
+
+
+def ua_signatures_stamp() -> str:
+    """
+    Huella de lo que determina las firmas: CSVs de shrinkage de os_family y
+    device_browser_ver y versiones de los parsers de User Agent.
+    """
+    base = _data_artifacts_dir()
+    stamp = files_stamp([
+        base / "os_family_shrinkage.csv",
+        base / "device_browser_ver.csv",
+        base / "device_browser_ver_flag.csv",
+    ])
+    return f"{stamp}-user-agents={_package_version('user-agents')}-ua-parser={_package_version('ua-parser')}"
+
+
+class UaSignatureTable:
+    """
+    Shrinkages por hash64 del User Agent en bruto.
+
+    Parameters
+    ----------
+    signatures : dict, optional
+        hash64 -> UaSignature inicial.
+    max_entries : int, optional
+        Tamaño máximo de la tabla.
+    source_stamp : str, optional
+        Huella (ua_signatures_stamp) de los ficheros con los que se calcularon
+        las firmas. Por defecto la de los ficheros actuales.
+    """
+
+    def __init__(self, signatures: Optional[Dict[int, UaSignature]] = None, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 source_stamp: Optional[str] = None):
+        self.signatures: Dict[int, UaSignature] = dict(signatures or {})
+        self.max_entries = max_entries
+        self.source_stamp = source_stamp or ua_signatures_stamp()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_user_agents(cls, user_agents, max_entries: int = DEFAULT_MAX_ENTRIES) -> "UaSignatureTable":
+        """Construye la tabla analizando una vez cada User Agent distinto de `user_agents`."""
+        table = cls(max_entries=max_entries)
+        for user_agent in pd.unique(pd.Series(user_agents, dtype=object).dropna()):
+            table.lookup(user_agent)
+        table.hits = table.misses = 0
+        return table
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def lookup(self, user_agent) -> UaSignature:
+        """Shrinkages del User Agent; si no está en la tabla se analiza y se añade."""
+        if not isinstance(user_agent, str):
+            return ua_signature(user_agent)
+
+        key = hash64(user_agent)
+        signature = self.signatures.get(key)
+        if signature is not None:
+            self.hits += 1
+            return signature
+
+        self.misses += 1
+        signature = ua_signature(user_agent)
+        with self._lock:
+            if len(self.signatures) < self.max_entries:
+                self.signatures[key] = signature
+        return signature
+
+    def lookup_batch(self, user_agents) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Versión por lotes de lookup (una consulta por User Agent distinto).
+
+        Returns
+        -------
+        tuple of np.ndarray
+            (os_family_shrinkage, device_browser_ver_flag_shrinkage) de cada User Agent.
+        """
+        codes, uniques = pd.factorize(pd.Series(user_agents, dtype=object), use_na_sentinel=False)
+        values = np.array([self.lookup(user_agent) for user_agent in uniques], dtype=np.float64).reshape(-1, 2)
+        return values[codes, 0], values[codes, 1]
+
+    def save(self, path):
+        """Guarda la tabla en un fichero .npz."""
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp.npz")
+        with self._lock:
+            keys = np.fromiter(self.signatures.keys(), dtype=np.int64, count=len(self.signatures))
+            values = np.array(list(self.signatures.values()), dtype=np.float64).reshape(-1, 2)
+        np.savez(
+            tmp_path, keys=keys, os_family=values[:, 0], device_browser_ver=values[:, 1],
+            source_stamp=np.array(self.source_stamp),
+        )
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path, max_entries: int = DEFAULT_MAX_ENTRIES) -> "UaSignatureTable":
+        """Carga una tabla guardada con save."""
+        with np.load(path) as data:
+            signatures = {
+                key: UaSignature(os_family, device_browser_ver)
+                for key, os_family, device_browser_ver in zip(
+                    data['keys'].tolist(), data['os_family'].tolist(), data['device_browser_ver'].tolist()
+                )
+            }
+            # Las tablas guardadas antes de registrar la huella no tienen source_stamp
+            source_stamp = str(data['source_stamp']) if 'source_stamp' in data.files else "-"
+        return cls(signatures, max_entries=max_entries, source_stamp=source_stamp)
+
+
+def load_ua_signatures() -> UaSignatureTable:
+    """
+    Carga la tabla persistida una sola vez. Si no se ha construido, o se
+    construyó con otros CSVs de shrinkage o parsers, se empieza con una tabla
+    vacía (cada User Agent se analiza la primera vez que aparece).
+    """
+    global _UA_SIGNATURES
+    if _UA_SIGNATURES is None:
+        path = ua_signatures_path()
+        table = UaSignatureTable.load(path) if path.exists() else UaSignatureTable()
+        if table.source_stamp != ua_signatures_stamp():
+            warnings.warn(
+                f"{path} no corresponde a los CSVs de shrinkage y parsers de User Agent actuales; se ignora "
+                "(regenerar con python -m inference build-ua-table)"
+            )
+            table = UaSignatureTable()
+        _UA_SIGNATURES = table
+    return _UA_SIGNATURES
+
+
+def get_ua_signature(user_agent) -> UaSignature:
+    """Shrinkages de un User Agent a través de la tabla de firmas."""
+    return load_ua_signatures().lookup(user_agent)
+
+
+def save_ua_signatures(path=None):
+    """Persiste la tabla en memoria, incluidos los User Agents añadidos online."""
+    load_ua_signatures().save(path or ua_signatures_path())
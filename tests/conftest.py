@@ -0,0 +1,103 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+sys.path.insert(0, str(SRC_DIR))
+
+DATA_DIR = SRC_DIR / "data"
+
+# Tests que necesitan los artefactos reales (src/data no está versionado)
+requires_artifacts = pytest.mark.skipif(
+    not (DATA_DIR / "datos").is_dir() or not (DATA_DIR / "models").is_dir(),
+    reason="Artefactos de src/data no disponibles",
+)
+
+
+@pytest.fixture
+def df_attempts():
+    """Intentos previos fallidos de prueba (columnas de df_attempts.csv)."""
+    return pd.DataFrame({
+        'dni': ['12345678A', '12345678a', '87654321B', None, '11111111C', '12345678A'],
+        'email': ['a@x.com', 'other@x.com', ' A@X.com', 'b@y.com', None, 'c@z.com'],
+        'cell_phone': ['600000001', '+34 600000002', '600000001', '0034600000003', '', '600000004'],
+        'ip_address': ['1.1.1.1', '1.1.1.1', '2.2.2.2', '1.1.1.1', '3.3.3.3', None],
+        'created_at': [
+            '2024-01-01 10:00:00', '2024-01-02 10:00:00', '2024-01-03 10:00:00',
+            '2024-01-04 10:00:00', '2024-01-05 10:00:00', 'not a date',
+        ],
+    })
+
+
+@pytest.fixture
+def df_applications():
+    """Solicitudes de prueba que coinciden por distintas identidades con df_attempts."""
+    return pd.DataFrame({
+        'dni': ['12345678A', '87654321B', '99999999Z', None, '11111111C', '12345678A'],
+        'email': ['A@x.com', 'nobody@x.com', 'b@y.com', 'a@x.com', None, 'a@x.com'],
+        'cell_phone': ['600000002', '600000001', '34600000003', None, '600000009', '600000001'],
+        'ip_address': ['1.1.1.1', '2.2.2.2', '1.1.1.1', '9.9.9.9', '3.3.3.3', '1.1.1.1'],
+        'created_at': [
+            '2024-01-10 00:00:00', '2024-01-03 10:00:00', '2024-01-04 10:00:01',
+            '2024-01-01 09:00:00', '2024-01-05 10:00:00', '2024-01-02 10:00:00',
+        ],
+    })
+
+
+@pytest.fixture
+def df_scoring_applications():
+    """Solicitudes completas (todas las columnas de required_columns()) con nulos y casos límite."""
+    from inference.trustfull_platform_transformer import load_digital_score_data
+
+    n = 6
+    df = pd.DataFrame({
+        'bank_name': ['Santander', 'Revolut', None, 'BBVA', 'Santander', 'Otro banco'],
+        'amount': [100, 250, 100, 300, None, 50],
+        'days': [30, 7, 30, 15, 30, None],
+        'promo_code_id': [3.0, None, 3.0, 1.0, None, 7.0],
+        'ip_address': ['81.3.16.165', '81.0.15.174', None, '1.1.1.1', '81.1.3.13', 'not an ip'],
+        'dni': ['10000494X', '10000647X', None, '10001004X', '10000494x', '99999999Z'],
+        'email': ['maria.carlos19@yahoo.es', 'user375@gmail.com', None, 'User2402@Gmail.com ', 'x@y', 'new@example.com'],
+        'cell_phone': ['600000561', '600001614', None, '+34 600001985', '600000561.0', '700000000'],
+        'created_at': [
+            '2024-11-04 09:10:00', '2025-01-27 06:46:00', '2024-10-06 12:56:00',
+            '2024-02-29 23:59:59', None, '2025-12-31 00:00:00',
+        ],
+        'device_info': [
+            'Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 '
+            '(KHTML, like Gecko) Version/17.1 Mobile/15E148 Safari/604.1',
+            'Mozilla/5.0 (Linux; Android 13; SM-A536B) AppleWebKit/537.36 '
+            '(KHTML, like Gecko) Chrome/120.0.0.0 Mobile Safari/537.36',
+            'curl/8.0', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Firefox/121.0', 'curl/8.0',
+            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Firefox/121.0',
+        ],
+        'city': ['Madrid', 'Barcelona', None, 'Pueblo 7', 'madrid', 'Sevilla'],
+        'breaches_count_email': [1, 0, None, 3, 0, 2],
+        'phone_has_twitter': [0, 1, None, 0, 1, 0],
+        'email_image_source': [None, 'gravatar', None, 'gravatar', None, 'google'],
+        'whatsapp_privacy_status': ['private', 'public', None, 'unknown', 'private', 'public'],
+        'phone_first_name': ['Juan', 'Juan', None, 'Maria', 'JUAN', ''],
+        'first_name': ['Juan', 'Maria Jose', None, 'Maria', 'Juan', 'Pedro'],
+        'phone_first_seen_days': [1254, 114, None, 0, 30, 5000],
+        'email_first_seen_days': [28, 347, None, 1699, 0, 1],
+        'phone_has_telegram': [1, 0, None, 0, 1, 1],
+        'fastloans_n_meses_activo': [
+            "['2024-03-06', '2024-11-24']", "['2024-06-14', '2024-01-12', '2024-02-06']", None,
+            '[]', "['2024-07-03']", "['2025-12-01', '2025-11-15']",
+        ],
+        'fastloans_n_entidades_distintas': [17, 9, None, 0, 18, 3],
+        'n_meses_actividad': [7, 7, None, 1, 18, 2],
+        'transacciones_por_mes': [37.7, 11.25, None, 0.0, 43.6, 5.0],
+        'n_categorias_distintas': [5, 13, None, 0, 19, 2],
+        'n_chargebacks': [2, 0, None, 0, 2, 1],
+        'n_bizzums': [18, 48, None, 0, 35, 3],
+        'gambling_por_mes': [2.7, 0.89, None, 0.0, 0.99, 0.0],
+        'total_transacciones': [251, 234, None, 0, 53, 10],
+        'salary_existe': [1, 0, None, 0, 1, 0],
+    })
+    # Plataformas del digital presence score: patrón fijo de 0/1 por solicitud
+    for j, col in enumerate(load_digital_score_data().lst_cols_trust):
+        df[col] = [int((i + j) % 3 == 0) for i in range(n)]
+    return df
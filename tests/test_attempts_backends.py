@@ -0,0 +1,176 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from inference import artifacts
+from inference.attempts_sqlite import SQLiteAttemptsStore, build_attempts_db
+from inference.attempts_store import AttemptsBackend, AttemptsStore, PrefilteredAttempts, build_identity_filter
+from inference.bloom import BloomFilter
+
+ATTEMPTS = pd.DataFrame({
+    'dni': ['12345678A', '87654321B', None],
+    'email': ['a@x.com', 'b@x.com', 'a@x.com'],
+    'cell_phone': ['600000001', None, '600000002'],
+    'ip_address': ['1.1.1.1', '1.1.1.1', '2.2.2.2'],
+    'created_at': ['2024-01-01 10:00:00', '2024-01-02 10:00:00', '2024-01-03 10:00:00'],
+})
+
+
+def test_concurrent_builds_do_not_share_a_temporary_file(tmp_path):
+    db_path = tmp_path / "attempts.sqlite"
+    errors = []
+
+    def build():
+        try:
+            # Bloques pequeños para que las construcciones se solapen
+            build_attempts_db(pd.concat([ATTEMPTS] * 200, ignore_index=True), db_path, chunksize=7)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=build) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert [path.name for path in tmp_path.iterdir()] == ["attempts.sqlite"]
+    store = SQLiteAttemptsStore(db_path)
+    try:
+        assert len(store) == 600
+    finally:
+        store.close()
+
+
+@pytest.fixture(params=["sqlite", "memory+bloom", "sqlite+bloom"])
+def backend(request, tmp_path, df_attempts):
+    """Backends alternativos al AttemptsStore en memoria construidos con los mismos intentos."""
+    store = AttemptsStore.from_frame(df_attempts)
+    if request.param.startswith("sqlite"):
+        backend = SQLiteAttemptsStore(build_attempts_db(df_attempts, tmp_path / "attempts.sqlite"))
+    else:
+        backend = store
+    if request.param.endswith("+bloom"):
+        backend = PrefilteredAttempts(backend, build_identity_filter(store))
+    yield backend
+    backend.close()
+
+
+def test_backends_match_memory_store(backend, df_attempts, df_applications):
+    memory = AttemptsStore.from_frame(df_attempts)
+    rows = list(df_applications[['dni', 'email', 'cell_phone', 'ip_address', 'created_at']].itertuples(index=False))
+
+    assert len(backend) == len(memory)
+    for row in rows:
+        assert backend.transform(*row) == pytest.approx(memory.transform(*row), nan_ok=True)
+
+    expected = memory.transform_batch(df_applications)
+    pd.testing.assert_frame_equal(backend.transform_batch(df_applications), expected)
+    pd.testing.assert_frame_equal(
+        expected, pd.DataFrame([memory.transform(*row) for row in rows], index=df_applications.index),
+        check_dtype=False,
+    )
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        AttemptsBackend()
+
+
+@pytest.fixture
+def sqlite_env(tmp_path, monkeypatch):
+    """Backend sqlite con df_attempts.csv, la base y su Bloom filter en un directorio temporal."""
+    csv_path = tmp_path / "df_attempts.csv"
+    db_path = tmp_path / "df_attempts.sqlite"
+    monkeypatch.setattr(artifacts, "attempts_csv_path", lambda: csv_path)
+    monkeypatch.setenv("ATTEMPTS_BACKEND", "sqlite")
+    monkeypatch.setenv("ATTEMPTS_DB", str(db_path))
+    return csv_path, db_path
+
+
+def _assert_matches_memory(backend, df_attempts, df_applications):
+    expected = AttemptsStore.from_frame(df_attempts).transform_batch(df_applications)
+    pd.testing.assert_frame_equal(backend.transform_batch(df_applications), expected)
+
+
+def test_sqlite_db_is_rebuilt_when_the_csv_changes(sqlite_env, df_attempts, df_applications):
+    csv_path, db_path = sqlite_env
+    df_attempts.iloc[:2].to_csv(csv_path, index=False)
+    backend = artifacts._load_attempts_store()
+    assert len(backend) == 2
+    backend.close()
+
+    df_attempts.to_csv(csv_path, index=False)
+    with pytest.warns(UserWarning, match="se reconstruye"):
+        backend = artifacts._load_attempts_store()
+    try:
+        assert backend.backend.source_stamp == artifacts.attempts_stamp()
+        _assert_matches_memory(backend, pd.read_csv(csv_path), df_applications)
+    finally:
+        backend.close()
+
+
+def test_bloom_filter_from_another_build_is_rebuilt(sqlite_env, df_attempts, df_applications):
+    csv_path, db_path = sqlite_env
+    df_attempts.to_csv(csv_path, index=False)
+    build_attempts_db(pd.read_csv(csv_path), db_path, source_stamp=artifacts.attempts_stamp())
+    # Filtro vacío de otra base: con él todas las solicitudes saldrían sin intentos previos
+    BloomFilter(10, source_stamp="other").save(artifacts.attempts_bloom_path(db_path))
+
+    backend = artifacts._load_attempts_store()
+    try:
+        _assert_matches_memory(backend, pd.read_csv(csv_path), df_applications)
+        assert BloomFilter.load(artifacts.attempts_bloom_path(db_path)).source_stamp == artifacts.attempts_stamp()
+    finally:
+        backend.close()
+
+
+def test_memory_backend_saves_and_reuses_its_bloom_filter(sqlite_env, monkeypatch, df_attempts, df_applications):
+    csv_path, _ = sqlite_env
+    monkeypatch.setenv("ATTEMPTS_BACKEND", "memory")
+    df_attempts.to_csv(csv_path, index=False)
+    bloom_path = artifacts.attempts_bloom_path(csv_path)
+    BloomFilter(10, source_stamp="other").save(bloom_path)
+
+    backend = artifacts._load_attempts_store()
+    assert BloomFilter.load(bloom_path).source_stamp == artifacts.attempts_stamp()
+    _assert_matches_memory(backend, pd.read_csv(csv_path), df_applications)
+
+    def rebuild(*args, **kwargs):
+        raise AssertionError("el filtro guardado debería reutilizarse")
+
+    monkeypatch.setattr(artifacts, "build_identity_filter", rebuild)
+    reloaded = artifacts._load_attempts_store()
+    assert (reloaded.bloom.bits == backend.bloom.bits).all()
+
+
+def test_new_attempts_update_the_store_and_the_filter_together(df_attempts, df_applications):
+    store = AttemptsStore.from_frame(df_attempts)
+    backend = PrefilteredAttempts(store, build_identity_filter(store))
+    new_attempts = pd.DataFrame({
+        'dni': ['99999999Z', '12345678A'],
+        'email': ['new@x.com', None],
+        'cell_phone': [None, '600000009'],
+        'ip_address': ['9.9.9.9', '1.1.1.1'],
+        'created_at': ['2024-01-01 00:00:00', '2024-01-01 12:00:00'],
+    })
+    for row in new_attempts.itertuples(index=False):
+        backend.add(*row)
+
+    expected = AttemptsStore.from_frame(pd.concat([df_attempts, new_attempts], ignore_index=True))
+    pd.testing.assert_frame_equal(backend.transform_batch(df_applications), expected.transform_batch(df_applications))
+    rows = df_applications[['dni', 'email', 'cell_phone', 'ip_address', 'created_at']].itertuples(index=False)
+    for row in rows:
+        assert backend.transform(*row) == pytest.approx(expected.transform(*row), nan_ok=True)
+    # Identidad que solo está en el intento añadido: el filtro no debe descartarla
+    assert backend.transform('99999999Z', None, None, None, '2024-02-01')['num_attempts'] == 1
+
+
+def test_sqlite_backend_is_read_only(tmp_path, df_attempts):
+    store = SQLiteAttemptsStore(build_attempts_db(df_attempts, tmp_path / "attempts.sqlite"))
+    try:
+        with pytest.raises(NotImplementedError):
+            store.add('1', None, None, None, '2024-01-01')
+    finally:
+        store.close()
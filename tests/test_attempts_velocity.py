@@ -0,0 +1,91 @@
+import random
+
+import pandas as pd
+import pytest
+
+from inference import attempts_velocity
+from inference.attempts_velocity import DISTINCT_KINDS, IDENTITY_KINDS, VELOCITY_FEATURES, WINDOWS, AttemptsVelocity
+from inference.attempts_store import IDENTITY_NORMALIZERS
+
+BASE = pd.Timestamp("2024-01-01")
+
+
+def _brute_force(attempts, dni, email, cell_phone, ip_address, created_at):
+    """Mismas features que AttemptsVelocity.features recorriendo todos los intentos."""
+    t = pd.Timestamp(created_at)
+    query = {'dni': dni, 'email': email, 'cell_phone': cell_phone, 'ip_address': ip_address}
+    query = {kind: IDENTITY_NORMALIZERS[kind](value) for kind, value in query.items()}
+
+    result = {}
+    for name, seconds in WINDOWS.items():
+        in_window = [a for a in attempts if t - pd.Timedelta(seconds=seconds) <= a['created_at'] < t]
+        for kind, prefix in IDENTITY_KINDS.items():
+            result[f'attempts_{prefix}_{name}'] = sum(
+                1 for a in in_window if query[kind] and IDENTITY_NORMALIZERS[kind](a[kind]) == query[kind]
+            )
+        same_ip = [a for a in in_window if query['ip_address'] and a['ip_address'] == query['ip_address']]
+        for kind in DISTINCT_KINDS:
+            identities = {IDENTITY_NORMALIZERS[kind](a[kind]) for a in same_ip} - {""}
+            result[f'ip_distinct_{IDENTITY_KINDS[kind]}_{name}'] = len(identities)
+    return result
+
+
+def _attempt(rng, created_at):
+    return {
+        'dni': rng.choice(['1A', '2B', '3C', '', None]),
+        'email': rng.choice(['a@x.com', 'b@x.com', '', None]),
+        'cell_phone': rng.choice(['600000001', '600000002', None]),
+        'ip_address': rng.choice(['1.1.1.1', '2.2.2.2']),
+        'created_at': created_at,
+    }
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_features_match_brute_force_with_out_of_order_adds_and_queries(seed):
+    rng = random.Random(seed)
+    offset = lambda: pd.Timedelta(minutes=rng.randrange(0, 60 * 24 * 40))
+
+    attempts = [_attempt(rng, BASE + offset()) for _ in range(150)]
+    velocity = AttemptsVelocity()
+    velocity.add_frame(pd.DataFrame(attempts))
+
+    for _ in range(150):
+        if rng.random() < 0.3:
+            # Alta en una fecha cualquiera (normalmente fuera de orden respecto a las consultas)
+            attempt = _attempt(rng, BASE + offset())
+            attempts.append(attempt)
+            velocity.add(**attempt)
+        else:
+            query = _attempt(rng, BASE + offset())
+            assert velocity.features(**query) == _brute_force(attempts, **query)
+
+
+def test_empty_identities_are_not_counted_as_distinct():
+    velocity = AttemptsVelocity()
+    for minute, dni in enumerate(['1A', '', None, '1A']):
+        velocity.add(dni, None, None, '1.1.1.1', BASE + pd.Timedelta(minutes=minute))
+
+    features = velocity.features('2B', None, None, '1.1.1.1', BASE + pd.Timedelta(minutes=10))
+    assert features['attempts_ip_1h'] == 4
+    assert features['ip_distinct_dni_1h'] == 1
+    assert features['ip_distinct_email_1h'] == 0
+
+
+def test_transform_batch_matches_brute_force_for_an_unsorted_batch(monkeypatch):
+    rng = random.Random(7)
+    offset = lambda: pd.Timedelta(minutes=rng.randrange(0, 60 * 24 * 40))
+    attempts = [_attempt(rng, BASE + offset()) for _ in range(200)]
+    velocity = AttemptsVelocity()
+    velocity.add_frame(pd.DataFrame(attempts))
+    monkeypatch.setattr(attempts_velocity, "_VELOCITY", velocity)
+
+    queries = [_attempt(rng, BASE + offset()) for _ in range(60)] + [_attempt(rng, None)]
+    df = pd.DataFrame(queries, index=range(500, 500 + len(queries)))
+    batch = attempts_velocity.transform_batch(df)
+
+    assert list(batch.columns) == list(VELOCITY_FEATURES)
+    assert (batch.index == df.index).all()
+    for i, query in zip(df.index[:-1], queries[:-1]):
+        assert batch.loc[i].to_dict() == _brute_force(attempts, **query)
+    # Sin fecha válida no hay intentos anteriores
+    assert (batch.iloc[-1] == 0).all()
@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from inference.dag import FeatureGraph, Node
+
+
+def _graph(calls=None):
+    """a y b dependen de la columna x; c de a y b; d copia la columna homónima."""
+    def node(name, inputs, fn, shared=False):
+        def counted(*args):
+            if calls is not None:
+                calls.append(name)
+            return fn(*args)
+        return Node(name, inputs, counted, shared=shared)
+
+    return FeatureGraph([
+        node('a', ('x',), lambda x: x + 1, shared=True),
+        node('b', ('x',), lambda x: x * 2),
+        node('c', ('a', 'b'), lambda a, b: a + b),
+        node('d', ('d',), lambda d: d),
+    ])
+
+
+def test_plan_groups_nodes_by_dependency_level():
+    levels = _graph().plan(['c', 'd'])
+
+    assert [sorted(node.name for node in level) for level in levels] == [['a', 'b', 'd'], ['c']]
+    # El plan se cachea por tupla de salidas
+    graph = _graph()
+    assert graph.plan(['c']) is graph.plan(['c'])
+
+
+def test_plan_only_includes_the_needed_nodes():
+    levels = _graph().plan(['a'])
+    assert [[node.name for node in level] for level in levels] == [['a']]
+
+
+def test_cycles_duplicates_and_unknown_features_are_rejected():
+    graph = FeatureGraph([
+        Node('a', ('b',), lambda b: b),
+        Node('b', ('a',), lambda a: a),
+    ])
+    with pytest.raises(ValueError, match="Ciclo"):
+        graph.plan(['a'])
+
+    with pytest.raises(ValueError, match="duplicado"):
+        FeatureGraph([Node('a', (), lambda: 1), Node('a', (), lambda: 2)])
+
+    with pytest.raises(KeyError, match="desconocida"):
+        _graph().plan(['z'])
+
+
+def test_run_computes_each_intermediate_once_and_writes_into_out():
+    calls = []
+    graph = _graph(calls)
+    out = np.full(2, np.nan, dtype=np.float32)
+
+    values = graph.run({'x': 3, 'd': 7.5}, ['c', 'd'], out=out, index={'c': 1, 'd': 0})
+
+    # Con `out` solo se devuelven los intermedios; las features van directamente a `out`
+    assert values == {'a': 4, 'b': 6}
+    assert graph.run({'x': 3, 'd': 7.5}, ['c', 'd']) == {'a': 4, 'b': 6, 'c': 10, 'd': 7.5}
+    assert sorted(calls) == ['a', 'a', 'b', 'b', 'c', 'c', 'd', 'd']
+    np.testing.assert_array_equal(out, np.array([7.5, 10], dtype=np.float32))
+
+
+def test_run_batch_reuses_shared_nodes_across_applications():
+    calls = []
+    applications = [{'x': 1, 'd': 0}, {'x': 2, 'd': 0}, {'x': 1, 'd': 0}, {'x': [1], 'd': 0}]
+    graph = FeatureGraph([
+        Node('a', ('x',), lambda x: calls.append(x) or repr(x), shared=True),
+        Node('b', ('a',), lambda a: a + '!'),
+    ])
+
+    results = graph.run_batch(applications, ['b'])
+
+    assert results == [{'b': '1!'}, {'b': '2!'}, {'b': '1!'}, {'b': '[1]!'}]
+    # x = 1 solo se calcula una vez; las entradas no hashables se calculan sin memo
+    assert calls == [1, 2, [1]]
+
+
+def test_executor_gives_the_same_result():
+    applications = [{'x': x, 'd': -x} for x in range(10)]
+    expected = _graph().run_batch(applications, ['c', 'd'])
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert _graph().run_batch(applications, ['c', 'd'], executor=executor) == expected
+    assert expected[3] == {'c': 10, 'd': -3}
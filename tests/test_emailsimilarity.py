@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+
+from inference import emailsimilarity_transformer
+from inference.emailsimilarity_transformer import (
+    BadEmailIndex,
+    normalize_and_key,
+    transform_batch,
+    transform_single,
+)
+
+BAD_EMAILS = [
+    "john.doe@gmail.com", "jon.doe@gmail.com", "jane.smith@hotmail.com",
+    "fraud123@yahoo.es", "fraud124@yahoo.es", "x@x.com",
+]
+
+EMAILS = [
+    "John.Doe@gmail.com", " jon.doe@gmail.com", "john.do@gmail.com", "jane.smyth@hotmail.com",
+    "fraud125@yahoo.es", "clean.user@outlook.com", "no-at-sign", "", None, "x@x.com", "john.doe@gmail.com",
+]
+
+
+@pytest.fixture(params=[False, True], ids=["blocks", "global"])
+def bad_email_index(request, monkeypatch):
+    index = BadEmailIndex.from_emails(normalize_and_key(email).email_norm for email in BAD_EMAILS)
+    if request.param:
+        index.build_qgram_index()
+    monkeypatch.setattr(emailsimilarity_transformer, "_BAD_EMAIL_INDEX", index)
+    return index
+
+
+def test_transform_batch_matches_transform_single(bad_email_index):
+    batch = transform_batch(pd.Series(EMAILS, index=range(10, 10 + len(EMAILS))), workers=1)
+    expected = pd.DataFrame([transform_single(email) for email in EMAILS], index=batch.index)
+
+    assert list(batch.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(batch, expected, check_dtype=False)
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from conftest import requires_artifacts
+from inference.feature_assembler import FeatureAssembler, assemble_batch
+from inference.feature_schema import FEATURE_SCHEMA, N_FEATURES
+from inference.pipeline import transform_batch
+
+
+@pytest.fixture
+def expected(df_scoring_applications):
+    """Features de transform_batch (por nombre) en el orden de FEATURE_SCHEMA."""
+    features = transform_batch(df_scoring_applications)
+    return np.column_stack([features[name].to_numpy(dtype=float, na_value=np.nan) for name in FEATURE_SCHEMA])
+
+
+@requires_artifacts
+def test_row_is_float32_in_schema_order(df_scoring_applications, expected):
+    assembler = FeatureAssembler()
+    for i, application in enumerate(df_scoring_applications.to_dict('records')):
+        row = assembler.assemble(application)
+        assert row is assembler.row
+        assert row.dtype == np.float32 and row.shape == (N_FEATURES,)
+        np.testing.assert_allclose(row, expected[i].astype(np.float32), rtol=1e-6, equal_nan=True)
+
+
+@requires_artifacts
+def test_matrix_is_float32_in_schema_order(df_scoring_applications, expected):
+    out = np.full((len(df_scoring_applications), N_FEATURES), -1, dtype=np.float32)
+    matrix = assemble_batch(df_scoring_applications, out=out)
+
+    assert matrix is out
+    assert matrix.dtype == np.float32
+    np.testing.assert_allclose(matrix, expected.astype(np.float32), rtol=1e-6, equal_nan=True)
+
+    with pytest.raises(ValueError, match="forma"):
+        assemble_batch(df_scoring_applications, out=np.empty((1, N_FEATURES), dtype=np.float32))
@@ -0,0 +1,22 @@
+import numpy as np
+
+from conftest import requires_artifacts
+from inference.feature_assembler import FeatureAssembler
+from inference.feature_graph import get_feature_graph
+from inference.feature_schema import FEATURE_SCHEMA
+from inference.pipeline import transform_batch
+
+
+@requires_artifacts
+def test_graph_matches_the_batch_pipeline(df_scoring_applications):
+    expected = transform_batch(df_scoring_applications)[list(FEATURE_SCHEMA)]
+    expected = expected.to_numpy(dtype=np.float32, na_value=np.nan)
+    applications = df_scoring_applications.to_dict('records')
+
+    assembler = FeatureAssembler()
+    rows = np.vstack([assembler.assemble(application).copy() for application in applications])
+    np.testing.assert_allclose(rows, expected, rtol=1e-6, equal_nan=True)
+
+    batch = get_feature_graph().run_batch(applications, FEATURE_SCHEMA)
+    values = np.array([[row[name] for name in FEATURE_SCHEMA] for row in batch], dtype=np.float32)
+    np.testing.assert_allclose(values, expected, rtol=1e-6, equal_nan=True)
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from inference import artifacts
+from inference.ip_flag_table import IpFlagTable
+
+
+def _table(source_stamp=None):
+    return IpFlagTable(
+        np.array([0, 16777216], dtype=np.int64), np.array([1.0, 2.0]), np.array([3.0, 4.0]),
+        [0], np.array([1.0]), np.array([3.0]), (1.0, 3.0), source_stamp,
+    )
+
+
+@pytest.fixture
+def table_path(tmp_path, monkeypatch):
+    path = tmp_path / "ip_flag_table.npz"
+    monkeypatch.setenv("IP_FLAG_TABLE", str(path))
+    monkeypatch.setattr(artifacts, "ip_flag_table_stamp", lambda: "current")
+    return path
+
+
+def test_table_is_loaded_when_sources_match(table_path):
+    _table("current").save(table_path)
+
+    table = artifacts._load_ip_flag_table()
+    assert table is not None
+    assert table.source_stamp == "current"
+    np.testing.assert_array_equal(table.starts_v4, [0, 16777216])
+
+
+@pytest.mark.parametrize("source_stamp", ["stale", None])
+def test_stale_or_unstamped_table_falls_back_to_geolite(table_path, source_stamp):
+    _table(source_stamp).save(table_path)
+
+    with pytest.warns(UserWarning, match="build-ip-table"):
+        assert artifacts._load_ip_flag_table() is None
+
+
+def test_files_stamp_changes_with_the_files(tmp_path):
+    path = tmp_path / "ip_asn_flag.csv"
+    missing = artifacts.files_stamp([path])
+    path.write_text("asn_org,flag\n")
+    written = artifacts.files_stamp([path])
+    path.write_text("asn_org,flag\nX,RISK\n")
+
+    assert len({missing, written, artifacts.files_stamp([path])}) == 3
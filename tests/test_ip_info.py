@@ -0,0 +1,99 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from inference import ip_info
+from inference.ip_info import IpInfo, MmdbLookup, enrich_ips, extract_asn, extract_city
+
+mmdb_writer = pytest.importorskip("mmdb_writer")
+netaddr = pytest.importorskip("netaddr")
+
+
+@pytest.fixture
+def databases(tmp_path, monkeypatch):
+    """Bases GeoLite2 sintéticas con cientos de redes de distintos prefijos (IPv4 e IPv6)."""
+    rng = np.random.default_rng(0)
+    city = mmdb_writer.MMDBWriter(ip_version=6, database_type='GeoLite2-City', ipv4_compatible=True)
+    asn = mmdb_writer.MMDBWriter(ip_version=6, database_type='GeoLite2-ASN', ipv4_compatible=True)
+    for i in range(400):
+        prefix_len = int(rng.choice([16, 20, 24, 28]))
+        network = f"{10 + i // 4}.{(i % 4) * 64}.0.0/{prefix_len}"
+        record = {'location': {'latitude': float(i), 'longitude': -float(i)}}
+        if i % 5:
+            record['subdivisions'] = [{'names': {'en': f"Region {i % 37}"}}]
+        city.insert_network(netaddr.IPSet([network]), record)
+        if i % 3:
+            asn.insert_network(netaddr.IPSet([f"{10 + i // 4}.{(i % 4) * 64}.0.0/18"]),
+                               {'autonomous_system_organization': f"AS {i % 11}"})
+    city.insert_network(netaddr.IPSet(['2a02:9000::/32']), {'subdivisions': [{'names': {'en': 'Andalusia'}}]})
+    asn.insert_network(netaddr.IPSet(['2a02:9000::/29']), {'autonomous_system_organization': 'AS v6'})
+    city.to_db_file(str(tmp_path / "city.mmdb"))
+    asn.to_db_file(str(tmp_path / "asn.mmdb"))
+
+    info = IpInfo(
+        reader_city=MmdbLookup(tmp_path / "city.mmdb", extract_city),
+        reader_asn=MmdbLookup(tmp_path / "asn.mmdb", extract_asn),
+    )
+    monkeypatch.setattr(ip_info, "_IP_INFO", info)
+    return info
+
+
+def _ips(n, seed=1):
+    """IPs dentro de las redes de `databases` (o cerca, según su prefijo), fuera de ellas y no válidas."""
+    rng = np.random.default_rng(seed)
+    ips = []
+    for _ in range(n):
+        i = rng.integers(0, 400)
+        if rng.random() < 0.8:
+            ips.append(f"{10 + i // 4}.{(i % 4) * 64}.{rng.integers(0, 20)}.{rng.integers(0, 256)}")
+        else:
+            ips.append(f"{rng.integers(120, 224)}.{rng.integers(0, 256)}.{rng.integers(0, 256)}.1")
+    ips += ['2a02:9000::1', '2a02:9001::1', '2001:db8::1', 'not an ip', '', None, np.nan, '10.0.0.1', '10.0.0.1']
+    return ips
+
+
+def test_enrich_ips_matches_the_per_row_getters(databases):
+    ips = pd.Series(_ips(3000), index=range(100, 3109))
+    expected = pd.DataFrame({
+        'asn_org': [ip_info.get_asn_org(ip) for ip in ips],
+        'subdivision': [ip_info.get_city(ip) for ip in ips],
+        'lat': [ip_info.get_lat(ip) for ip in ips],
+        'lon': [ip_info.get_lon(ip) for ip in ips],
+    }, index=ips.index)
+    # Hay IPs en la base con y sin subdivisión y fuera de la base
+    assert expected['subdivision'].isna().any() and (expected['subdivision'] == 'UNKNOWN').any()
+
+    databases.reader_city.clear_cache()
+    databases.reader_asn.clear_cache()
+    result = enrich_ips(ips)
+
+    pd.testing.assert_index_equal(result.index, ips.index)
+    for col in ('asn_org', 'subdivision'):
+        pd.testing.assert_series_equal(result[col].astype(object), expected[col].astype(object), check_names=False)
+    for col in ('lat', 'lon'):
+        np.testing.assert_array_equal(result[col].to_numpy(), expected[col].to_numpy(dtype=np.float64))
+
+
+def test_lookup_cache_is_consistent_across_threads(databases, tmp_path):
+    # Caché pequeña para que los hilos la vacíen mientras otros la consultan
+    lookup = MmdbLookup(tmp_path / "city.mmdb", extract_city, max_entries=16)
+    reference = MmdbLookup(tmp_path / "city.mmdb", extract_city, max_entries=0)
+    ips = _ips(2000, seed=2)[:2000]
+    expected = [reference.get(ip) for ip in ips]
+
+    results = [None] * 8
+
+    def work(k):
+        results[k] = [lookup.get(ip) for ip in ips[k::8] * 3]
+
+    threads = [threading.Thread(target=work, args=(k,)) for k in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for k in range(8):
+        assert results[k] == expected[k::8] * 3
+    assert lookup.hits + lookup.misses == 3 * len(ips)
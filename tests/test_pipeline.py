@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+from inference import attempts_velocity, emailsimilarity_transformer, pipeline
+from inference.attempts_velocity import VELOCITY_FEATURES, AttemptsVelocity
+from inference.emailsimilarity_transformer import BadEmailIndex, normalize_and_key
+from inference.feature_schema import FEATURE_SCHEMA
+
+
+@pytest.fixture(params=[False, True], ids=["blocks", "global"])
+def email_only_pipeline(request, monkeypatch):
+    """Pipeline con la etapa real de similitud de email y el resto de features a 0."""
+    index = BadEmailIndex.from_emails(
+        normalize_and_key(email).email_norm for email in ["john.doe@gmail.com", "fraud123@yahoo.es"]
+    )
+    if request.param:
+        index.build_qgram_index()
+    monkeypatch.setattr(emailsimilarity_transformer, "_BAD_EMAIL_INDEX", index)
+
+    email_stage = next(stage for stage in pipeline.STAGES if stage.name == "email_similarity")
+    email_features = set(emailsimilarity_transformer._FEATURE_NAMES)
+    others = pipeline.Stage("others", (), lambda df: pd.DataFrame(
+        {name: 0.0 for name in FEATURE_SCHEMA if name not in email_features}, index=df.index,
+    ))
+    monkeypatch.setattr(pipeline, "STAGES", [others, email_stage])
+    monkeypatch.setattr(pipeline, "required_columns", lambda: ["email"])
+    return request.param
+
+
+def test_global_email_distance_is_an_extra_output_column(email_only_pipeline):
+    df = pd.DataFrame({"email": ["john.do@gmail.com", "clean@outlook.com"]})
+    features = pipeline.transform_batch(df)
+
+    assert list(features.columns[:len(FEATURE_SCHEMA)]) == list(FEATURE_SCHEMA)
+    if email_only_pipeline:
+        assert list(features.columns[len(FEATURE_SCHEMA):]) == ["email_min_lev_global"]
+        assert features["email_min_lev_global"].tolist() == [1, 99]
+    else:
+        assert len(features.columns) == len(FEATURE_SCHEMA)
+
+
+@pytest.mark.parametrize("enabled", [False, True])
+def test_velocity_features_are_extra_columns_behind_an_option(monkeypatch, df_attempts, enabled):
+    monkeypatch.setenv("ATTEMPTS_VELOCITY", "1" if enabled else "0")
+    velocity = AttemptsVelocity()
+    velocity.add_frame(df_attempts)
+    monkeypatch.setattr(attempts_velocity, "_VELOCITY", velocity)
+
+    velocity_stage = next(stage for stage in pipeline.STAGES if stage.name == "velocity")
+    others = pipeline.Stage("others", (), lambda df: pd.DataFrame(
+        {name: 0.0 for name in FEATURE_SCHEMA}, index=df.index,
+    ))
+    monkeypatch.setattr(pipeline, "STAGES", [others, velocity_stage])
+    monkeypatch.setattr(pipeline, "required_columns", lambda: list(velocity_stage.columns))
+
+    df = pd.DataFrame([{'dni': '12345678A', 'email': 'a@x.com', 'cell_phone': '600000001',
+                        'ip_address': '1.1.1.1', 'created_at': '2024-01-10 00:00:00'}])
+    features = pipeline.transform_batch(df)
+
+    assert list(features.columns[:len(FEATURE_SCHEMA)]) == list(FEATURE_SCHEMA)
+    if enabled:
+        assert list(features.columns[len(FEATURE_SCHEMA):]) == list(VELOCITY_FEATURES)
+        assert features['attempts_dni_30d'].tolist() == [2]
+    else:
+        assert len(features.columns) == len(FEATURE_SCHEMA)
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from inference import previous_attempts_transformer
+from inference.attempts_store import AttemptsStore
+
+
+@pytest.fixture
+def attempts(monkeypatch, df_attempts):
+    store = AttemptsStore.from_frame(df_attempts)
+    monkeypatch.setattr(previous_attempts_transformer, "get_attempts_store", lambda: store)
+
+
+def _assert_same(batch, expected):
+    for col in ('num_attempts', 'diff_days_last_attemtp', 'last_attempt', 'req_ip'):
+        np.testing.assert_allclose(batch[col].to_numpy(dtype=float), expected[col].to_numpy(dtype=float), err_msg=col)
+
+
+def test_transform_batch_matches_transform(attempts, df_applications):
+    batch = previous_attempts_transformer.transform_batch(df_applications)
+    expected = pd.DataFrame([
+        previous_attempts_transformer.transform(*row)
+        for row in df_applications[['dni', 'email', 'cell_phone', 'ip_address', 'created_at']].itertuples(index=False)
+    ])
+
+    # Solo cuentan los intentos estrictamente anteriores (la segunda y la última coinciden en fecha con uno)
+    assert batch['num_attempts'].tolist() == [3, 1, 1, 0, 0, 1]
+    _assert_same(batch, expected)
+
+
+def test_numeric_phone_scores_the_same_alone_and_in_a_batch_with_null_phones(attempts):
+    application = {'dni': '22222222D', 'email': 'new@x.com', 'cell_phone': 600000001,
+                   'ip_address': '5.5.5.5', 'created_at': '2024-01-10 00:00:00'}
+    other = dict(application, dni='33333333E', cell_phone=None)
+
+    alone = previous_attempts_transformer.transform_batch(pd.DataFrame([application]))
+    # Con un teléfono nulo la columna pasa a float (600000001.0)
+    mixed_df = pd.DataFrame([application, other])
+    assert mixed_df['cell_phone'].dtype == float
+    mixed = previous_attempts_transformer.transform_batch(mixed_df)
+
+    assert alone['num_attempts'].tolist() == [2]
+    _assert_same(mixed.iloc[[0]], alone)
+    assert mixed['num_attempts'].tolist() == [2, 0]
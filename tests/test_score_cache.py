@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from inference.score_cache import ScoreCache, fingerprint
+
+
+def test_fingerprint_keeps_whitespace():
+    assert fingerprint([" 81.0.0.1"]) != fingerprint(["81.0.0.1"])
+    assert fingerprint(["a@x.com "]) != fingerprint(["a@x.com"])
+
+
+def test_fingerprint_unifies_nulls():
+    expected = fingerprint([None, 1])
+    for null in (np.nan, float("nan"), pd.NaT, pd.NA):
+        assert fingerprint([null, 1]) == expected
+    assert fingerprint([np.int64(1)]) == fingerprint([1])
+
+
+def test_fingerprint_depends_on_version():
+    assert fingerprint(["x"], version=("a", 1)) != fingerprint(["x"], version=("a", 2))
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ScoreCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.evictions == 1
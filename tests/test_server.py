@@ -0,0 +1,187 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import pytest
+
+from inference import emailsimilarity_transformer
+from inference import server as server_module
+from inference.emailsimilarity_transformer import BadEmailIndex
+from inference.server import ScoringServer
+
+
+def _post(port, path, body):
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}{path}", data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+@pytest.fixture
+def scoring_server(monkeypatch):
+    """Servidor con un warmup que no termina hasta liberar `release` y un transform falso."""
+    release = threading.Event()
+    monkeypatch.setattr(server_module, "warmup", release.wait)
+    monkeypatch.setattr(server_module, "required_columns", lambda: ["dni"])
+
+    server = ScoringServer(("127.0.0.1", 0), max_wait_ms=1.0)
+    server.transform = server.batcher.transform = lambda df, caches=None: pd.DataFrame({"n": range(len(df))})
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server, release
+    finally:
+        release.set()
+        server.shutdown()
+        server.server_close()
+
+
+def test_score_returns_503_until_warmup_finishes(scoring_server):
+    server, release = scoring_server
+    port = server.server_address[1]
+
+    status, body = _post(port, "/score", {"dni": "1"})
+    assert status == 503
+    assert body["status"] == "starting"
+
+    release.set()
+    server.ready.wait(5)
+    assert _post(port, "/score", {"dni": "1"}) == (200, {"n": 0})
+    assert _post(port, "/score", [{"dni": "1"}, {"dni": "2"}]) == (200, [{"n": 0}, {"n": 1}])
+
+
+def test_list_payloads_share_the_pipeline_lock(scoring_server):
+    server, release = scoring_server
+    release.set()
+    server.ready.wait(5)
+
+    assert server.batcher.lock is server.pipeline_lock
+
+
+def test_incomplete_request_gets_a_400_even_when_batched_with_a_complete_one(scoring_server):
+    server, release = scoring_server
+    server.batcher.max_wait = 0.2
+    batches = []
+
+    def transform(df, caches=None):
+        batches.append(list(df.columns))
+        return pd.DataFrame({"n": range(len(df))})
+
+    server.batcher.transform = transform
+    release.set()
+    server.ready.wait(5)
+    port = server.server_address[1]
+
+    results = {}
+    bodies = {"complete": {"dni": "1", "email": "a@a.com"}, "incomplete": {"email": "b@b.com"}}
+    threads = [
+        threading.Thread(target=lambda name=name: results.__setitem__(name, _post(port, "/score", bodies[name])))
+        for name in bodies
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert results["complete"] == (200, {"n": 0})
+    status, body = results["incomplete"]
+    assert status == 400
+    assert "dni" in body["error"]
+    # La solicitud incompleta no llega al pipeline
+    assert batches == [["dni", "email"]]
+
+    status, body = _post(port, "/score", [{"dni": "1"}, {"email": "b@b.com"}])
+    assert status == 400
+    assert "solicitud 1" in body["error"]
+
+
+def _post_raw(port, path, data: bytes):
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=data)
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+@pytest.mark.parametrize("path", ["/score", "/bad-emails"])
+def test_null_and_invalid_bodies_get_a_400(scoring_server, path):
+    server, release = scoring_server
+    server.bad_emails_api = True
+    release.set()
+    server.ready.wait(5)
+    port = server.server_address[1]
+
+    status, body = _post_raw(port, path, b"null")
+    assert status == 400
+    assert "Se espera" in body["error"]
+
+    status, body = _post_raw(port, path, b"{not json")
+    assert status == 400
+    assert "JSON inválido" in body["error"]
+
+
+def test_bad_emails_endpoint_is_disabled_by_default(scoring_server, monkeypatch):
+    server, release = scoring_server
+    release.set()
+    server.ready.wait(5)
+    added = []
+    monkeypatch.setattr(server_module, "load_bad_email_index", lambda: added.append(1))
+
+    status, body = _post(server.server_address[1], "/bad-emails", {"add": ["x@x.com"]})
+    assert status == 403
+    assert "--enable-bad-emails-api" in body["error"]
+    assert added == []
+
+
+@pytest.fixture
+def bad_emails_server(scoring_server, monkeypatch, tmp_path):
+    """Servidor con POST /bad-emails activo sobre un índice y un snapshot temporales."""
+    server, release = scoring_server
+    server.bad_emails_api = True
+    index = BadEmailIndex.from_emails(["bad@x.com"])
+    monkeypatch.setattr(emailsimilarity_transformer, "_BAD_EMAIL_INDEX", index)
+    monkeypatch.setattr(server_module, "load_bad_email_index", lambda: index)
+    snapshot = tmp_path / "bad_emails.txt.gz"
+    monkeypatch.setenv("BAD_EMAILS_SNAPSHOT", str(snapshot))
+    release.set()
+    server.ready.wait(5)
+    return server, index, snapshot
+
+
+def test_concurrent_snapshots_do_not_collide(bad_emails_server):
+    server, index, snapshot = bad_emails_server
+    port = server.server_address[1]
+    results = []
+    threads = [
+        threading.Thread(target=lambda i=i: results.append(
+            _post(port, "/bad-emails", {"add": [f"user{i}@example.com"], "snapshot": True})
+        ))
+        for i in range(16)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert [status for status, _ in results] == [200] * 16
+    assert [path.name for path in snapshot.parent.iterdir()] == [snapshot.name]
+    assert len(BadEmailIndex.load(snapshot)) == len(index) == 17
+
+
+def test_failed_snapshot_gets_a_500_json_reply(bad_emails_server, monkeypatch, tmp_path):
+    server, index, _ = bad_emails_server
+    monkeypatch.setenv("BAD_EMAILS_SNAPSHOT", str(tmp_path / "missing" / "bad_emails.txt.gz"))
+
+    status, body = _post(server.server_address[1], "/bad-emails", {"add": ["new@example.com"], "snapshot": True})
+    assert status == 500
+    assert "snapshot" in body["error"]
+    assert body["added"] == 1
+    assert "new@example.com" in index
@@ -0,0 +1,89 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from inference import streaming
+from inference.streaming import iter_chunks, load_checkpoint, save_checkpoint, score_file
+
+
+@pytest.fixture
+def parquet_path(tmp_path):
+    """Parquet con row groups de 100, 10 y 100 filas (columna row = número de fila)."""
+    path = tmp_path / "apps.parquet"
+    with pq.ParquetWriter(path, pa.schema([("row", pa.int64())])) as writer:
+        start = 0
+        for size in (100, 10, 100):
+            writer.write_table(pa.table({"row": list(range(start, start + size))}))
+            start += size
+    return path
+
+
+@pytest.mark.parametrize("offset", [0, 50, 99, 100, 105, 110, 150, 209])
+@pytest.mark.parametrize("chunksize", [7, 20, 1_000])
+def test_parquet_resume_reads_each_remaining_row_once(parquet_path, offset, chunksize):
+    chunks = list(iter_chunks(parquet_path, chunksize=chunksize, offset=offset))
+    rows = pd.concat(chunks)["row"].tolist() if chunks else []
+    assert rows == list(range(offset, 210))
+    assert all(len(chunk) <= chunksize for chunk in chunks)
+
+
+def test_parquet_resume_past_end(parquet_path):
+    assert list(iter_chunks(parquet_path, chunksize=20, offset=210)) == []
+
+
+def test_csv_resume(tmp_path):
+    path = tmp_path / "apps.csv"
+    pd.DataFrame({"row": range(95)}).to_csv(path, index=False)
+    rows = pd.concat(iter_chunks(path, chunksize=20, offset=33))["row"].tolist()
+    assert rows == list(range(33, 95))
+
+
+@pytest.fixture
+def fake_pipeline(monkeypatch):
+    """Pipeline falso: una feature `double` con el doble de la columna row."""
+    monkeypatch.setattr(streaming, "transform_batch", lambda df, timings=None: pd.DataFrame({"double": df["row"] * 2}))
+
+
+def _written_rows(output_dir):
+    return pd.read_parquet(output_dir)["row_number"].sort_values().tolist()
+
+
+def test_resume_accepts_the_same_input_given_as_a_relative_path(tmp_path, monkeypatch, fake_pipeline):
+    path = tmp_path / "apps.csv"
+    pd.DataFrame({"row": range(30)}).to_csv(path, index=False)
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    save_checkpoint(output_dir, path, 20)
+    assert load_checkpoint(output_dir)["input"] == str(path.resolve())
+
+    monkeypatch.chdir(tmp_path)
+    assert score_file("apps.csv", output_dir, chunksize=10, id_cols=[]) == 30
+    assert _written_rows(output_dir) == list(range(20, 30))
+
+    other = tmp_path / "other.csv"
+    pd.DataFrame({"row": range(5)}).to_csv(other, index=False)
+    with pytest.raises(ValueError, match="corresponde a"):
+        score_file(other, output_dir, chunksize=10, id_cols=[])
+
+
+def test_no_resume_removes_the_previous_checkpoint(tmp_path, monkeypatch, fake_pipeline):
+    path = tmp_path / "apps.csv"
+    pd.DataFrame({"row": range(30)}).to_csv(path, index=False)
+    output_dir = tmp_path / "out"
+    assert score_file(path, output_dir, chunksize=10, id_cols=[]) == 30
+
+    # Una ejecución sin reanudar que falla antes de escribir el primer bloque
+    def failing_transform(df, timings=None):
+        raise RuntimeError("fallo")
+
+    with monkeypatch.context() as m:
+        m.setattr(streaming, "transform_batch", failing_transform)
+        with pytest.raises(RuntimeError):
+            score_file(path, output_dir, chunksize=10, resume=False, id_cols=[])
+    assert load_checkpoint(output_dir) is None
+    assert list(output_dir.glob("part-*.parquet")) == []
+
+    # Sin el checkpoint viejo, la reanudación empieza desde la primera fila
+    assert score_file(path, output_dir, chunksize=10, id_cols=[]) == 30
+    assert _written_rows(output_dir) == list(range(30))
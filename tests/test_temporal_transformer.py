@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+
+from conftest import requires_artifacts
+
+
+@requires_artifacts
+def test_temporal_cube_matches_get_temporal_vars():
+    from inference.temporal_transformer import verify_temporal_cube
+
+    assert verify_temporal_cube() == []
+
+
+@requires_artifacts
+def test_temporal_vars_batch_matches_fast_path():
+    from inference.artifacts import TEMPORAL_VARS
+    from inference.temporal_transformer import get_temporal_vars_batch, get_temporal_vars_fast
+
+    created_at = pd.Series(["2024-02-29 23:59:00", None, "2025-06-01 00:00:00", "2025-12-31 12:30:00"])
+    batch = get_temporal_vars_batch(created_at)
+    for i, value in created_at.items():
+        expected = get_temporal_vars_fast(value)
+        np.testing.assert_array_equal(batch.loc[i, list(TEMPORAL_VARS)].to_numpy(dtype=float),
+                                      [expected[var] for var in TEMPORAL_VARS])
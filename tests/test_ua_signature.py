@@ -0,0 +1,30 @@
+import pytest
+
+from inference import ua_signature
+from inference.ua_signature import UaSignature, UaSignatureTable
+
+
+@pytest.fixture
+def table_path(tmp_path, monkeypatch):
+    path = tmp_path / "ua_signatures.npz"
+    monkeypatch.setenv("UA_SIGNATURES", str(path))
+    monkeypatch.setattr(ua_signature, "ua_signatures_stamp", lambda: "current")
+    monkeypatch.setattr(ua_signature, "_UA_SIGNATURES", None)
+    return path
+
+
+def test_table_is_loaded_when_sources_match(table_path):
+    UaSignatureTable({1: UaSignature(0.5, 0.25)}).save(table_path)
+
+    table = ua_signature.load_ua_signatures()
+    assert table.source_stamp == "current"
+    assert table.signatures == {1: UaSignature(0.5, 0.25)}
+
+
+def test_stale_table_is_replaced_by_an_empty_one(table_path):
+    UaSignatureTable({1: UaSignature(0.5, 0.25)}, source_stamp="stale").save(table_path)
+
+    with pytest.warns(UserWarning, match="build-ua-table"):
+        table = ua_signature.load_ua_signatures()
+    assert len(table) == 0
+    assert table.source_stamp == "current"